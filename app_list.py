@@ -0,0 +1,286 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+TIERS = ["Ultra High", "High", "Medium", "Low"]
+ALL_TIERS = "All tiers"
+
+
+class AppListModel:
+    """Catalog state behind the list: tiers, the current filter, selection and row statuses.
+
+    Widgets only ever show a window of `visible`; everything else about an
+    app lives here, so the cost of a row does not depend on the catalog size.
+    """
+
+    def __init__(self, apps: Dict[str, str]):
+        # Shared with the caller: app -> applied tier
+        self.apps = apps
+        self.names = list(apps)
+        self._keys = [name.lower() for name in self.names]
+        self.chosen: Dict[str, str] = {}
+        self.selected: Set[str] = set()
+        self.status: Dict[str, Tuple[str, bool]] = {}
+        self.query = ""
+        self.tier = None
+        self.visible: List[str] = list(self.names)
+
+    def set_apps(self, apps: Dict[str, str], tiers: List[str]) -> None:
+        """Swap in a reloaded catalog; apps that remain keep their selection, status and pick."""
+        self.apps = apps
+        self.names = list(apps)
+        self._keys = [name.lower() for name in self.names]
+        self.chosen = {app: tier for app, tier in self.chosen.items() if app in apps and tier in tiers}
+        self.selected &= set(apps)
+        self.status = {app: status for app, status in self.status.items() if app in apps}
+        self.set_filter(self.query, self.tier if self.tier in tiers else None)
+
+    def set_filter(self, query: str = "", tier: Optional[str] = None) -> None:
+        self.query = query.strip().lower()
+        self.tier = tier
+        self.visible = [
+            name for name, key in zip(self.names, self._keys)
+            if self.query in key and (tier is None or self.tier_of(name) == tier)
+        ]
+
+    def tier_of(self, app: str) -> str:
+        # The tier picked in the row, until it is applied
+        return self.chosen.get(app) or self.apps[app]
+
+    def set_applied(self, app: str, tier: str) -> None:
+        self.apps[app] = tier
+        self.chosen.pop(app, None)
+
+    def select_visible(self) -> None:
+        self.selected.update(self.visible)
+
+
+class _Row:
+    """One recycled set of row widgets; show() rebinds it to another app."""
+
+    def __init__(self, owner: "VirtualAppList", parent):
+        self.owner = owner
+        self.app = None
+        self.frame = ttk.Frame(parent, style="Light.TFrame")
+        self.selected = tk.BooleanVar()
+        ttk.Checkbutton(self.frame, variable=self.selected, command=self._toggle).pack(side="left")
+        self.icon = ttk.Label(self.frame, style="Light.TLabel")
+        self.icon.pack(side="left", padx=(0, 10))
+        self.name = ttk.Label(self.frame, width=20, style="Light.TLabel")
+        self.name.pack(side="left")
+        self.tier = tk.StringVar()
+        self.combo = ttk.Combobox(self.frame, textvariable=self.tier, values=owner.tiers, width=12,
+                                  state="readonly", style="Light.TCombobox")
+        self.combo.pack(side="left", padx=10)
+        self.combo.bind("<<ComboboxSelected>>", self._choose)
+        # The wheel scrolls the list rather than changing the tier under the pointer
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.combo.bind(sequence, owner.wheel)
+        ttk.Button(self.frame, text="Apply", image=owner.icons.get("checkmark"), compound="left",
+                   command=lambda: owner.on_apply(self.app, owner.model.tier_of(self.app)),
+                   style="Light.TButton").pack(side="left", padx=5)
+        ttk.Button(self.frame, text="Remove", image=owner.icons.get("trash"), compound="left",
+                   command=lambda: owner.on_remove(self.app), style="Light.TButton").pack(side="left", padx=5)
+        self.status = ttk.Label(self.frame, text="", width=14, style="Light.TLabel", font=("Arial", 10))
+        self.status.pack(side="left", padx=5)
+
+    def _toggle(self) -> None:
+        if self.selected.get():
+            self.owner.model.selected.add(self.app)
+        else:
+            self.owner.model.selected.discard(self.app)
+        self.owner.update_counts()
+
+    def _choose(self, event) -> None:
+        self.owner.model.chosen[self.app] = self.tier.get()
+
+    def show(self, app: str) -> None:
+        model = self.owner.model
+        if app != self.app:
+            self.app = app
+            self.icon.config(image=self.owner.icons.get(app.split(".")[0]))
+            self.name.config(text=app)
+        self.tier.set(model.tier_of(app))
+        self.selected.set(app in model.selected)
+        text, error = model.status.get(app, ("", False))
+        self.status.config(text=text, foreground="#C62828" if error else "#333333")
+
+
+class VirtualAppList:
+    """Scrolling app list that keeps only enough row widgets to fill its height.
+
+    Scrolling moves whole rows: the same widgets are re-bound to the apps
+    at the new position, so creating the list and scrolling through it cost
+    the same for 12 apps or several thousand.
+    """
+
+    def __init__(self, parent, model: AppListModel, icons, on_apply: Callable[[str, str], None],
+                 on_remove: Callable[[str], None], on_apply_selected: Callable[[List[str], str], None],
+                 row_height: int = 36, tiers: List[str] = TIERS):
+        self.model = model
+        self.tiers = list(tiers)
+        self.icons = icons
+        self.on_apply = on_apply
+        self.on_remove = on_remove
+        self.on_apply_selected = on_apply_selected
+        self.row_height = row_height
+        self.top = 0
+        self.rows: List[_Row] = []
+
+        toolbar = ttk.Frame(parent, style="Light.TFrame")
+        toolbar.pack(fill="x", pady=(0, 5))
+        ttk.Label(toolbar, text="Search:", style="Light.TLabel").pack(side="left")
+        self.query = tk.StringVar()
+        self.query.trace_add("write", lambda *args: self.apply_filter())
+        ttk.Entry(toolbar, textvariable=self.query, width=18).pack(side="left", padx=5)
+        self.tier_filter = tk.StringVar(value=ALL_TIERS)
+        self.tier_combo = ttk.Combobox(toolbar, textvariable=self.tier_filter, values=[ALL_TIERS] + self.tiers,
+                                       width=10, state="readonly", style="Light.TCombobox")
+        self.tier_combo.pack(side="left", padx=5)
+        self.tier_combo.bind("<<ComboboxSelected>>", lambda e: self.apply_filter())
+        self.counts = ttk.Label(toolbar, text="", style="Light.TLabel", font=("Arial", 10))
+        self.counts.pack(side="left", padx=10)
+
+        bulk = ttk.Frame(parent, style="Light.TFrame")
+        bulk.pack(fill="x", pady=(0, 5))
+        ttk.Button(bulk, text="Select Shown", command=self.select_visible,
+                   style="Light.TButton").pack(side="left")
+        ttk.Button(bulk, text="Clear Selection", command=self.clear_selection,
+                   style="Light.TButton").pack(side="left", padx=5)
+        self.bulk_tier = tk.StringVar(value=self.tiers[0])
+        self.bulk_combo = ttk.Combobox(bulk, textvariable=self.bulk_tier, values=self.tiers, width=12,
+                                       state="readonly", style="Light.TCombobox")
+        self.bulk_combo.pack(side="left", padx=5)
+        ttk.Button(bulk, text="Apply to Selected", image=icons.get("checkmark"), compound="left",
+                   command=self._apply_selected, style="Light.TButton").pack(side="left", padx=5)
+
+        body = ttk.Frame(parent, style="Light.TFrame")
+        body.pack(fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(body, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.viewport = ttk.Frame(body, style="Light.TFrame")
+        self.viewport.pack(side="left", fill="both", expand=True)
+        self.viewport.bind("<Configure>", self._resize)
+        self.viewport.bind("<Enter>", lambda e: self._bind_wheel(True))
+        self.viewport.bind("<Leave>", self._leave)
+        self.update_counts()
+
+    def _resize(self, event) -> None:
+        # Grow the pool to cover the new height; rows beyond it are hidden, not destroyed
+        needed = max(1, -(-event.height // self.row_height))
+        while len(self.rows) < needed:
+            row = _Row(self, self.viewport)
+            self.rows.append(row)
+        self.render()
+
+    def _bind_wheel(self, active: bool) -> None:
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            if active:
+                self.viewport.bind_all(sequence, self.wheel)
+            else:
+                self.viewport.unbind_all(sequence)
+
+    def _leave(self, event) -> None:
+        # Moving onto a row also leaves the viewport; only unbind when the pointer left the list
+        widget = self.viewport.winfo_containing(event.x_root, event.y_root)
+        if widget is None or not str(widget).startswith(str(self.viewport)):
+            self._bind_wheel(False)
+
+    def wheel(self, event) -> str:
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.top - 3)
+        else:
+            self.scroll_to(self.top + 3)
+        return "break"
+
+    def page_size(self) -> int:
+        return max(1, self.viewport.winfo_height() // self.row_height)
+
+    def yview(self, action, amount, unit=None) -> None:
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.model.visible)))
+        elif unit == "pages":
+            self.scroll_to(self.top + int(amount) * self.page_size())
+        else:
+            self.scroll_to(self.top + int(amount))
+
+    def scroll_to(self, top: int) -> None:
+        top = max(0, min(top, len(self.model.visible) - self.page_size()))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def render(self) -> None:
+        visible = self.model.visible
+        for i, row in enumerate(self.rows):
+            index = self.top + i
+            if index < len(visible):
+                row.show(visible[index])
+                row.frame.place(x=0, y=i * self.row_height, relwidth=1, height=self.row_height)
+            else:
+                row.app = None
+                row.frame.place_forget()
+        total = len(visible)
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.page_size()) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def set_catalog(self, apps: Dict[str, str], tiers: List[str]) -> None:
+        """Show a reloaded app -> tier catalog and tier list, e.g. after priority.json changed."""
+        self.tiers = list(tiers)
+        self.model.set_apps(apps, self.tiers)
+        self.tier_combo.config(values=[ALL_TIERS] + self.tiers)
+        if self.tier_filter.get() not in self.tiers:
+            self.tier_filter.set(ALL_TIERS)
+        self.bulk_combo.config(values=self.tiers)
+        if self.bulk_tier.get() not in self.tiers and self.tiers:
+            self.bulk_tier.set(self.tiers[0])
+        for row in self.rows:
+            row.combo.config(values=self.tiers)
+        self.scroll_to(self.top)
+        self.render()
+        self.update_counts()
+
+    def refresh_app(self, app: str) -> None:
+        for row in self.rows:
+            if row.app == app:
+                row.show(app)
+
+    def set_status(self, app: str, text: str, error: bool = False) -> None:
+        if text:
+            self.model.status[app] = (text, error)
+        else:
+            self.model.status.pop(app, None)
+        self.refresh_app(app)
+
+    def apply_filter(self) -> None:
+        tier = self.tier_filter.get()
+        self.model.set_filter(self.query.get(), None if tier == ALL_TIERS else tier)
+        self.top = 0
+        self.render()
+        self.update_counts()
+
+    def update_counts(self) -> None:
+        self.counts.config(text=f"{len(self.model.visible)} shown, {len(self.model.selected)} selected")
+
+    def select_visible(self) -> None:
+        self.model.select_visible()
+        self.render()
+        self.update_counts()
+
+    def clear_selection(self) -> None:
+        self.model.selected.clear()
+        self.render()
+        self.update_counts()
+
+    def deselect(self, apps: List[str]) -> None:
+        self.model.selected.difference_update(apps)
+        self.render()
+        self.update_counts()
+
+    def _apply_selected(self) -> None:
+        # Catalog order, not click order, so the batch is the same however it was picked
+        apps = [name for name in self.model.names if name in self.model.selected]
+        if apps:
+            self.on_apply_selected(apps, self.bulk_tier.get())
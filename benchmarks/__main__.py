@@ -0,0 +1,57 @@
+import argparse
+import fnmatch
+import logging
+import sys
+import time
+
+from benchmarks import harness
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Run the collection, parsing and reconciliation benchmarks")
+    parser.add_argument("-k", "--filter", help="Only run cases whose name matches this glob")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per repeat")
+    parser.add_argument("--quick", action="store_true", help="One short repeat per case")
+    parser.add_argument("--save", action="store_true", help=f"Append the results to {harness.RESULTS_FILE}")
+    parser.add_argument("--results", default=harness.RESULTS_FILE, help="Results history file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat, args.min_time = 1, 0.05
+
+    # Library logging would otherwise dominate the timings
+    logging.basicConfig(level=logging.WARNING)
+    from benchmarks import cases  # noqa: F401 - registers the cases
+
+    env = harness.environment()
+    record = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": env, "results": {}}
+    for case in harness.cases():
+        if args.filter and not fnmatch.fnmatch(case.name, args.filter):
+            continue
+        try:
+            state = case.setup() if case.setup else None
+        except ImportError as e:
+            print(f"{case.name:<52} skipped ({e})")
+            continue
+        try:
+            result = harness.measure(case.func, state, args.repeat, args.min_time)
+        finally:
+            if case.teardown:
+                case.teardown(state)
+        record["results"][case.name] = result
+        print(f"{case.name:<52} {harness.format_time(result['median']):>10}/{case.unit}"
+              f"  (min {harness.format_time(result['min'])}, {result['ops_per_sec']:,.0f} {case.unit}/s)")
+
+    baseline = harness.load_baseline(env, args.results)
+    regressions = harness.compare(record, baseline, args.threshold) if baseline else []
+    if args.save:
+        harness.save(record, args.results)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Benchmark cases; every external system is replaced by a synthetic, hand-written fixture."""
+import asyncio
+import json
+import os
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.harness import benchmark
+from config import ConfigStore
+from reconcile import (InMemoryPolicyStore, PolicyReconciler, PowerShellPolicyStore, QosPolicy,
+                       app_policies, diff_policies)
+from stats_backend import PowerShellBackend, StatsBackend
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+DSCP_TO_TIER = {46: "Ultra High", 34: "High", 28: "Medium", 10: "Low"}
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def synthetic_qos_output(count: int) -> str:
+    """Synthetic Get-NetQosPolicy rows repeated to `count` policies, in ConvertTo-Json layout."""
+    rows = json.loads(load_fixture("get_qos_stats.json"))
+    policies = []
+    for i in range(count):
+        row = dict(rows[i % len(rows)])
+        row["Name"] = f"{row['Name']}_{i}"
+        policies.append(row)
+    return json.dumps(policies, indent=4)
+
+
+class FixturePool:
+    """Stands in for SessionPool: answers each command from a fixture, matched by prefix."""
+
+    def __init__(self, responses: Dict[str, str]):
+        self.responses = responses
+        self.calls = 0
+
+    def run(self, command: str, timeout: Optional[float] = None) -> str:
+        self.calls += 1
+        for prefix, output in self.responses.items():
+            if command.startswith(prefix):
+                return output
+        return ""
+
+    def stream(self, command: str, timeout: Optional[float] = None) -> Iterator[str]:
+        # Line-sized chunks, the way the streaming session protocol delivers them
+        return iter(self.run(command, timeout).splitlines(keepends=True))
+
+
+class FakeBackend(StatsBackend):
+    """Counters that grow by a fixed amount every read."""
+
+    def __init__(self, dscp_to_tier: Dict[int, str]):
+        super().__init__(dscp_to_tier)
+        self.reads = 0
+
+    def detect_interface(self) -> str:
+        return "bench0"
+
+    def get_qos_stats(self, interface: str) -> Dict:
+        self.reads += 1
+        return {tier: {"bytes": self.reads * 125000, "packets": self.reads * 100}
+                for tier in self.dscp_to_tier.values()}
+
+    def get_interface_stats(self, interface: str) -> Dict:
+        return {"input_bytes": self.reads * 500000, "output_bytes": self.reads * 250000,
+                "input_packets": self.reads * 400, "output_packets": self.reads * 200}
+
+
+# --- Parsing -----------------------------------------------------------------
+
+def _parse_state(count: int):
+    return PowerShellBackend(DSCP_TO_TIER, pool=FixturePool({})), synthetic_qos_output(count)
+
+
+for _count in (100, 1000, 10000):
+    benchmark(f"parse_qos_output[{_count} policies]", setup=lambda c=_count: _parse_state(c))(
+        lambda state: state[0]._parse_qos_output(state[1]))
+
+
+@benchmark("parse_qos_stream[10000 policies, line chunks]",
+           setup=lambda: (lambda state: (state[0], state[1].splitlines(keepends=True)))(_parse_state(10000)))
+def parse_qos_stream(state) -> None:
+    backend, lines = state
+    backend._parse_qos_stream(lines)
+
+
+@benchmark("parse_interface_output",
+           setup=lambda: (_parse_state(0)[0], load_fixture("get_interface_stats.json")))
+def parse_interface_output(state) -> None:
+    backend, output = state
+    backend._parse_interface_output(output)
+
+
+# --- Monitor tick --------------------------------------------------------------
+
+def _tick_state(backend: StatsBackend):
+    from monitor_traffic import WindowsTrafficMonitor
+    from scheduler import SampleScheduler
+    monitor = WindowsTrafficMonitor(backend=backend, interface="bench0")
+    monitor.print_samples = False
+    scheduler = SampleScheduler([monitor])
+    loop = asyncio.new_event_loop()
+    return loop, scheduler, monitor, [0]
+
+
+def _tick(state) -> None:
+    loop, scheduler, monitor, tick = state
+    tick[0] += 1
+    sample = loop.run_until_complete(scheduler.collect(monitor, tick[0]))
+    monitor.handle_sample(sample)
+
+
+benchmark("monitor_tick[fake backend]", setup=lambda: _tick_state(FakeBackend(DSCP_TO_TIER)), unit="tick")(_tick)
+benchmark(
+    "monitor_tick[powershell fixture, 1000 policies]",
+    setup=lambda: _tick_state(PowerShellBackend(DSCP_TO_TIER, pool=FixturePool({
+        "Get-NetQosPolicy": synthetic_qos_output(1000),
+        "Get-NetAdapterStatistics": load_fixture("get_interface_stats.json"),
+    }))),
+    unit="tick"
+)(_tick)
+
+
+# --- Process matching -----------------------------------------------------------
+
+PRIORITY_APPS = {"zoom.exe": 46, "discord.exe": 46, "valorant.exe": 46, "steam.exe": 10}
+
+
+def _process_index(count: int):
+    from process_index import ProcessIndex
+
+    names = json.loads(load_fixture("processes.json"))
+
+    class FixtureProcessIndex(ProcessIndex):
+        """Process table built from the fixture's names; `churn` PIDs are replaced per refresh."""
+
+        def __init__(self):
+            super().__init__(ttl=float("inf"))
+            self.table = {pid: names[pid % len(names)] for pid in range(4, 4 + count)}
+            self.next_pid = 4 + count
+
+        def _list_pids(self) -> List[int]:
+            return list(self.table)
+
+        def _inspect(self, pid: int):
+            entry = self.table.get(pid)
+            return None if entry is None else (entry[0], entry[1])
+
+        def churn(self, n: int) -> None:
+            for pid in list(self.table)[:n]:
+                entry = self.table.pop(pid)
+                self.table[self.next_pid] = entry
+                self.next_pid += 1
+
+    return FixtureProcessIndex()
+
+
+@benchmark("process_index.refresh[cold, 10000 processes]", setup=lambda: _process_index(10000))
+def cold_refresh(index) -> None:
+    index._by_pid.clear()
+    index._by_name.clear()
+    index.refresh()
+
+
+@benchmark("process_index.refresh[100 churned of 10000]", setup=lambda: _process_index(10000))
+def warm_refresh(index) -> None:
+    if not index._by_pid:
+        index.refresh()
+    index.churn(100)
+    index.refresh()
+
+
+def _warm_index(count: int):
+    index = _process_index(count)
+    index.refresh()
+    return index
+
+
+@benchmark("process_index.running[10000 processes]", setup=lambda: _warm_index(10000))
+def running_lookup(index) -> None:
+    index.running(PRIORITY_APPS)
+
+
+# --- Policy apply / clear --------------------------------------------------------
+
+def _app_policies(count: int) -> Dict[str, QosPolicy]:
+    apps = {f"app{i}.exe": (46, 34, 28, 10)[i % 4] for i in range(count)}
+    return app_policies(apps, {name: f"C:\\Apps\\{name}" for name in apps})
+
+
+@benchmark("reconcile.apply[1000 creates, in-memory store]", setup=lambda: _app_policies(1000))
+def apply_policies(desired) -> None:
+    PolicyReconciler(InMemoryPolicyStore()).reconcile(desired)
+
+
+@benchmark("reconcile.clear[1000 deletes, in-memory store]", setup=lambda: _app_policies(1000))
+def clear_policies(desired) -> None:
+    PolicyReconciler(InMemoryPolicyStore(desired.values())).reconcile({})
+
+
+def _applied_state(count: int):
+    desired = _app_policies(count)
+    return desired, PolicyReconciler(InMemoryPolicyStore(desired.values()))
+
+
+@benchmark("reconcile.noop[1000 unchanged, in-memory store]", setup=lambda: _applied_state(1000))
+def noop_policies(state) -> None:
+    desired, reconciler = state
+    reconciler.reconcile(desired)
+
+
+@benchmark("powershell_store.build_script[1000 creates]",
+           setup=lambda: (PowerShellPolicyStore(pool=FixturePool({}), timeout=1),
+                          diff_policies(_app_policies(1000), {}, ("Auto_",))))
+def build_script(state) -> None:
+    store, plan = state
+    store.build_script(plan)
+
+
+def _listing_store(copies: int) -> PowerShellPolicyStore:
+    rows = json.loads(load_fixture("list_policies.json"))
+    output = json.dumps([dict(row, Name=f"{row['Name']}_{i}") for i in range(copies) for row in rows],
+                        separators=(",", ":"))
+    return PowerShellPolicyStore(pool=FixturePool({"@(Get-NetQosPolicy": output}))
+
+
+@benchmark("powershell_store.list_policies[1002 synthetic policies]", setup=lambda: _listing_store(334))
+def list_policies(store) -> None:
+    store.list_policies()
+
+
+# --- Config loading --------------------------------------------------------------
+
+def _config_store(apps: int) -> Tuple[ConfigStore, tempfile.TemporaryDirectory]:
+    # The shipped priority.json with a large app catalog, in a scratch directory removed by teardown
+    with open(os.path.join(os.path.dirname(FIXTURES), os.pardir, "priority.json")) as f:
+        document = json.load(f)
+    tiers = [level["name"] for level in document["priority_levels"]]
+    document["apps"] = {f"app{i}.exe": tiers[i % len(tiers)] for i in range(apps)}
+    directory = tempfile.TemporaryDirectory(prefix="qos-bench-")
+    store = ConfigStore(os.path.join(directory.name, "priority.json"), os.path.join(directory.name, "settings.json"))
+    store.save_priority(document)
+    return store, directory
+
+
+def _remove_config_store(state) -> None:
+    state[1].cleanup()
+
+
+@benchmark("config.get[unchanged files, 1000 apps]", setup=lambda: _config_store(1000),
+           teardown=_remove_config_store)
+def config_cached(state) -> None:
+    state[0].get()
+
+
+@benchmark("config.get[reload and validate, 1000 apps]", setup=lambda: _config_store(1000),
+           teardown=_remove_config_store)
+def config_reload(state) -> None:
+    state[0].refresh(force=True)
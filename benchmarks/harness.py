@@ -0,0 +1,128 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Callable, Dict, List, Optional
+
+RESULTS_FILE = os.path.join(os.path.dirname(__file__), "results.jsonl")
+
+_cases: List["Case"] = []
+
+
+class Case:
+    __slots__ = ("name", "func", "setup", "unit", "teardown")
+
+    def __init__(self, name: str, func: Callable, setup: Optional[Callable], unit: str,
+                 teardown: Optional[Callable] = None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.unit = unit
+        self.teardown = teardown
+
+
+def benchmark(name: str, setup: Optional[Callable] = None, unit: str = "op", teardown: Optional[Callable] = None):
+    """Register func(state) as a case; setup() builds state once, outside the timing, and teardown(state) releases it."""
+    def register(func: Callable) -> Callable:
+        _cases.append(Case(name, func, setup, unit, teardown))
+        return func
+    return register
+
+
+def cases() -> List[Case]:
+    return list(_cases)
+
+
+def measure(func: Callable, state, repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    # Calibrate the loop count so one repeat takes at least min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func(state)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(state)
+        timings.append((time.perf_counter() - start) / number)
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        "loops": number,
+        "repeat": repeat,
+        "min": timings[0],
+        "median": median,
+        "max": timings[-1],
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "ops_per_sec": 1.0 / median if median else 0.0,
+    }
+
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "platform": platform.platform(),
+    }
+
+
+def save(record: Dict, path: str = RESULTS_FILE) -> None:
+    with open(path, "a") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def load_baseline(env: Dict[str, str], path: str = RESULTS_FILE) -> Optional[Dict]:
+    """Latest saved run from the same machine and interpreter."""
+    if not os.path.exists(path):
+        return None
+    baseline = None
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            other = record.get("environment", {})
+            if all(other.get(k) == env.get(k) for k in ("node", "machine", "python", "implementation")):
+                baseline = record
+    return baseline
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Names of cases whose median got slower than baseline by more than threshold."""
+    regressions = []
+    base_results = baseline.get("results", {})
+    print(f"\nCompared with {baseline['environment'].get('commit') or 'unknown'} ({baseline['timestamp']}):")
+    for name, result in current["results"].items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"  {name:<48} new")
+            continue
+        change = result["median"] / base["median"] - 1 if base["median"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<48} {change:+7.1%}{flag}")
+    return regressions
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import heapq
+import logging
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from config import load_config
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_NUMBERS = {"tcp": 6, "udp": 17}
+PROTOCOL_NAMES = {number: name for name, number in PROTOCOL_NUMBERS.items()}
+
+
+class PortRule:
+    __slots__ = ("precedence", "tier", "app", "protocol", "start", "end")
+
+    def __init__(self, precedence: int, tier: str, app: str, protocol: str, start: int, end: int):
+        self.precedence = precedence
+        self.tier = tier
+        self.app = app
+        self.protocol = protocol
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"{self.tier}/{self.app} {self.protocol} {self.start}-{self.end}"
+
+
+class RuleConflict:
+    __slots__ = ("kind", "rule", "winners")
+
+    def __init__(self, kind: str, rule: PortRule, winners: List[PortRule]):
+        self.kind = kind
+        self.rule = rule
+        self.winners = winners
+
+    def __str__(self) -> str:
+        winners = ", ".join(repr(w) for w in self.winners)
+        if self.kind == "shadowed":
+            return f"{self.rule!r} is fully shadowed by {winners}"
+        return f"{self.rule!r} overlaps {winners}, which take precedence"
+
+
+def _normalize_protocol(protocol: Union[str, int]) -> str:
+    if isinstance(protocol, int):
+        return PROTOCOL_NAMES.get(protocol, str(protocol))
+    return protocol.lower()
+
+
+class PortClassifier:
+    """(protocol, port) -> tier lookups compiled from priority.json.
+
+    Rules are flattened into sorted, non-overlapping ranges per protocol and
+    searched with bisect. Where rules overlap, the tier listed earlier in
+    priority.json wins, then the application listed earlier within the tier,
+    the same precedence the tc and nftables rules use.
+    """
+
+    def __init__(self, priority_levels: List[Dict]):
+        self.tiers: List[str] = [level["name"] for level in priority_levels]
+        self.rules: List[PortRule] = []
+        for tier_index, level in enumerate(priority_levels):
+            for app in level.get("applications", []):
+                for rule in app.get("ports", []):
+                    protocol = rule.get("protocol", "both").lower()
+                    start, end = int(rule["start"]), int(rule.get("end", rule["start"]))
+                    for proto in (("tcp", "udp") if protocol == "both" else (protocol,)):
+                        self.rules.append(PortRule(len(self.rules), level["name"], app["name"], proto, start, end))
+        # Precedence follows file order: tier first, then application, then rule
+        self.rules.sort(key=lambda r: (self.tiers.index(r.tier), r.precedence))
+        for precedence, rule in enumerate(self.rules):
+            rule.precedence = precedence
+
+        self.conflicts: List[RuleConflict] = []
+        self._starts: Dict[str, array] = {}
+        self._ends: Dict[str, array] = {}
+        self._tier_ids: Dict[str, array] = {}
+        for proto in sorted({r.protocol for r in self.rules}):
+            self._compile(proto, [r for r in self.rules if r.protocol == proto])
+        for conflict in self.conflicts:
+            if conflict.winners and any(w.tier != conflict.rule.tier for w in conflict.winners):
+                logger.warning(f"Port rule conflict: {conflict}")
+
+    def _compile(self, proto: str, rules: List[PortRule]) -> None:
+        # Sweep the elementary intervals between rule boundaries, keeping the
+        # active rules in a heap ordered by precedence
+        boundaries = sorted({r.start for r in rules} | {r.end + 1 for r in rules})
+        by_start = sorted(rules, key=lambda r: r.start)
+        active, next_rule = [], 0
+        won = {r.precedence: False for r in rules}
+        lost_to: Dict[int, Dict[int, PortRule]] = {r.precedence: {} for r in rules}
+        starts, ends, tier_ids = array("l"), array("l"), array("l")
+
+        for lo, hi in zip(boundaries, boundaries[1:]):
+            while next_rule < len(by_start) and by_start[next_rule].start <= lo:
+                rule = by_start[next_rule]
+                heapq.heappush(active, (rule.precedence, rule))
+                next_rule += 1
+            while active and active[0][1].end < lo:
+                heapq.heappop(active)
+            covering = [rule for _, rule in active if rule.end >= lo]
+            if not covering:
+                continue
+            winner = min(covering, key=lambda r: r.precedence)
+            won[winner.precedence] = True
+            for rule in covering:
+                if rule is not winner:
+                    lost_to[rule.precedence][winner.precedence] = winner
+            tier_id = self.tiers.index(winner.tier)
+            # Merge with the previous range when contiguous and in the same tier
+            if ends and ends[-1] == lo - 1 and tier_ids[-1] == tier_id:
+                ends[-1] = hi - 1
+            else:
+                starts.append(lo)
+                ends.append(hi - 1)
+                tier_ids.append(tier_id)
+
+        for rule in rules:
+            winners = list(lost_to[rule.precedence].values())
+            if not winners:
+                continue
+            kind = "overlap" if won[rule.precedence] else "shadowed"
+            self.conflicts.append(RuleConflict(kind, rule, winners))
+        self._starts[proto] = starts
+        self._ends[proto] = ends
+        self._tier_ids[proto] = tier_ids
+
+    @property
+    def protocols(self) -> List[str]:
+        return sorted(self._starts)
+
+    def ranges(self, protocol: Union[str, int]) -> List[Tuple[int, int, str]]:
+        """Resolved (start, end, tier) ranges of one protocol: sorted, non-overlapping, precedence applied.
+
+        Enforcement backends install these instead of the raw rules, so a
+        shadowed range never becomes a filter.
+        """
+        proto = _normalize_protocol(protocol)
+        if proto not in self._starts:
+            return []
+        return [(start, end, self.tiers[tier_id])
+                for start, end, tier_id in zip(self._starts[proto], self._ends[proto], self._tier_ids[proto])]
+
+    def classify(self, protocol: Union[str, int], port: int) -> Optional[str]:
+        proto = _normalize_protocol(protocol)
+        starts = self._starts.get(proto)
+        if starts is None:
+            return None
+        i = bisect_right(starts, port) - 1
+        if i >= 0 and port <= self._ends[proto][i]:
+            return self.tiers[self._tier_ids[proto][i]]
+        return None
+
+    def classify_ids(self, protocols: Sequence, ports: Sequence[int]):
+        """Tier index per flow (-1 for unclassified); one searchsorted per protocol with NumPy."""
+        if np is None:
+            result = array("l", [-1]) * len(ports)
+            for i, (protocol, port) in enumerate(zip(protocols, ports)):
+                tier = self.classify(protocol, port)
+                if tier is not None:
+                    result[i] = self.tiers.index(tier)
+            return result
+
+        ports = np.asarray(ports, dtype=np.int64)
+        protocols = np.asarray(protocols)
+        result = np.full(len(ports), -1, dtype=np.int64)
+        for proto, starts in self._starts.items():
+            if not len(starts):
+                continue
+            if protocols.dtype.kind in "iu":
+                mask = protocols == PROTOCOL_NUMBERS.get(proto, -1)
+            else:
+                mask = np.char.lower(protocols.astype(str)) == proto
+            if not mask.any():
+                continue
+            selected = ports[mask]
+            starts_np = np.frombuffer(starts, dtype=np.dtype(starts.typecode))
+            idx = np.searchsorted(starts_np, selected, side="right") - 1
+            ends_np = np.frombuffer(self._ends[proto], dtype=np.dtype(starts.typecode))
+            tiers_np = np.frombuffer(self._tier_ids[proto], dtype=np.dtype(starts.typecode))
+            safe = np.clip(idx, 0, None)
+            hit = (idx >= 0) & (selected <= ends_np[safe])
+            result[np.flatnonzero(mask)[hit]] = tiers_np[safe[hit]]
+        return result
+
+    def classify_many(self, protocols: Sequence, ports: Sequence[int]) -> List[Optional[str]]:
+        return [self.tiers[i] if i >= 0 else None for i in self.classify_ids(protocols, ports)]
+
+
+def load_classifier(priority_file: str = "priority.json") -> PortClassifier:
+    return PortClassifier(load_config(priority_file).priority_levels())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    classifier = load_classifier()
+    for conflict in classifier.conflicts:
+        print(conflict)
@@ -1,13 +1,14 @@
-import subprocess
+import argparse
 
-apps = ["zoom.exe", "discord.exe", "valorant.exe", "steam.exe"]
+from reconcile import POLICY_PREFIX, PolicyReconciler, print_plan
 
-for app in apps:
-    app_base = app.split(".")[0].lower()  # Removes .exe
-    name = f"Auto_{app_base}"
+parser = argparse.ArgumentParser(description="Remove every Auto_* QoS policy in one batch")
+parser.add_argument("--dry-run", action="store_true", help="Show what would be removed")
+args = parser.parse_args()
+
+# An empty desired set removes every managed policy in a single script
+plan = PolicyReconciler().reconcile({}, prefixes=(POLICY_PREFIX,), dry_run=args.dry_run)
+for name in plan.deletes:
     print(f"Removing QoS policy: {name}")
-    subprocess.run([
-        "powershell",
-        "-Command",
-        f"try {{ Remove-NetQosPolicy -Name '{name}' -Confirm:$false }} catch {{ }}"
-    ], shell=True)
+if args.dry_run:
+    print_plan(plan)
@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_FILE = "priority.json"
+SETTINGS_FILE = "settings.json"
+
+# DSCP values used for each priority tier unless its level sets "dscp"
+TIER_TO_DSCP = {
+    "Ultra High": 46,
+    "High": 34,
+    "Medium": 28,
+    "Low": 10
+}
+# Shares used when there is no priority.json at all
+DEFAULT_SHARES = {"Ultra High": 40, "High": 30, "Medium": 20, "Low": 10}
+PROTOCOLS = ("tcp", "udp", "both")
+
+
+class ConfigError(ValueError):
+    """A config file that does not match the schema; the message names the field."""
+
+
+@dataclass(frozen=True, slots=True)
+class PortRange:
+    start: int
+    end: int
+    protocol: str = "both"
+
+
+@dataclass(frozen=True, slots=True)
+class Application:
+    name: str
+    ports: Tuple[PortRange, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Tier:
+    name: str
+    dscp: int
+    bandwidth_percent: float
+    min_percent: Optional[float] = None
+    max_percent: Optional[float] = None
+    applications: Tuple[Application, ...] = ()
+
+    def level(self) -> Dict:
+        """The tier in priority.json layout, as PortClassifier, compile_tc and tier_bounds take it."""
+        level = {"name": self.name, "dscp": self.dscp, "bandwidth_percent": self.bandwidth_percent}
+        if self.min_percent is not None:
+            level["min_percent"] = self.min_percent
+        if self.max_percent is not None:
+            level["max_percent"] = self.max_percent
+        level["applications"] = [
+            {"name": app.name, "ports": [{"start": p.start, "end": p.end, "protocol": p.protocol} for p in app.ports]}
+            for app in self.applications
+        ]
+        return level
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    interface: str = "Ethernet"
+    dashboard_fps: float = 4.0
+
+
+@dataclass(frozen=True, slots=True)
+class QosConfig:
+    """Everything read from priority.json and settings.json, validated.
+
+    Tiers keep file order, which is also their precedence. `apps` pairs an
+    executable name with the tier its Auto_<app> policy gets.
+    """
+
+    tiers: Tuple[Tier, ...]
+    apps: Tuple[Tuple[str, str], ...] = ()
+    settings: Settings = Settings()
+
+    def tier(self, name: str) -> Optional[Tier]:
+        return next((tier for tier in self.tiers if tier.name == name), None)
+
+    def tier_to_dscp(self) -> Dict[str, int]:
+        return {tier.name: tier.dscp for tier in self.tiers}
+
+    def dscp_to_tier(self) -> Dict[int, str]:
+        return {tier.dscp: tier.name for tier in self.tiers}
+
+    def app_tiers(self) -> Dict[str, str]:
+        return dict(self.apps)
+
+    def app_dscp(self) -> Dict[str, int]:
+        dscp = self.tier_to_dscp()
+        return {app: dscp[tier] for app, tier in self.apps}
+
+    def priority_levels(self) -> List[Dict]:
+        return [tier.level() for tier in self.tiers]
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigDiff:
+    """What changed between two configs, by tier name, executable and settings field."""
+
+    tiers_added: Tuple[str, ...] = ()
+    tiers_removed: Tuple[str, ...] = ()
+    tiers_changed: Tuple[str, ...] = ()
+    reordered: bool = False
+    # (exe, new tier); the tier is None when the app was removed
+    apps: Tuple[Tuple[str, Optional[str]], ...] = ()
+    settings: Tuple[str, ...] = ()
+
+    @property
+    def tiers(self) -> bool:
+        return bool(self.tiers_added or self.tiers_removed or self.tiers_changed or self.reordered)
+
+    def __bool__(self) -> bool:
+        return self.tiers or bool(self.apps or self.settings)
+
+    def summary(self) -> str:
+        parts = []
+        for label, names in (("added", self.tiers_added), ("removed", self.tiers_removed),
+                             ("changed", self.tiers_changed)):
+            if names:
+                parts.append(f"tiers {label}: {', '.join(names)}")
+        if self.reordered:
+            parts.append("tiers reordered")
+        if self.apps:
+            parts.append(f"{len(self.apps)} apps moved")
+        if self.settings:
+            parts.append(f"settings changed: {', '.join(self.settings)}")
+        return "; ".join(parts) or "no changes"
+
+
+def diff_configs(old: QosConfig, new: QosConfig) -> ConfigDiff:
+    old_tiers = {tier.name: tier for tier in old.tiers}
+    new_tiers = {tier.name: tier for tier in new.tiers}
+    kept_old = [name for name in old_tiers if name in new_tiers]
+    kept_new = [name for name in new_tiers if name in old_tiers]
+    old_apps, new_apps = old.app_tiers(), new.app_tiers()
+    return ConfigDiff(
+        tiers_added=tuple(name for name in new_tiers if name not in old_tiers),
+        tiers_removed=tuple(name for name in old_tiers if name not in new_tiers),
+        tiers_changed=tuple(name for name in kept_new if old_tiers[name] != new_tiers[name]),
+        reordered=kept_old != kept_new,
+        apps=tuple((app, new_apps.get(app)) for app in sorted(old_apps.keys() | new_apps.keys())
+                   if old_apps.get(app) != new_apps.get(app)),
+        settings=tuple(f.name for f in fields(Settings)
+                       if getattr(old.settings, f.name) != getattr(new.settings, f.name))
+    )
+
+
+# --- Schema --------------------------------------------------------------------
+
+def _fail(where: str, message: str):
+    raise ConfigError(f"{where}: {message}")
+
+
+def _object(value, where: str) -> Dict:
+    if not isinstance(value, dict):
+        _fail(where, "must be an object")
+    return value
+
+
+def _list(value, where: str) -> List:
+    if not isinstance(value, list):
+        _fail(where, "must be a list")
+    return value
+
+
+def _text(value, where: str) -> str:
+    if not isinstance(value, str) or not value.strip():
+        _fail(where, "must be a non-empty string")
+    return value
+
+
+def _number(value, where: str, low: float, high: float):
+    # bool is an int subclass; true/false are never meant as numbers here
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        _fail(where, f"must be a number from {low:g} to {high:g}")
+    return value
+
+
+def _integer(value, where: str, low: int, high: int) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        _fail(where, f"must be an integer from {low} to {high}")
+    return value
+
+
+def _port_range(rule, where: str) -> PortRange:
+    rule = _object(rule, where)
+    start = _integer(rule.get("start"), f"{where}.start", 1, 65535)
+    end = _integer(rule.get("end", start), f"{where}.end", start, 65535)
+    protocol = _text(rule.get("protocol", "both"), f"{where}.protocol").lower()
+    if protocol not in PROTOCOLS:
+        _fail(f"{where}.protocol", f"must be one of {', '.join(PROTOCOLS)}")
+    return PortRange(start, end, protocol)
+
+
+def _tier(level, where: str) -> Tier:
+    level = _object(level, where)
+    name = _text(level.get("name"), f"{where}.name")
+    if "dscp" in level:
+        dscp = _integer(level["dscp"], f"{where}.dscp", 1, 63)
+    elif name in TIER_TO_DSCP:
+        dscp = TIER_TO_DSCP[name]
+    else:
+        _fail(f"{where}.dscp", f"is required for tier {name!r}, which has no default DSCP value")
+    share = _number(level.get("bandwidth_percent"), f"{where}.bandwidth_percent", 0, 100)
+    low = level.get("min_percent")
+    high = level.get("max_percent")
+    if low is not None:
+        low = _number(low, f"{where}.min_percent", 0, 100)
+    if high is not None:
+        high = _number(high, f"{where}.max_percent", 0 if low is None else low, 100)
+    applications = []
+    for i, app in enumerate(_list(level.get("applications", []), f"{where}.applications")):
+        app_where = f"{where}.applications[{i}]"
+        app = _object(app, app_where)
+        ports = _list(app.get("ports", []), f"{app_where}.ports")
+        applications.append(Application(
+            _text(app.get("name"), f"{app_where}.name"),
+            tuple(_port_range(rule, f"{app_where}.ports[{j}]") for j, rule in enumerate(ports))
+        ))
+    return Tier(name, dscp, share, low, high, tuple(applications))
+
+
+def parse_priority(document) -> Tuple[Tuple[Tier, ...], Tuple[Tuple[str, str], ...]]:
+    """Validate a priority.json document; returns its tiers and (exe, tier) pairs."""
+    document = _object(document, "document")
+    levels = _list(document.get("priority_levels"), "priority_levels")
+    if not levels:
+        _fail("priority_levels", "must list at least one tier")
+    tiers = tuple(_tier(level, f"priority_levels[{i}]") for i, level in enumerate(levels))
+    seen_names, seen_dscp = set(), {}
+    for i, tier in enumerate(tiers):
+        if tier.name in seen_names:
+            _fail(f"priority_levels[{i}].name", f"duplicate tier {tier.name!r}")
+        if tier.dscp in seen_dscp:
+            _fail(f"priority_levels[{i}].dscp", f"DSCP {tier.dscp} is already used by {seen_dscp[tier.dscp]!r}")
+        seen_names.add(tier.name)
+        seen_dscp[tier.dscp] = tier.name
+    if sum(tier.bandwidth_percent for tier in tiers) > 100:
+        _fail("priority_levels", "bandwidth_percent adds up to more than 100")
+
+    apps = []
+    seen_apps = set()
+    for app, tier in _object(document.get("apps", {}), "apps").items():
+        _text(app, "apps")
+        if _text(tier, f"apps.{app}") not in seen_names:
+            _fail(f"apps.{app}", f"unknown tier {tier!r}")
+        if app.lower() in seen_apps:
+            _fail(f"apps.{app}", "listed twice")
+        seen_apps.add(app.lower())
+        apps.append((app, tier))
+    return tiers, tuple(apps)
+
+
+def parse_settings(document) -> Settings:
+    document = _object(document, "document")
+    unknown = set(document) - {f.name for f in fields(Settings)}
+    if unknown:
+        logger.warning(f"Ignoring unknown settings: {', '.join(sorted(unknown))}")
+    defaults = Settings()
+    return Settings(
+        interface=_text(document.get("interface", defaults.interface), "interface"),
+        dashboard_fps=float(_number(document.get("dashboard_fps", defaults.dashboard_fps), "dashboard_fps", 0.1, 60))
+    )
+
+
+def default_config() -> QosConfig:
+    return QosConfig(tuple(Tier(name, dscp, DEFAULT_SHARES[name]) for name, dscp in TIER_TO_DSCP.items()))
+
+
+# --- Loading -------------------------------------------------------------------
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _read_json(path: str):
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise ConfigError(f"{path}: not valid JSON: {e}")
+
+
+def _write_json(path: str, document) -> None:
+    # Write-then-rename so a reader (or the watch thread) never sees a half-written file
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+        json.dump(document, f, indent=2)
+        tmp = f.name
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+class ConfigStore:
+    """priority.json and settings.json behind one validated, cached QosConfig.
+
+    get() stats both files and only re-reads them when a size or mtime
+    changed, so it is cheap enough to call per sample. A missing file means
+    defaults. A file that fails validation is rejected: the first load
+    raises ConfigError, a reload logs it and keeps that file's last good
+    contents.
+
+    Subscribers are called with (config, diff) after every reload that
+    changed something, on the thread that noticed it - the watch() thread
+    when one is running - and should hand the work to their own thread.
+    They run outside the store's lock, one change at a time and in order,
+    so a slow subscriber never blocks get() elsewhere and may call it itself.
+    """
+
+    def __init__(self, priority_file: str = PRIORITY_FILE, settings_file: str = SETTINGS_FILE):
+        self.priority_file = priority_file
+        self.settings_file = settings_file
+        self._lock = threading.RLock()
+        self._stamps = None
+        self._config: Optional[QosConfig] = None
+        self._subscribers: List[Callable[[QosConfig, ConfigDiff], None]] = []
+        self._changes: Deque[Tuple[QosConfig, ConfigDiff]] = deque()
+        self._notifying = False
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.loads = 0
+        self.rejected = 0
+
+    def _load_priority(self) -> Tuple[Tuple[Tier, ...], Tuple[Tuple[str, str], ...]]:
+        if not os.path.exists(self.priority_file):
+            logger.info(f"No {self.priority_file}, using the default tiers")
+            return default_config().tiers, ()
+        document = _read_json(self.priority_file)
+        try:
+            return parse_priority(document)
+        except ConfigError as e:
+            raise ConfigError(f"{self.priority_file}: {e}")
+
+    def _load_settings(self) -> Settings:
+        if not os.path.exists(self.settings_file):
+            return Settings()
+        document = _read_json(self.settings_file)
+        try:
+            return parse_settings(document)
+        except ConfigError as e:
+            raise ConfigError(f"{self.settings_file}: {e}")
+
+    def _try_load(self, load: Callable, first: bool):
+        try:
+            return load()
+        except (OSError, ConfigError) as e:
+            if first:
+                raise
+            self.rejected += 1
+            logger.error(f"Keeping the previous config: {e}")
+            return None
+
+    def _reload(self, force: bool = False) -> Optional[ConfigDiff]:
+        # Caller holds the lock; a change is queued for _notify
+        stamps = (_stamp(self.priority_file), _stamp(self.settings_file))
+        if stamps == self._stamps and not force:
+            return None
+        old = self._config
+        first = old is None
+        tiers, apps, settings = (None, None, None) if first else (old.tiers, old.apps, old.settings)
+        if first or force or stamps[0] != self._stamps[0]:
+            loaded = self._try_load(self._load_priority, first)
+            if loaded is not None:
+                tiers, apps = loaded
+        if first or force or stamps[1] != self._stamps[1]:
+            loaded = self._try_load(self._load_settings, first)
+            if loaded is not None:
+                settings = loaded
+        # The stamps are kept even for a rejected file, so it is reported once, not on every poll
+        self._stamps = stamps
+        config = self._config = QosConfig(tiers, apps, settings)
+        self.loads += 1
+        if first:
+            return None
+        diff = diff_configs(old, config)
+        if not diff:
+            return None
+        logger.info(f"Config reloaded: {diff.summary()}")
+        self._changes.append((config, diff))
+        return diff
+
+    def _notify(self) -> None:
+        # Whichever thread finds changes queued delivers them all, unless another already is
+        with self._lock:
+            if self._notifying or not self._changes:
+                return
+            self._notifying = True
+        failure = None
+        try:
+            while True:
+                with self._lock:
+                    if not self._changes:
+                        self._notifying = False
+                        break
+                    config, diff = self._changes.popleft()
+                    subscribers = list(self._subscribers)
+                # Every subscriber sees the change even if an earlier one fails
+                for callback in subscribers:
+                    try:
+                        callback(config, diff)
+                    except Exception as e:
+                        failure = failure or e
+        except BaseException:
+            with self._lock:
+                self._notifying = False
+            raise
+        if failure is not None:
+            raise failure
+
+    def refresh(self, force: bool = False) -> Optional[ConfigDiff]:
+        """Reload whichever file changed (both with force); returns the diff, or None when nothing changed."""
+        with self._lock:
+            diff = self._reload(force)
+        self._notify()
+        return diff
+
+    def get(self) -> QosConfig:
+        with self._lock:
+            self._reload()
+            config = self._config
+        self._notify()
+        return config
+
+    def subscribe(self, callback: Callable[[QosConfig, ConfigDiff], None]) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[QosConfig, ConfigDiff], None]) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def save_priority(self, document: Dict) -> QosConfig:
+        """Validate and atomically replace priority.json, then reload it."""
+        try:
+            parse_priority(document)
+        except ConfigError as e:
+            raise ConfigError(f"{self.priority_file}: {e}")
+        with self._lock:
+            _write_json(self.priority_file, document)
+        return self.get()
+
+    def save_app_tiers(self, app_tiers: Dict[str, str]) -> QosConfig:
+        """Set the tier of the given apps in priority.json's apps section, keeping the rest of the file."""
+        with self._lock:
+            if os.path.exists(self.priority_file):
+                document = dict(_object(_read_json(self.priority_file), self.priority_file))
+            else:
+                document = {"priority_levels": self.get().priority_levels()}
+            # Executable names are case-insensitive; the new spelling replaces the old entry
+            names = {app.lower() for app in app_tiers}
+            apps = {app: tier for app, tier in _object(document.get("apps", {}), "apps").items()
+                    if app.lower() not in names}
+            apps.update(app_tiers)
+            document["apps"] = apps
+            try:
+                parse_priority(document)
+            except ConfigError as e:
+                raise ConfigError(f"{self.priority_file}: {e}")
+            _write_json(self.priority_file, document)
+        return self.get()
+
+    def save_settings(self, settings: Settings) -> QosConfig:
+        with self._lock:
+            _write_json(self.settings_file, asdict(settings))
+        return self.get()
+
+    def watch(self, interval: float = 1.0) -> None:
+        """Poll both files from a daemon thread; does nothing if already watching."""
+        self.get()
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+            self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Applying reloaded config failed: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.join()
+
+
+_stores: Dict[Tuple[str, str], ConfigStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_config_store(priority_file: str = PRIORITY_FILE, settings_file: str = SETTINGS_FILE) -> ConfigStore:
+    """Process-wide store per pair of files, so every module shares one cache and one watcher."""
+    key = (os.path.abspath(priority_file), os.path.abspath(settings_file))
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ConfigStore(priority_file, settings_file)
+        return store
+
+
+def load_config(priority_file: str = PRIORITY_FILE, settings_file: str = SETTINGS_FILE) -> QosConfig:
+    return get_config_store(priority_file, settings_file).get()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Validate priority.json and settings.json")
+    parser.add_argument("--priority-file", default=PRIORITY_FILE)
+    parser.add_argument("--settings-file", default=SETTINGS_FILE)
+    args = parser.parse_args()
+    try:
+        config = load_config(args.priority_file, args.settings_file)
+    except (OSError, ConfigError) as e:
+        raise SystemExit(str(e))
+    for tier in config.tiers:
+        apps = [app for app, name in config.apps if name == tier.name]
+        print(f"{tier.name:<12} DSCP {tier.dscp:>2}  {tier.bandwidth_percent:>5g}%  "
+              f"{len(tier.applications)} port apps, {len(apps)} executables")
+    print(f"Interface {config.settings.interface}, dashboard {config.settings.dashboard_fps:g} fps")
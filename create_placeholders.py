@@ -1,6 +1,8 @@
 from PIL import Image
 import os
 
+from icon_cache import build_sprite_sheet
+
 # Colors for each app/button
 colors = {
     "zoom": "blue",
@@ -24,4 +26,7 @@ os.makedirs("icons", exist_ok=True)
 # Generate 16x16 colored squares
 for name, color in colors.items():
     img = Image.new("RGB", (16, 16), color=color)
-    img.save(f"icons/{name}.png")
\ No newline at end of file
+    img.save(f"icons/{name}.png")
+
+# Pre-size everything into the sprite sheet vpn_gui loads icons from
+print(f"Built {build_sprite_sheet('icons')}")
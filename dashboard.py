@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import tkinter as tk
+from array import array
+from tkinter import ttk
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (bucket seconds, slots): 10 min at full rate, 6 h at 15 s, 24 h at 60 s
+ROLLUP_LEVELS = ((1.0, 600), (15.0, 1440), (60.0, 1440))
+WINDOWS = {"1 min": 60, "10 min": 600, "1 hour": 3600, "24 hours": 86400}
+SERIES_COLORS = ["#1E88E5", "#43A047", "#FB8C00", "#E53935", "#8E24AA", "#00ACC1", "#6D4C41"]
+
+
+class RollupLevel:
+    """Fixed ring of (min, max) buckets of one width."""
+
+    def __init__(self, width: float, slots: int):
+        self.width = width
+        self.slots = slots
+        self.starts = array("d", bytes(8 * slots))
+        self.mins = array("d", bytes(8 * slots))
+        self.maxs = array("d", bytes(8 * slots))
+        self.head = -1
+        self.count = 0
+
+    def add(self, t: float, value: float) -> None:
+        start = t - (t % self.width)
+        if self.head >= 0 and self.starts[self.head] == start:
+            i = self.head
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+            return
+        self.head = (self.head + 1) % self.slots
+        i = self.head
+        self.starts[i] = start
+        self.mins[i] = self.maxs[i] = value
+        if self.count < self.slots:
+            self.count += 1
+
+    @property
+    def span(self) -> float:
+        return self.width * self.slots
+
+    def iter_since(self, cutoff: float):
+        # Oldest first
+        for k in range(self.count - 1, -1, -1):
+            i = (self.head - k) % self.slots
+            if self.starts[i] + self.width >= cutoff:
+                yield self.starts[i], self.mins[i], self.maxs[i]
+
+
+class RollupHistory:
+    """Multi-resolution history: drawing any window touches a bounded number of buckets."""
+
+    def __init__(self, levels=ROLLUP_LEVELS):
+        self.levels = [RollupLevel(width, slots) for width, slots in levels]
+        self.version = 0
+        self.last_t = 0.0
+
+    def add(self, t: float, value: float) -> None:
+        for level in self.levels:
+            level.add(t, value)
+        self.last_t = t
+        self.version += 1
+
+    def columns(self, window: float, now: float, width: int) -> List[Tuple[int, float, float]]:
+        # Finest level that still covers the window, then min/max per pixel column
+        level = next((lv for lv in self.levels if lv.span >= window), self.levels[-1])
+        cutoff = now - window
+        cols: Dict[int, List[float]] = {}
+        for start, lo, hi in level.iter_since(cutoff):
+            x = int((start - cutoff) / window * (width - 1))
+            x = min(max(x, 0), width - 1)
+            col = cols.get(x)
+            if col is None:
+                cols[x] = [lo, hi]
+            else:
+                col[0] = min(col[0], lo)
+                col[1] = max(col[1], hi)
+        return [(x, lo, hi) for x, (lo, hi) in sorted(cols.items())]
+
+
+def _format_rate(value: float) -> str:
+    for unit in ("B/s", "KB/s", "MB/s", "GB/s"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB/s"
+
+
+class RateGraph:
+    """Line graph on a tk.Canvas whose items are created once and moved per frame."""
+
+    def __init__(self, parent, title: str, height: int = 180):
+        self.frame = ttk.Frame(parent, style="Light.TFrame")
+        self.frame.pack(fill="both", expand=True, padx=10, pady=5)
+        ttk.Label(self.frame, text=title, style="Light.TLabel").pack(anchor="w")
+        self.canvas = tk.Canvas(self.frame, bg="#FFFFFF", height=height, highlightthickness=1,
+                                highlightbackground="#CCCCCC")
+        self.canvas.pack(fill="both", expand=True)
+        self.legend = ttk.Frame(self.frame, style="Light.TFrame")
+        self.legend.pack(anchor="w")
+        self.series: Dict[str, RollupHistory] = {}
+        self.items: Dict[str, int] = {}
+        self.drawn: Dict[str, tuple] = {}
+        self.peaks: Dict[str, float] = {}
+        self.scale_item = self.canvas.create_text(4, 4, anchor="nw", fill="#666666", font=("Arial", 9))
+        self.scale = 0.0
+
+    def history(self, name: str) -> RollupHistory:
+        history = self.series.get(name)
+        if history is None:
+            history = self.series[name] = RollupHistory()
+            color = SERIES_COLORS[len(self.items) % len(SERIES_COLORS)]
+            self.items[name] = self.canvas.create_line(0, 0, 0, 0, fill=color, width=1.5)
+            tk.Label(self.legend, text=f"■ {name}", fg=color, bg="#F5F5F5",
+                     font=("Arial", 9)).pack(side="left", padx=4)
+        return history
+
+    def redraw(self, window: float, now: float) -> None:
+        width = max(self.canvas.winfo_width(), 2)
+        height = max(self.canvas.winfo_height(), 2)
+
+        # Time advances in whole pixel columns, so a series is laid out again
+        # only when its data, the window or the size changed, or when the
+        # newest sample moved the graph on by at least one column
+        now -= now % (window / (width - 1))
+        layouts = {}
+        for name, history in self.series.items():
+            key = (history.version, window, now, width, height)
+            if self.drawn.get(name) != key:
+                cols = history.columns(window, now, width)
+                layouts[name] = (key, cols)
+                self.peaks[name] = max((hi for _, _, hi in cols), default=0.0)
+        if not layouts:
+            return
+
+        peak = max(self.peaks.values(), default=0.0)
+        scale = peak * 1.1 or 1.0
+        if scale != self.scale:
+            # A new scale moves every line, not only the ones with new data
+            self.scale = scale
+            self.canvas.itemconfigure(self.scale_item, text=_format_rate(peak))
+            for name, history in self.series.items():
+                if name not in layouts:
+                    layouts[name] = ((history.version, window, now, width, height),
+                                     history.columns(window, now, width))
+
+        for name, (key, cols) in layouts.items():
+            points = []
+            for x, lo, hi in cols:
+                points.extend((x, height - 2 - hi / self.scale * (height - 16)))
+                if lo != hi:
+                    points.extend((x, height - 2 - lo / self.scale * (height - 16)))
+            if len(points) < 4:
+                points = [0, height - 2, 0, height - 2]
+            self.canvas.coords(self.items[name], *points)
+            self.drawn[name] = key
+
+
+class DashboardTab:
+    """Live per-tier and per-interface rates fed by an in-process traffic monitor."""
+
+    def __init__(self, root, parent, interface: Optional[str] = None, fps: float = 4.0):
+        self.root = root
+        self.fps = fps
+        self.interface = interface
+        self.samples = queue.Queue()
+        self.monitor = None
+        self.scheduler = None
+        self._after_id = None
+
+        controls = ttk.Frame(parent, style="Light.TFrame")
+        controls.pack(fill="x", padx=10, pady=(10, 0))
+        ttk.Label(controls, text="Window:", style="Light.TLabel").pack(side="left")
+        self.window_var = tk.StringVar(value="10 min")
+        ttk.Combobox(controls, textvariable=self.window_var, values=list(WINDOWS), width=10,
+                     state="readonly", style="Light.TCombobox").pack(side="left", padx=10)
+        self.status = ttk.Label(controls, text="Starting monitor...", style="Light.TLabel", font=("Arial", 10))
+        self.status.pack(side="left", padx=10)
+
+        self.tier_graph = RateGraph(parent, "Per-tier throughput")
+        self.interface_graph = RateGraph(parent, "Interface throughput")
+
+    def start(self) -> None:
+        """Start sampling; separate from construction so the window can be shown first."""
+        from stats_backend import backend_supported
+        if not backend_supported():
+            # e.g. macOS, where every sample would fail
+            self.status.config(text="Live traffic is not supported on this platform (requires Windows or Linux)")
+            return
+        threading.Thread(target=self._run_monitor, daemon=True).start()
+        self._schedule()
+
+    def _run_monitor(self) -> None:
+        # Imported here so the GUI does not pay for the monitor until the tab exists
+        from config import get_config_store
+        from monitor_traffic import WindowsTrafficMonitor
+        from scheduler import SampleScheduler
+        try:
+            self.monitor = WindowsTrafficMonitor(interface=self.interface)
+            # Tier edits in priority.json show up in the graphs without a restart
+            store = get_config_store()
+            store.subscribe(self.monitor.apply_config)
+            store.watch()
+            self.scheduler = SampleScheduler([self.monitor], self.monitor.sample_interval,
+                                             on_sample=self._on_sample)
+            asyncio.run(self.scheduler.run(float("inf")))
+        except Exception as e:
+            logger.error(f"Dashboard monitor stopped: {e}")
+            self.samples.put(("error", str(e)))
+
+    def _on_sample(self, sample) -> None:
+        # Worker thread: compute rates and hand them to the Tk thread
+        self.monitor.record_sample(sample)
+        history = self.monitor.history
+        rates = {"tier": history.rates("tier", "bytes"), "iface": {}}
+        for field, label in (("input_bytes", "in"), ("output_bytes", "out")):
+            series = history.series.get(("iface", self.monitor.interface, field))
+            if series is not None and series.history.count:
+                rates["iface"][f"{self.monitor.interface} {label}"] = series.rate
+        self.samples.put(("sample", (sample.interface_time, rates)))
+
+    def _schedule(self) -> None:
+        self._after_id = self.root.after(int(1000 / self.fps), self.refresh)
+
+    def refresh(self) -> None:
+        now = None
+        while True:
+            try:
+                kind, payload = self.samples.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "error":
+                self.status.config(text=f"Monitor error: {payload}")
+                continue
+            t, rates = payload
+            for name, rate in rates["tier"].items():
+                self.tier_graph.history(name).add(t, rate)
+            for name, rate in rates["iface"].items():
+                self.interface_graph.history(name).add(t, rate)
+            now = t
+        if now is not None:
+            self.status.config(text=f"Interface {self.monitor.interface}")
+        latest = max((h.last_t for g in (self.tier_graph, self.interface_graph) for h in g.series.values()),
+                     default=time.monotonic())
+        window = WINDOWS.get(self.window_var.get(), 600)
+        self.tier_graph.redraw(window, latest)
+        self.interface_graph.redraw(window, latest)
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        if self.scheduler is not None:
+            self.scheduler.stop()
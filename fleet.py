@@ -0,0 +1,659 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import secrets
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import ConfigDiff, ConfigError, QosConfig, get_config_store, parse_priority
+from timeseries import TimeSeriesStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 7450
+SECRET_ENV = "QOS_FLEET_SECRET"
+# Largest frame accepted on either side; a priority.json push is one frame
+FRAME_LIMIT = 1 << 22
+
+# Agents speak the same framing as the shell sessions: one JSON request per
+# line ({"id", "op", ...}) answered by one JSON line ({"id", "ok", "result"} or
+# {"id", "ok": false, "err"}). Responses may arrive out of order.
+#
+# An agent holding a shared secret opens every connection with {"challenge": nonce}.
+# Every frame after that carries "mac", an HMAC-SHA256 over the nonce and the rest
+# of the frame. Request ids must increase, so a frame cannot be replayed on the
+# same connection, and the nonce keeps it from being replayed on another one.
+
+
+class FleetError(Exception):
+    pass
+
+
+class HostTimeout(FleetError):
+    pass
+
+
+def load_secret(path: Optional[str] = None) -> Optional[bytes]:
+    """Shared secret from a file, else from $QOS_FLEET_SECRET; None when neither is set."""
+    if path:
+        with open(path, "rb") as f:
+            secret = f.read().strip()
+    else:
+        secret = os.environ.get(SECRET_ENV, "").strip().encode()
+    if path and not secret:
+        raise ValueError(f"{path} is empty")
+    return secret or None
+
+
+def frame_mac(secret: bytes, nonce: str, frame: Dict) -> str:
+    body = json.dumps({k: v for k, v in frame.items() if k != "mac"}, sort_keys=True, separators=(",", ":"))
+    return hmac.new(secret, nonce.encode() + b"\n" + body.encode(), hashlib.sha256).hexdigest()
+
+
+def _mac_ok(secret: bytes, nonce: str, frame: Dict) -> bool:
+    mac = frame.get("mac")
+    return isinstance(mac, str) and hmac.compare_digest(mac, frame_mac(secret, nonce, frame))
+
+
+# --- Transports -------------------------------------------------------------
+
+class Transport:
+    """Opens a line-oriented (reader, writer) stream pair to one agent."""
+
+    async def open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class SubprocessTransport(Transport):
+    """Agent running as a child process, talking over its stdin/stdout."""
+
+    def __init__(self, argv: List[str]):
+        self.argv = argv
+        self.proc = None
+
+    async def open(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.argv, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL, limit=FRAME_LIMIT
+        )
+        return self.proc.stdout, self.proc.stdin
+
+    async def close(self) -> None:
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+        self.proc = None
+
+
+class SSHTransport(SubprocessTransport):
+    """Agent started on a remote host through ssh; the session stays open between requests."""
+
+    def __init__(self, host: str, remote_command: str = "python3 fleet.py agent --stdio",
+                 ssh_options: Optional[List[str]] = None):
+        options = ssh_options if ssh_options is not None else ["-o", "BatchMode=yes", "-o", "ServerAliveInterval=15"]
+        super().__init__(["ssh", *options, host, remote_command])
+        self.host = host
+
+
+class TcpTransport(Transport):
+    def __init__(self, host: str, port: int = DEFAULT_PORT):
+        self.host = host
+        self.port = port
+
+    async def open(self):
+        return await asyncio.open_connection(self.host, self.port, limit=FRAME_LIMIT)
+
+
+def parse_host(spec: str, remote_command: str) -> Tuple[str, Transport]:
+    """local | local:<args> | ssh://[user@]host | tcp://host[:port] -> (name, transport)."""
+    if spec == "local" or spec.startswith("local:"):
+        extra = spec[6:].split() if spec.startswith("local:") else []
+        argv = [sys.executable, os.path.abspath(__file__), "agent", "--stdio", *extra]
+        return spec, SubprocessTransport(argv)
+    if spec.startswith("ssh://"):
+        return spec[6:], SSHTransport(spec[6:], remote_command)
+    if spec.startswith("tcp://"):
+        host, _, port = spec[6:].rpartition(":") if ":" in spec[6:] else (spec[6:], "", "")
+        return spec[6:], TcpTransport(host, int(port) if port else DEFAULT_PORT)
+    raise ValueError(f"Unknown host spec {spec!r} (expected local, ssh://host or tcp://host:port)")
+
+
+# --- Collector side ---------------------------------------------------------
+
+class AgentConnection:
+    """One reusable connection to an agent with multiplexed requests.
+
+    At most max_inflight requests are outstanding at once; further callers
+    wait, which is the backpressure a slow agent exerts on the collector.
+    A broken connection is reopened on the next request, no sooner than the
+    current reconnect delay, which doubles after every failed attempt.
+    """
+
+    def __init__(self, name: str, transport: Transport, timeout: float = 5.0, max_inflight: int = 4,
+                 max_reconnect_delay: float = 30.0, secret: Optional[bytes] = None):
+        self.name = name
+        self.transport = transport
+        self.timeout = timeout
+        self.secret = secret
+        self._nonce = None
+        self.max_reconnect_delay = max_reconnect_delay
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._open_lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._reconnect_delay = 0.0
+        self._next_attempt = 0.0
+        self.connects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def _ensure_open(self) -> None:
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            if time.monotonic() < self._next_attempt:
+                raise FleetError(f"{self.name}: waiting {self._reconnect_delay:.0f}s before reconnecting")
+            try:
+                reader, writer = await asyncio.wait_for(self.transport.open(), self.timeout)
+                try:
+                    if self.secret is not None:
+                        self._nonce = await asyncio.wait_for(self._challenge(reader), self.timeout)
+                except BaseException:
+                    writer.close()
+                    await self.transport.close()
+                    raise
+            except (OSError, asyncio.TimeoutError, FleetError) as e:
+                self._reconnect_delay = min(max(self._reconnect_delay * 2, 1.0), self.max_reconnect_delay)
+                self._next_attempt = time.monotonic() + self._reconnect_delay
+                raise FleetError(f"{self.name}: connect failed: {e or type(e).__name__}")
+            self._reader, self._writer = reader, writer
+            self._reconnect_delay = 0.0
+            self.connects += 1
+            self._read_task = asyncio.create_task(self._read_frames(self._reader))
+
+    async def _challenge(self, reader: asyncio.StreamReader) -> str:
+        line = await reader.readline()
+        try:
+            nonce = json.loads(line).get("challenge")
+        except (ValueError, AttributeError):
+            nonce = None
+        if not isinstance(nonce, str):
+            raise FleetError("agent sent no authentication challenge (is it running without a secret?)")
+        return nonce
+
+    async def _read_frames(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    frame = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.debug(f"{self.name}: ignoring unframed output: {line[:200]!r}")
+                    continue
+                if not isinstance(frame, dict):
+                    continue
+                if self.secret is not None and not _mac_ok(self.secret, self._nonce, frame):
+                    logger.warning(f"{self.name}: dropping a response with a bad MAC")
+                    continue
+                future = self._pending.get(frame.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(frame)
+        except (OSError, ValueError) as e:
+            logger.debug(f"{self.name}: read failed: {e}")
+        await self._drop(FleetError(f"{self.name}: connection closed"))
+
+    async def _drop(self, error: Exception) -> None:
+        writer, self._writer = self._writer, None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        if writer is not None:
+            writer.close()
+            await self.transport.close()
+
+    async def request(self, op: str, timeout: Optional[float] = None, **args):
+        timeout = timeout or self.timeout
+        async with self._inflight:
+            await self._ensure_open()
+            req_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[req_id] = future
+            frame = {"id": req_id, "op": op, **args}
+            if self.secret is not None:
+                frame["mac"] = frame_mac(self.secret, self._nonce, frame)
+            try:
+                self._writer.write((json.dumps(frame) + "\n").encode())
+                await asyncio.wait_for(self._writer.drain(), timeout)
+                frame = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise HostTimeout(f"{self.name}: {op} timed out after {timeout}s")
+            except (OSError, AttributeError) as e:
+                await self._drop(FleetError(f"{self.name}: {e}"))
+                raise FleetError(f"{self.name}: connection lost: {e}")
+            finally:
+                self._pending.pop(req_id, None)
+        if not frame.get("ok"):
+            raise FleetError(f"{self.name}: {frame.get('err') or 'request failed'}")
+        return frame.get("result")
+
+    async def close(self) -> None:
+        if self._read_task is not None:
+            self._read_task.cancel()
+        await self._drop(FleetError(f"{self.name}: closed"))
+
+
+class HostState:
+    def __init__(self, name: str, connection: AgentConnection, history: TimeSeriesStore):
+        self.name = name
+        self.connection = connection
+        self.history = history
+        self.last_tick = -1
+        self.timeouts = 0
+        self.errors = 0
+        self.last_error = None
+
+
+class FleetView:
+    """Per-tier rates of every host for one collector tick, plus their sum."""
+
+    __slots__ = ("tick", "wall_time", "tiers", "hosts", "missing")
+
+    def __init__(self, tick: int, wall_time: float):
+        self.tick = tick
+        self.wall_time = wall_time
+        self.tiers: Dict[str, float] = {}
+        self.hosts: Dict[str, Dict[str, float]] = {}
+        self.missing: List[str] = []
+
+
+class FleetCollector:
+    """Samples many agents on one monotonic grid and merges their tier rates.
+
+    Every host is asked for a sample at the same grid tick. Rates are
+    computed from the timestamps the agent took around its counter reads,
+    so network delay does not skew them; the merged view is keyed by the
+    collector's tick. A host that misses a tick keeps contributing its last
+    rate for up to stale_ticks ticks and is then reported as missing.
+    """
+
+    def __init__(self, transports: Dict[str, Transport], interval: float = 1.0, timeout: float = 5.0,
+                 max_concurrency: int = 32, max_inflight: int = 4, stale_ticks: int = 3,
+                 secret: Optional[bytes] = None):
+        self.interval = interval
+        self.stale_ticks = stale_ticks
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self.hosts: Dict[str, HostState] = {
+            name: HostState(name, AgentConnection(name, transport, timeout, max_inflight, secret=secret),
+                            TimeSeriesStore(interval, (interval,)))
+            for name, transport in transports.items()
+        }
+        self.missed_ticks = 0
+        self._stopping = None
+
+    async def _sample_host(self, host: HostState, tick: int) -> None:
+        async with self._concurrency:
+            try:
+                result = await host.connection.request("sample")
+            except HostTimeout as e:
+                host.timeouts += 1
+                host.last_error = str(e)
+                return
+            except FleetError as e:
+                host.errors += 1
+                host.last_error = str(e)
+                return
+        cumulative = result.get("qos_cumulative", True)
+        for tier, data in result.get("qos", {}).items():
+            for field, value in data.items():
+                host.history.update(("tier", tier, field), result["qos_time"], value, cumulative)
+        for field, value in result.get("interface", {}).items():
+            host.history.update(("iface", result.get("interface_name"), field), result["interface_time"], value)
+        host.last_tick = tick
+
+    def view(self, tick: int) -> FleetView:
+        view = FleetView(tick, time.time())
+        for name, host in self.hosts.items():
+            if host.last_tick < 0 or tick - host.last_tick > self.stale_ticks:
+                view.missing.append(name)
+                continue
+            rates = host.history.rates("tier", "bytes")
+            view.hosts[name] = rates
+            for tier, rate in rates.items():
+                view.tiers[tier] = view.tiers.get(tier, 0.0) + rate
+        return view
+
+    async def collect(self, tick: int) -> FleetView:
+        await asyncio.gather(*(self._sample_host(host, tick) for host in self.hosts.values()))
+        return self.view(tick)
+
+    async def run(self, duration: float, on_view: Optional[Callable[[FleetView], None]] = None) -> None:
+        self._stopping = asyncio.Event()
+        start = time.monotonic()
+        tick = 0
+        while not self._stopping.is_set() and start + tick * self.interval < start + duration:
+            delay = start + tick * self.interval - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            view = await self.collect(tick)
+            if on_view:
+                on_view(view)
+            next_tick = max(tick + 1, math.ceil((time.monotonic() - start) / self.interval))
+            self.missed_ticks += next_tick - tick - 1
+            tick = next_tick
+
+    def stop(self) -> None:
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def push_priority(self, document: Dict, timeout: float = 60.0) -> Dict[str, Optional[str]]:
+        """Send one priority.json document to every host; returns host -> error (None on success).
+
+        The document is validated here first, so a bad one raises ConfigError
+        instead of being rejected by every agent.
+        """
+        parse_priority(document)
+        payload = json.dumps(document, sort_keys=True)
+        digest = hashlib.sha256(payload.encode()).hexdigest()[:12]
+
+        async def push(host: HostState) -> Optional[str]:
+            async with self._concurrency:
+                try:
+                    result = await host.connection.request("apply_priority", timeout=timeout,
+                                                           document=document, digest=digest)
+                except FleetError as e:
+                    return str(e)
+            if result.get("digest") != digest:
+                return f"agent reported digest {result.get('digest')}, expected {digest}"
+            return None
+
+        names = list(self.hosts)
+        results = await asyncio.gather(*(push(self.hosts[name]) for name in names))
+        return dict(zip(names, results))
+
+    async def close(self) -> None:
+        await asyncio.gather(*(host.connection.close() for host in self.hosts.values()))
+
+
+# --- Agent side -------------------------------------------------------------
+
+class FleetAgent:
+    """Answers sample and apply_priority requests from a collector.
+
+    With a secret, every request must be authenticated (see the framing
+    notes above); apply_priority is refused unless allow_push is set, since
+    it rewrites priority.json and drives tc/nft.
+    """
+
+    def __init__(self, backend, interface: Optional[str] = None, priority_file: str = "priority.json",
+                 enforcer=None, secret: Optional[bytes] = None, allow_push: bool = False):
+        self.backend = backend
+        self.interface = interface or backend.detect_interface()
+        self.priority_file = priority_file
+        self.enforcer = enforcer
+        self.secret = secret
+        self.allow_push = allow_push
+        self.config = get_config_store(priority_file)
+        self.config.subscribe(self.apply_config)
+        self._apply_lock = asyncio.Lock()
+        self._enforce_lock = threading.Lock()
+        self._enforced: Optional[List[Dict]] = None
+
+    async def _timed(self, func: Callable) -> Tuple[Dict, float]:
+        start = time.monotonic()
+        result = await asyncio.to_thread(func)
+        return result, (start + time.monotonic()) / 2
+
+    async def sample(self) -> Dict:
+        (qos, qos_t), (iface, iface_t) = await asyncio.gather(
+            self._timed(lambda: self.backend.get_qos_stats(self.interface)),
+            self._timed(lambda: self.backend.get_interface_stats(self.interface))
+        )
+        return {
+            "qos": qos, "qos_time": qos_t, "qos_cumulative": self.backend.qos_cumulative,
+            "interface": iface, "interface_time": iface_t, "interface_name": self.interface,
+            "wall_time": time.time()
+        }
+
+    def enforce(self, levels: List[Dict]) -> None:
+        """Apply tiers with the enforcer unless they are the ones already in place."""
+        with self._enforce_lock:
+            if levels != self._enforced:
+                self._enforced = None
+                self.enforcer.apply(levels)
+                self._enforced = levels
+
+    def apply_config(self, config: QosConfig, diff: ConfigDiff) -> None:
+        # Pushed or edited on the host, new tiers retarget sampling and enforcement together
+        if not diff.tiers:
+            return
+        self.backend.apply_config(config)
+        if self.enforcer is not None:
+            self.enforce(config.priority_levels())
+
+    def _push(self, document: Dict) -> None:
+        tiers, apps = parse_priority(document)
+        if self.enforcer is None:
+            self.config.save_priority(document)
+            return
+        # Enforce first and only then commit the file, so a push that tc/nft
+        # reject leaves neither the file nor the rules changed
+        current = self.config.get()
+        levels = QosConfig(tiers, apps, current.settings).priority_levels()
+        try:
+            self.enforce(levels)
+            self.config.save_priority(document)
+        except Exception:
+            if self.config.get().priority_levels() != levels:
+                try:
+                    self.enforce(current.priority_levels())
+                except Exception as e:
+                    logger.error(f"Restoring the previous tiers failed: {e}")
+            raise
+
+    async def apply_priority(self, document: Dict, digest: str) -> Dict:
+        if not self.allow_push:
+            raise PermissionError("pushes are disabled on this agent (start it with --allow-push)")
+        # Pushes are serialized so two of them never interleave their writes;
+        # saving reloads the store, which calls apply_config
+        async with self._apply_lock:
+            await asyncio.to_thread(self._push, document)
+        logger.info(f"Applied priority document {digest}")
+        return {"digest": digest}
+
+    async def handle(self, request: Dict):
+        op = request.get("op")
+        if op == "sample":
+            return await self.sample()
+        if op == "apply_priority":
+            return await self.apply_priority(request["document"], request.get("digest", ""))
+        if op == "hello":
+            return {"host": platform.node(), "interface": self.interface}
+        raise ValueError(f"unknown op {op!r}")
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        write_lock = asyncio.Lock()
+        nonce = None
+        last_id = 0
+
+        async def answer(request: Dict) -> None:
+            try:
+                response = {"id": request.get("id"), "ok": True, "result": await self.handle(request)}
+            except Exception as e:
+                response = {"id": request.get("id"), "ok": False, "err": str(e)}
+            if nonce is not None:
+                response["mac"] = frame_mac(self.secret, nonce, response)
+            async with write_lock:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+
+        tasks = set()
+        try:
+            if self.secret is not None:
+                nonce = secrets.token_hex(16)
+                writer.write((json.dumps({"challenge": nonce}) + "\n").encode())
+                await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(request, dict):
+                    continue
+                if nonce is not None:
+                    req_id = request.get("id")
+                    if not (_mac_ok(self.secret, nonce, request) and isinstance(req_id, int) and req_id > last_id):
+                        logger.warning("Closing a collector connection that sent an unauthenticated request")
+                        break
+                    last_id = req_id
+                # Requests are answered as they complete, not in arrival order
+                task = asyncio.create_task(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Collector connection failed: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve_stdio(self) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=FRAME_LIMIT)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self.serve(reader, writer)
+
+    async def serve_tcp(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.serve, host, port, limit=FRAME_LIMIT)
+        for sock in server.sockets:
+            logger.info(f"Fleet agent listening on {sock.getsockname()[0]}:{sock.getsockname()[1]}")
+        async with server:
+            await server.serve_forever()
+
+
+def _print_view(view: FleetView) -> None:
+    print(f"\nTick {view.tick} ({len(view.hosts)} hosts, {len(view.missing)} missing)")
+    for tier, rate in view.tiers.items():
+        print(f"  {tier}: {rate:.1f} B/s")
+    if view.missing:
+        print(f"  Missing: {', '.join(view.missing)}")
+
+
+async def _collect(args) -> None:
+    transports = dict(parse_host(spec, args.remote_command) for spec in args.host)
+    collector = FleetCollector(transports, interval=args.interval, timeout=args.timeout,
+                               max_concurrency=args.max_concurrency, secret=load_secret(args.secret_file))
+    try:
+        if args.push:
+            with open(args.push, "r") as f:
+                document = json.load(f)
+            try:
+                results = await collector.push_priority(document)
+            except ConfigError as e:
+                raise SystemExit(f"Not pushing {args.push}: {e}")
+            for name, error in results.items():
+                print(f"{name}: {'applied' if error is None else error}")
+        if args.duration > 0:
+            await collector.run(args.duration, _print_view)
+        for name, host in collector.hosts.items():
+            if host.timeouts or host.errors:
+                print(f"{name}: {host.timeouts} timeouts, {host.errors} errors, last: {host.last_error}")
+    finally:
+        await collector.close()
+
+
+def _agent(args) -> None:
+    from stats_backend import default_backend
+    secret = load_secret(args.secret_file)
+    if args.listen and secret is None:
+        raise SystemExit(f"--listen needs a shared secret: pass --secret-file or set {SECRET_ENV}")
+    store = get_config_store(args.priority_file)
+    enforcer = None
+    if args.dev:
+        from linux_enforce import LinuxEnforcer, parse_rate_kbit
+        enforcer = LinuxEnforcer(args.dev, parse_rate_kbit(args.rate))
+    agent = FleetAgent(default_backend(store.get().dscp_to_tier()), args.interface, args.priority_file, enforcer,
+                       secret=secret, allow_push=args.allow_push)
+    if enforcer is not None:
+        # Pushes and edits re-apply only when the tiers change, so start from the file as it is
+        agent.enforce(store.get().priority_levels())
+    store.watch()
+    if args.stdio:
+        asyncio.run(agent.serve_stdio())
+    else:
+        # Loopback unless the operator names an address to listen on
+        host, _, port = args.listen.rpartition(":")
+        asyncio.run(agent.serve_tcp(host or "127.0.0.1", int(port)))
+
+
+def main():
+    # Logs go to stderr; stdout carries frames in --stdio mode
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Collect QoS statistics from, and push priorities to, many hosts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    agent = sub.add_parser("agent", help="Serve this host's statistics to a collector")
+    mode = agent.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--stdio", action="store_true", help="Speak the protocol on stdin/stdout (local or SSH)")
+    mode.add_argument("--listen", help=f"[HOST:]PORT to accept collectors on (default host 127.0.0.1), "
+                                       f"e.g. {DEFAULT_PORT}; requires a shared secret")
+    agent.add_argument("--interface")
+    agent.add_argument("--priority-file", default="priority.json")
+    agent.add_argument("--dev", help="Apply pushed priorities with tc/nft on this device (Linux)")
+    agent.add_argument("--rate", default="100mbit")
+    agent.add_argument("--allow-push", action="store_true",
+                       help="Accept priority.json pushes from collectors (refused otherwise)")
+    agent.add_argument("--secret-file", help=f"Shared secret authenticating every frame (default ${SECRET_ENV})")
+
+    collect = sub.add_parser("collect", help="Sample many agents and print the merged per-tier view")
+    collect.add_argument("--host", action="append", required=True,
+                         help="local, ssh://[user@]host or tcp://host[:port] (repeatable)")
+    collect.add_argument("--interval", type=float, default=1.0)
+    collect.add_argument("--duration", type=float, default=60)
+    collect.add_argument("--timeout", type=float, default=5.0, help="Per-host request timeout")
+    collect.add_argument("--max-concurrency", type=int, default=32)
+    collect.add_argument("--remote-command", default="python3 fleet.py agent --stdio",
+                         help="Command that starts the agent on SSH hosts")
+    collect.add_argument("--push", help="Push this priority.json to every host before collecting")
+    collect.add_argument("--secret-file", help=f"Shared secret of the agents (default ${SECRET_ENV})")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "agent":
+            _agent(args)
+        else:
+            asyncio.run(_collect(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+import heapq
+import logging
+import os
+import re
+import socket
+import struct
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+from classifier import PortClassifier
+from stats_backend import LinuxBackend
+
+logger = logging.getLogger(__name__)
+
+# sock_diag constants (linux/sock_diag.h, linux/inet_diag.h)
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2
+TCP_ALL_STATES = 0xFFFFFFFF
+
+NLMSG_HDR = struct.Struct("=LHHLL")
+INET_DIAG_REQ_V2 = struct.Struct("=BBBxI48x")
+INET_DIAG_MSG = struct.Struct("=BBBB2H16s16sI8sIIIII")
+RTATTR = struct.Struct("=HH")
+# Offsets of the byte counters inside struct tcp_info
+TCPI_BYTES_ACKED = 120
+TCPI_BYTES_RECEIVED = 128
+
+DEFAULT_TIER = "Default"
+
+USERS_RE = re.compile(r'\("([^"]*)",pid=(\d+)')
+
+# One socket: (inode, local port, remote port, bytes sent, bytes received)
+SocketCounters = Tuple[int, int, int, int, int]
+
+
+def _app_key(name: str) -> str:
+    name = name.lower()
+    if name.endswith(".exe"):
+        name = name[:-4]
+    return name.replace(" ", "")
+
+
+class SocketTable:
+    """Per-socket TCP byte counters from one sock_diag dump per address family."""
+
+    def __init__(self):
+        self._sock = None
+        self._seq = 0
+
+    def dump(self) -> List[SocketCounters]:
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+            self._sock.settimeout(1.0)
+        sockets = []
+        for family in (socket.AF_INET, socket.AF_INET6):
+            self._dump_family(family, sockets)
+        return sockets
+
+    def _dump_family(self, family: int, sockets: List[SocketCounters]) -> None:
+        self._seq += 1
+        body = INET_DIAG_REQ_V2.pack(family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), TCP_ALL_STATES)
+        header = NLMSG_HDR.pack(NLMSG_HDR.size + len(body), SOCK_DIAG_BY_FAMILY,
+                                NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0)
+        self._sock.send(header + body)
+        while True:
+            data = self._sock.recv(1 << 17)
+            offset = 0
+            while offset + NLMSG_HDR.size <= len(data):
+                length, msg_type, _, seq, _ = NLMSG_HDR.unpack_from(data, offset)
+                if length < NLMSG_HDR.size:
+                    return
+                if seq == self._seq:
+                    if msg_type == NLMSG_DONE:
+                        return
+                    if msg_type == NLMSG_ERROR:
+                        err = -struct.unpack_from("=i", data, offset + NLMSG_HDR.size)[0]
+                        if err:
+                            raise OSError(err, os.strerror(err))
+                    elif msg_type == SOCK_DIAG_BY_FAMILY:
+                        self._parse(data, offset + NLMSG_HDR.size, offset + length, sockets)
+                offset += (length + 3) & ~3
+
+    def _parse(self, data: bytes, start: int, end: int, sockets: List[SocketCounters]) -> None:
+        fields = INET_DIAG_MSG.unpack_from(data, start)
+        sport, dport, inode = socket.ntohs(fields[4]), socket.ntohs(fields[5]), fields[14]
+        offset = start + INET_DIAG_MSG.size
+        while offset + RTATTR.size <= end:
+            attr_len, attr_type = RTATTR.unpack_from(data, offset)
+            if attr_len < RTATTR.size:
+                return
+            if attr_type == INET_DIAG_INFO and attr_len - RTATTR.size >= TCPI_BYTES_RECEIVED + 8:
+                info = offset + RTATTR.size
+                sent, received = struct.unpack_from("=QQ", data, info + TCPI_BYTES_ACKED)
+                if inode and (sent or received):
+                    sockets.append((inode, sport, dport, sent, received))
+                return
+            offset += (attr_len + 3) & ~3
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def parse_ss_output(output: str) -> Tuple[List[SocketCounters], Dict[int, Tuple[int, str]]]:
+    """Fallback for `ss -tinpeH`: counters plus the inode -> (pid, name) owners ss resolved."""
+    sockets, owners = [], {}
+    current = None
+    for line in output.splitlines():
+        if not line.startswith((" ", "\t")):
+            fields = line.split()
+            current = None
+            if len(fields) < 5:
+                continue
+            local, remote = fields[3], fields[4]
+            inode = next((int(f[4:]) for f in fields if f.startswith("ino:")), 0)
+            user = USERS_RE.search(line)
+            if inode and user:
+                owners[inode] = (int(user.group(2)), user.group(1))
+            current = [inode, int(local.rsplit(":", 1)[1]), int(remote.rsplit(":", 1)[1] or 0), 0, 0]
+        elif current is not None:
+            for token in line.split():
+                if token.startswith("bytes_acked:"):
+                    current[3] = int(token[12:])
+                elif token.startswith("bytes_received:"):
+                    current[4] = int(token[15:])
+            if current[0] and (current[3] or current[4]):
+                sockets.append(tuple(current))
+            current = None
+    return sockets, owners
+
+
+class SocketOwners:
+    """Socket inode -> (pid, process name), rescanning /proc only for unknown inodes.
+
+    Some sockets never resolve (kernel sockets, other PID namespaces, fds
+    closed between the dump and the walk), so an inode one scan could not
+    place waits retry_after seconds before it can trigger another scan.
+    """
+
+    def __init__(self, min_rescan: float = 1.0, retry_after: float = 30.0):
+        self.min_rescan = min_rescan
+        self.retry_after = retry_after
+        self.owners: Dict[int, Tuple[int, str]] = {}
+        self._last_scan = 0.0
+        # inode -> monotonic time it may trigger a rescan again
+        self._failed: Dict[int, float] = {}
+
+    def resolve(self, inodes) -> Dict[int, Tuple[int, str]]:
+        now = time.monotonic()
+        inodes = set(inodes)
+        # Closed sockets drop out so the map stays bounded by the live table
+        self._failed = {inode: t for inode, t in self._failed.items() if inode in inodes}
+        missing = [inode for inode in inodes
+                   if inode not in self.owners and self._failed.get(inode, 0.0) <= now]
+        # A full /proc walk is the expensive part; bound how often it happens
+        if missing and now - self._last_scan >= self.min_rescan:
+            self._scan()
+            retry_at = now + self.retry_after
+            for inode in missing:
+                if inode not in self.owners:
+                    self._failed[inode] = retry_at
+        return self.owners
+
+    def _scan(self) -> None:
+        owners = {}
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            try:
+                with open(f"/proc/{pid}/comm") as f:
+                    name = f.read().strip()
+                for fd in os.scandir(f"/proc/{pid}/fd"):
+                    try:
+                        target = os.readlink(fd.path)
+                    except OSError:
+                        continue
+                    if target.startswith("socket:["):
+                        owners[int(target[8:-1])] = (pid, name)
+            except OSError:
+                continue
+        self.owners = owners
+        self._last_scan = time.monotonic()
+
+    def update(self, owners: Dict[int, Tuple[int, str]]) -> None:
+        self.owners.update(owners)
+
+
+class FlowAttributor:
+    """Turns per-socket counters into per-tier and per-app byte totals each tick.
+
+    Totals only ever grow (closed sockets keep what they contributed), so the
+    results behave like the cumulative counters TimeSeriesStore expects. A
+    socket goes to its app's tier when the process is a known app, otherwise
+    to the tier of its remote or local port.
+
+    Only TCP is attributed: sock_diag and ss report byte counters for TCP
+    sockets alone. Tiers whose rules are all UDP (and that no app maps to)
+    are listed in untracked_tiers and left out of the results rather than
+    reported as idle.
+    """
+
+    def __init__(self, classifier: Optional[PortClassifier] = None,
+                 app_tiers: Optional[Dict[str, str]] = None):
+        self.set_rules(classifier, app_tiers)
+        self.table = SocketTable()
+        self.owners = SocketOwners()
+        self.use_netlink = True
+        self.last: Dict[int, Tuple[int, int]] = {}
+        self.primed = False
+        self.tier_totals: Dict[str, Dict[str, int]] = {}
+        self.app_totals: Dict[str, int] = {}
+        self.app_deltas: Dict[str, int] = {}
+
+    def set_rules(self, classifier: Optional[PortClassifier], app_tiers: Optional[Dict[str, str]] = None) -> None:
+        # Totals so far stay with the tiers they were counted under
+        self.classifier = classifier
+        self.app_tiers = {_app_key(name): tier for name, tier in (app_tiers or {}).items()}
+        if classifier is not None:
+            self.app_tiers = {**{_app_key(r.app): r.tier for r in reversed(classifier.rules)}, **self.app_tiers}
+        self.untracked_tiers = set()
+        if classifier is not None:
+            tcp_tiers = {tier for _, _, tier in classifier.ranges("tcp")}
+            self.untracked_tiers = set(classifier.tiers) - tcp_tiers - set(self.app_tiers.values())
+            if self.untracked_tiers:
+                logger.info(f"No per-socket counters for UDP-only tiers: {', '.join(sorted(self.untracked_tiers))}")
+
+    def _read_sockets(self) -> List[SocketCounters]:
+        if self.use_netlink:
+            try:
+                return self.table.dump()
+            except OSError as e:
+                logger.warning(f"sock_diag unavailable, falling back to ss: {e}")
+                self.use_netlink = False
+                self.table.close()
+        try:
+            result = subprocess.run(["ss", "-tinpeH"], capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f"Failed to read socket statistics: {e}")
+            return []
+        sockets, owners = parse_ss_output(result.stdout)
+        self.owners.update(owners)
+        return sockets
+
+    def _tiers_for(self, flows: List[Tuple[Optional[str], int, int, int]]) -> List[str]:
+        tiers = [self.app_tiers.get(_app_key(name)) if name is not None else None for name, _, _, _ in flows]
+        unmatched = [i for i, tier in enumerate(tiers) if tier is None]
+        if self.classifier is not None and unmatched:
+            # Remote ports then local ports, classified in one batch; the remote port wins
+            ports = [flows[i][2] for i in unmatched] + [flows[i][1] for i in unmatched]
+            ids = self.classifier.classify_ids([socket.IPPROTO_TCP] * len(ports), ports)
+            count = len(unmatched)
+            for j, i in enumerate(unmatched):
+                tier_id = ids[j] if ids[j] >= 0 else ids[count + j]
+                if tier_id >= 0:
+                    tiers[i] = self.classifier.tiers[tier_id]
+        return [tier or DEFAULT_TIER for tier in tiers]
+
+    def sample(self) -> Dict[str, Dict[str, int]]:
+        sockets = self._read_sockets()
+        owners = self.owners.resolve(s[0] for s in sockets) if self.use_netlink else self.owners.owners
+        current = {}
+        flows = []
+        for inode, sport, dport, sent, received in sockets:
+            prev_sent, prev_received = self.last.get(inode, (0, 0))
+            current[inode] = (sent, received)
+            if not self.primed:
+                # The first dump only sets the baseline; lifetime totals are not a rate
+                continue
+            delta = max(sent - prev_sent, 0) + max(received - prev_received, 0)
+            if not delta:
+                continue
+            owner = owners.get(inode)
+            flows.append((owner[1] if owner else None, sport, dport, delta))
+        self.app_deltas = {}
+        for (name, _, _, delta), tier in zip(flows, self._tiers_for(flows)):
+            totals = self.tier_totals.setdefault(tier, {"bytes": 0})
+            totals["bytes"] += delta
+            app = name or "unknown"
+            self.app_totals[app] = self.app_totals.get(app, 0) + delta
+            self.app_deltas[app] = self.app_deltas.get(app, 0) + delta
+        self.last = current
+        self.primed = True
+        return {tier: dict(totals) for tier, totals in self.tier_totals.items()
+                if tier not in self.untracked_tiers}
+
+    def top_apps(self, n: int = 5) -> List[Tuple[str, int]]:
+        # Apps with the most traffic in the last tick
+        return heapq.nlargest(n, self.app_deltas.items(), key=lambda item: item[1])
+
+    def close(self) -> None:
+        self.table.close()
+
+
+class SocketAttributionBackend(LinuxBackend):
+    """LinuxBackend whose per-tier bytes come from socket attribution instead of tc classes."""
+
+    def __init__(self, dscp_to_tier: Dict[int, str], classifier: Optional[PortClassifier] = None,
+                 app_tiers: Optional[Dict[str, str]] = None):
+        super().__init__(dscp_to_tier)
+        self.attributor = FlowAttributor(classifier, app_tiers)
+
+    def apply_config(self, config) -> None:
+        super().apply_config(config)
+        self.attributor.set_rules(PortClassifier(config.priority_levels()), config.app_tiers())
+
+    def get_qos_stats(self, interface: str) -> Dict:
+        return self.attributor.sample()
+
+    def top_apps(self, n: int = 5) -> List[Tuple[str, int]]:
+        return self.attributor.top_apps(n)
+
+    def close(self) -> None:
+        super().close()
+        self.attributor.close()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import glob
+import hashlib
+import json
+import logging
+import os
+import tkinter as tk
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ICON_SIZE = 16
+CACHE_DIR = ".cache"
+INDEX_FILE = "sprites.json"
+INDEX_VERSION = 1
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_sprite_sheet(icon_dir: str = "icons", size: int = ICON_SIZE, columns: int = 16) -> str:
+    """Resize every icon once into a single PNG sheet plus a JSON index; returns the sheet path.
+
+    Icons with identical content share one slot. The sheet is named after
+    the hash of everything in it, so a stale sheet is never picked up by an
+    index written for another one.
+    """
+    from PIL import Image
+
+    sources = sorted(glob.glob(os.path.join(icon_dir, "*.png")))
+    slots: Dict[str, int] = {}
+    icons = {}
+    images = []
+    for path in sources:
+        digest = _sha256(path)
+        if digest not in slots:
+            slots[digest] = len(images)
+            with Image.open(path) as img:
+                images.append(img.convert("RGBA").resize((size, size), Image.Resampling.LANCZOS))
+        st = os.stat(path)
+        icons[os.path.splitext(os.path.basename(path))[0]] = {
+            "slot": slots[digest], "sha256": digest, "bytes": st.st_size, "mtime_ns": st.st_mtime_ns
+        }
+
+    rows = max(1, -(-len(images) // columns))
+    sheet = Image.new("RGBA", (columns * size, rows * size), (0, 0, 0, 0))
+    for i, img in enumerate(images):
+        sheet.paste(img, ((i % columns) * size, (i // columns) * size))
+
+    cache_dir = os.path.join(icon_dir, CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    sheet_key = hashlib.sha256(f"{size}:{columns}:".encode() + "".join(slots).encode()).hexdigest()[:16]
+    sheet_name = f"sprites-{sheet_key}.png"
+    sheet.save(os.path.join(cache_dir, sheet_name))
+    index = {"version": INDEX_VERSION, "size": size, "columns": columns, "sheet": sheet_name, "icons": icons}
+    tmp = os.path.join(cache_dir, INDEX_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, os.path.join(cache_dir, INDEX_FILE))
+    for old in glob.glob(os.path.join(cache_dir, "sprites-*.png")):
+        if os.path.basename(old) != sheet_name:
+            os.remove(old)
+    return os.path.join(cache_dir, sheet_name)
+
+
+class IconCache:
+    """Icons cut out of the prebuilt sprite sheet the first time each is asked for.
+
+    Nothing is decoded until get() is called; the sheet itself is read by Tk
+    on first use, without PIL. An icon whose source file no longer matches
+    the content hash in the index (or that is not in the index at all) is
+    decoded from its own PNG instead, so a forgotten rebuild only costs
+    speed. Must be used from the Tk thread after the root window exists.
+    """
+
+    def __init__(self, icon_dir: str = "icons", size: int = ICON_SIZE):
+        self.icon_dir = icon_dir
+        self.size = size
+        self.decoded = 0
+        self._icons: Dict[str, tk.PhotoImage] = {}
+        self._sheet: Optional[tk.PhotoImage] = None
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict:
+        path = os.path.join(self.icon_dir, CACHE_DIR, INDEX_FILE)
+        try:
+            with open(path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            logger.info(f"No icon sprite sheet in {self.icon_dir}; run create_placeholders.py to build one")
+            return {}
+        if index.get("version") != INDEX_VERSION or index.get("size") != self.size:
+            logger.info("Icon sprite sheet is out of date; run create_placeholders.py to rebuild it")
+            return {}
+        return index
+
+    def _current(self, name: str, entry: Dict) -> bool:
+        # A matching size and mtime means unchanged; otherwise compare content
+        # (a checkout touches mtimes without changing the bytes)
+        try:
+            st = os.stat(os.path.join(self.icon_dir, f"{name}.png"))
+        except OSError:
+            return True
+        if st.st_size == entry["bytes"] and st.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        return _sha256(os.path.join(self.icon_dir, f"{name}.png")) == entry["sha256"]
+
+    def _from_sheet(self, slot: int) -> Optional[tk.PhotoImage]:
+        if self._sheet is None:
+            try:
+                self._sheet = tk.PhotoImage(file=os.path.join(self.icon_dir, CACHE_DIR, self._index["sheet"]))
+            except tk.TclError as e:
+                logger.warning(f"Cannot read icon sprite sheet: {e}")
+                self._index = {}
+                return None
+        columns = self._index["columns"]
+        x, y = (slot % columns) * self.size, (slot // columns) * self.size
+        icon = tk.PhotoImage(width=self.size, height=self.size)
+        icon.tk.call(icon, "copy", self._sheet, "-from", x, y, x + self.size, y + self.size)
+        return icon
+
+    def _from_file(self, path: str) -> tk.PhotoImage:
+        try:
+            from PIL import Image, ImageTk
+        except ImportError:
+            # Tk reads PNG itself; it can only shrink by whole factors
+            icon = tk.PhotoImage(file=path)
+            factor = max(1, -(-max(icon.width(), icon.height()) // self.size))
+            return icon.subsample(factor) if factor > 1 else icon
+        with Image.open(path) as img:
+            return ImageTk.PhotoImage(img.resize((self.size, self.size), Image.Resampling.LANCZOS))
+
+    def default(self) -> tk.PhotoImage:
+        icon = self._icons.get("default")
+        if icon is None:
+            icon = self._icons["default"] = tk.PhotoImage(width=self.size, height=self.size)
+            icon.put("gray", to=(0, 0, self.size, self.size))
+        return icon
+
+    def get(self, name: str) -> tk.PhotoImage:
+        icon = self._icons.get(name)
+        if icon is not None:
+            return icon
+        entry = self._index.get("icons", {}).get(name)
+        if entry is not None and self._current(name, entry):
+            icon = self._from_sheet(entry["slot"])
+        if icon is None:
+            path = os.path.join(self.icon_dir, f"{name}.png")
+            try:
+                icon = self._from_file(path)
+            except (OSError, tk.TclError) as e:
+                logger.debug(f"No icon for {name}: {e}")
+                icon = self.default()
+        self.decoded += 1
+        self._icons[name] = icon
+        return icon
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import json
+import logging
+import re
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_SEPARATORS = re.compile(r"[ \t\r\n,]*")
+# Characters an unfinished number or true/false/null can end with
+_TOKEN_CHARS = frozenset("0123456789+-.eEtrufalsn")
+_TOKEN_RUN = re.compile(r"[0-9+\-.eEtrufalsn]*")
+
+
+class JsonRecordStream:
+    """Yields the elements of a top-level JSON array as its text arrives in chunks.
+
+    ConvertTo-Json prints a single object instead of a one-element array, so a
+    top-level object is yielded as the only record. At most read_size
+    characters beyond the record being decoded are buffered. An element that
+    cannot be decoded is counted in `errors` and skipped by resuming at the
+    next object; output that is not JSON at all counts as one error and
+    yields nothing.
+    """
+
+    def __init__(self, chunks: Iterable[str], read_size: int = 1 << 16, max_record: int = 1 << 20):
+        self._chunks = iter(chunks)
+        self.read_size = read_size
+        self.max_record = max_record
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._exhausted = False
+        self.records = 0
+        self.errors = 0
+
+    def _fill(self) -> bool:
+        # Drop consumed text, then append at least read_size more characters so a
+        # record split across many small chunks is not re-decoded once per chunk;
+        # False once the input is exhausted
+        if self._exhausted:
+            return False
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        parts = []
+        size = 0
+        for chunk in self._chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= self.read_size:
+                break
+        else:
+            self._exhausted = True
+        if not size:
+            return False
+        self._buf += "".join(parts)
+        return True
+
+    def _skip(self, pattern) -> bool:
+        # Advance past whitespace (and commas); False when the input ends first
+        while True:
+            self._pos = pattern.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return True
+            if not self._fill():
+                return False
+
+    def _decode(self) -> Any:
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                # Truncated text fails at the end of the buffer, inside an open string
+                # or on an unfinished number/literal; anything else is malformed
+                tail = self._buf[e.pos:]
+                truncated = (e.msg.startswith("Unterminated string")
+                             or (len(tail) <= 8 and all(c in _TOKEN_CHARS for c in tail)))
+                if truncated and len(self._buf) - self._pos < self.max_record and self._fill():
+                    continue
+                raise
+            if (not isinstance(value, (dict, list, str))
+                    and _TOKEN_RUN.match(self._buf, end).end() == len(self._buf) and self._fill()):
+                # A number or literal at the end of the buffer, or followed only by the
+                # start of a fraction or exponent, may continue in the next chunk
+                continue
+            self._pos = end
+            return value
+
+    def _resync(self) -> bool:
+        # Resume at the next object after a malformed element; only the first
+        # search skips the character the element failed at
+        start = self._pos + 1
+        while True:
+            start = self._buf.find("{", start)
+            if start >= 0:
+                self._pos = start
+                return True
+            self._pos = len(self._buf)
+            if not self._fill():
+                return False
+            start = self._pos
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self._skip(_WHITESPACE):
+            return
+        if self._buf[self._pos] != "[":
+            try:
+                value = self._decode()
+            except json.JSONDecodeError as e:
+                self.errors += 1
+                logger.debug(f"Output is not JSON: {e}")
+                return
+            self.records += 1
+            yield value
+            return
+
+        self._pos += 1
+        while self._skip(_SEPARATORS):
+            if self._buf[self._pos] == "]":
+                return
+            try:
+                value = self._decode()
+            except json.JSONDecodeError as e:
+                self.errors += 1
+                logger.debug(f"Skipping malformed JSON element: {e}")
+                if not self._resync():
+                    return
+                continue
+            self.records += 1
+            yield value
+        # Input ended before the closing bracket
+        self.errors += 1
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import re
+import subprocess
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from classifier import PortClassifier
+from config import TIER_TO_DSCP, load_config
+
+logger = logging.getLogger(__name__)
+
+ROOT_HANDLE = "1:"
+PARENT_CLASS = "1:1"
+NFT_TABLE = "vpnqos"
+# Tier classes and leaf qdiscs are numbered from here so no DSCP value lands
+# on the parent class 1:1 or the root qdisc 1:
+CLASS_MINOR_BASE = 0x100
+HTB_MAX_PRIO = 7
+
+
+def class_minor(dscp: int) -> int:
+    # The class minor carries the tier's DSCP value; LinuxBackend reads it back
+    return CLASS_MINOR_BASE + dscp
+
+
+def class_id(dscp: int) -> str:
+    return f"1:{class_minor(dscp):x}"
+
+
+def parse_rate_kbit(rate: str) -> int:
+    units = {"kbit": 1, "mbit": 1000, "gbit": 1000000}
+    for suffix, factor in units.items():
+        if rate.lower().endswith(suffix):
+            return int(float(rate[:-len(suffix)]) * factor)
+    return int(rate)
+
+
+IP_PROTOCOLS = {"tcp": 6, "udp": 17}
+
+
+def port_masks(start: int, end: int) -> List[tuple]:
+    """Cover [start, end] with (value, mask) pairs usable by u32 port matches."""
+    masks = []
+    while start <= end:
+        size = start & -start or 0x10000
+        while size > end - start + 1:
+            size //= 2
+        masks.append((start, 0xFFFF & ~(size - 1)))
+        start += size
+    return masks
+
+
+def _port_spec(start: int, end: int) -> str:
+    return str(start) if start == end else f"{start}-{end}"
+
+
+def _nft_comment(text: str) -> str:
+    # Names come from priority.json; keep quotes, semicolons and newlines out of the nft script
+    return re.sub(r"[^\w .:+()-]", "_", text, flags=re.ASCII)[:128]
+
+
+def _tiers(priority_levels: List[Dict]) -> List[Dict]:
+    tiers = []
+    for level in priority_levels:
+        dscp = level.get("dscp", TIER_TO_DSCP.get(level["name"]))
+        if dscp is None:
+            logger.warning(f"No DSCP value for tier {level['name']}, skipping it")
+            continue
+        tiers.append({"name": level["name"], "dscp": dscp, "level": level})
+    return tiers
+
+
+def _tier_ranges(tiers: List[Dict], classifier: Optional[PortClassifier]) -> Dict[str, List[Tuple[str, int, int]]]:
+    # (protocol, start, end) per tier, from the classifier's resolved ranges
+    if classifier is None:
+        classifier = PortClassifier([tier["level"] for tier in tiers])
+    ranges = {tier["name"]: [] for tier in tiers}
+    for proto in classifier.protocols:
+        for start, end, name in classifier.ranges(proto):
+            if name in ranges:
+                ranges[name].append((proto, start, end))
+    return ranges
+
+
+def _tier_class(verb: str, dev: str, cid: str, rate_kbit: int, link_kbit: int, prio: int) -> str:
+    # HTB only has priorities 0-7; tiers past the eighth share the lowest
+    return (f"class {verb} dev {dev} parent {PARENT_CLASS} classid {cid} "
+            f"htb rate {rate_kbit}kbit ceil {link_kbit}kbit prio {min(prio, HTB_MAX_PRIO)}")
+
+
+def compile_tc(priority_levels: List[Dict], dev: str, link_kbit: int,
+               leaf_qdisc: Optional[str] = "fq_codel", root_mode: str = "create",
+               classifier: Optional[PortClassifier] = None) -> List[str]:
+    """HTB tree plus u32 filters as `tc -batch` lines.
+
+    root_mode is "create" when the device has no HTB root yet, "keep" to
+    update an existing tree of the same shape in place (counters survive),
+    and "rebuild" to drop and recreate a tree whose classes changed.
+
+    Port filters are compiled from the classifier's resolved ranges, so
+    where tiers claim the same port only the earlier tier gets a filter.
+    A tier earlier in priority.json still gets a lower filter prio, which
+    decides packets whose source and destination ports match different
+    tiers. Packets that already carry a tier's DSCP mark are classified
+    after all port rules.
+    """
+    tiers = _tiers(priority_levels)
+    ranges = _tier_ranges(tiers, classifier)
+    default = class_id(tiers[-1]["dscp"] if tiers else 0)
+    root = f"root handle {ROOT_HANDLE} htb default {default.split(':')[1]}"
+    lines = {
+        "create": [f"qdisc replace dev {dev} {root}"],
+        "keep": [],
+        "rebuild": [f"qdisc del dev {dev} root", f"qdisc add dev {dev} {root}"],
+    }[root_mode]
+    lines += [
+        f"class replace dev {dev} parent {ROOT_HANDLE} classid {PARENT_CLASS} htb rate {link_kbit}kbit ceil {link_kbit}kbit",
+        f"filter del dev {dev} parent {ROOT_HANDLE}",
+    ]
+    for prio, tier in enumerate(tiers, start=1):
+        rate = max(1, round(link_kbit * float(tier["level"].get("bandwidth_percent", 0)) / 100))
+        cid = class_id(tier["dscp"])
+        lines.append(_tier_class("replace", dev, cid, rate, link_kbit, prio - 1))
+        if leaf_qdisc:
+            lines.append(f"qdisc replace dev {dev} parent {cid} handle {class_minor(tier['dscp']):x}: {leaf_qdisc}")
+        for proto, start, end in ranges[tier["name"]]:
+            for value, mask in port_masks(start, end):
+                for direction in ("dport", "sport"):
+                    lines.append(
+                        f"filter add dev {dev} parent {ROOT_HANDLE} protocol ip prio {prio} u32 "
+                        f"match ip protocol {IP_PROTOCOLS[proto]} 0xff "
+                        f"match ip {direction} {value} 0x{mask:04x} flowid {cid}"
+                    )
+        lines.append(
+            f"filter add dev {dev} parent {ROOT_HANDLE} protocol ip prio {len(tiers) + prio} "
+            f"u32 match ip dsfield 0x{tier['dscp'] << 2:02x} 0xfc flowid {cid}"
+        )
+    return lines
+
+
+def compile_rate_changes(priority_levels: List[Dict], rates_kbit: Dict[str, int], dev: str,
+                         link_kbit: int) -> List[str]:
+    """`tc class change` lines that only move the guaranteed rate of the given tiers.
+
+    Filters, leaf qdiscs and counters are left alone; prio and ceil are
+    restated because HTB resets omitted parameters on change.
+    """
+    lines = []
+    for prio, tier in enumerate(_tiers(priority_levels)):
+        if tier["name"] in rates_kbit:
+            rate = max(1, int(rates_kbit[tier["name"]]))
+            lines.append(_tier_class("change", dev, class_id(tier["dscp"]), rate, link_kbit, prio))
+    return lines
+
+
+def compile_nft(priority_levels: List[Dict], table: str = NFT_TABLE,
+                classifier: Optional[PortClassifier] = None) -> str:
+    """DSCP-marking ruleset loaded atomically with `nft -f`; first matching tier wins.
+
+    Rules come from the classifier's resolved ranges, as for tc. Like the tc
+    filters, a range matches either the destination or the source port, so
+    replies from a local server are marked too.
+    """
+    tiers = _tiers(priority_levels)
+    ranges = _tier_ranges(tiers, classifier)
+    rules = []
+    for tier in tiers:
+        comment = _nft_comment(tier["name"])
+        for proto, start, end in ranges[tier["name"]]:
+            for family in ("ip", "ip6"):
+                for direction in ("dport", "sport"):
+                    rules.append(
+                        f"        meta nfproto {'ipv4' if family == 'ip' else 'ipv6'} "
+                        f"{proto} {direction} {_port_spec(start, end)} {family} dscp set {tier['dscp']} accept "
+                        f"comment \"{comment}\""
+                    )
+    return "\n".join([
+        # Declaring then deleting the table lets one transaction replace it whether or not it exists
+        f"table inet {table}",
+        f"delete table inet {table}",
+        f"table inet {table} {{",
+        "    chain postrouting {",
+        "        type filter hook postrouting priority mangle; policy accept;",
+        *rules,
+        "    }",
+        "}",
+        ""
+    ])
+
+
+class LinuxEnforcer:
+    """Applies priority.json tiers with one tc and/or one nft invocation."""
+
+    def __init__(self, dev: str, link_kbit: int, netns: Optional[str] = None,
+                 use_tc: bool = True, use_nft: bool = True, leaf_qdisc: Optional[str] = "fq_codel"):
+        self.dev = dev
+        self.leaf_qdisc = leaf_qdisc
+        self.link_kbit = link_kbit
+        self.netns = netns
+        self.use_tc = use_tc
+        self.use_nft = use_nft
+
+    def _command(self, *args: str) -> List[str]:
+        prefix = ["ip", "netns", "exec", self.netns] if self.netns else []
+        return prefix + list(args)
+
+    def _run_script(self, args: List[str], script: str) -> None:
+        with tempfile.NamedTemporaryFile("w", suffix=".batch") as f:
+            f.write(script)
+            f.flush()
+            result = subprocess.run(self._command(*args, f.name), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{args[0]} failed: {result.stderr.strip()}")
+        if result.stderr.strip():
+            logger.debug(result.stderr.strip())
+
+    def _root_mode(self, priority_levels: List[Dict]) -> str:
+        # One read-only look at the current tree decides how the batch starts
+        qdisc = subprocess.run(self._command("tc", "qdisc", "show", "dev", self.dev, "root"),
+                               capture_output=True, text=True).stdout
+        if not qdisc.startswith(f"qdisc htb {ROOT_HANDLE}"):
+            return "create"
+        classes = subprocess.run(self._command("tc", "class", "show", "dev", self.dev),
+                                 capture_output=True, text=True).stdout
+        current = {line.split()[2] for line in classes.splitlines() if line.startswith("class htb")}
+        tiers = _tiers(priority_levels)
+        desired = {PARENT_CLASS} | {class_id(tier["dscp"]) for tier in tiers}
+        fields = qdisc.split()
+        current_default = int(fields[fields.index("default") + 1], 16) if "default" in fields else None
+        if current == desired and current_default == class_minor(tiers[-1]["dscp"] if tiers else 0):
+            return "keep"
+        return "rebuild"
+
+    def apply(self, priority_levels: List[Dict]) -> None:
+        # One classifier for both scripts; building it reports overlapping and shadowed rules
+        tiers = _tiers(priority_levels)
+        classifier = PortClassifier([tier["level"] for tier in tiers])
+        if self.use_tc:
+            # tc -batch stops at the first failing line
+            root_mode = self._root_mode(priority_levels)
+            lines = compile_tc(priority_levels, self.dev, self.link_kbit, self.leaf_qdisc, root_mode, classifier)
+            self._run_script(["tc", "-batch"], "\n".join(lines) + "\n")
+            logger.info(f"Applied HTB tree for {len(tiers)} tiers on {self.dev} ({root_mode})")
+        if self.use_nft:
+            self._run_script(["nft", "-f"], compile_nft(priority_levels, classifier=classifier))
+            logger.info("Applied nftables DSCP marking rules")
+
+    def set_rates(self, priority_levels: List[Dict], rates_kbit: Dict[str, int]) -> None:
+        """Change the guaranteed rates of existing tier classes in one tc invocation."""
+        lines = compile_rate_changes(priority_levels, rates_kbit, self.dev, self.link_kbit)
+        if lines:
+            self._run_script(["tc", "-batch"], "\n".join(lines) + "\n")
+
+    def remove(self) -> None:
+        if self.use_tc:
+            subprocess.run(self._command("tc", "qdisc", "del", "dev", self.dev, "root"), capture_output=True)
+        if self.use_nft:
+            subprocess.run(self._command("nft", "delete", "table", "inet", NFT_TABLE), capture_output=True)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Enforce priority.json tiers with tc/HTB and nftables")
+    parser.add_argument("--dev", required=True, help="Egress interface")
+    parser.add_argument("--rate", default="100mbit", help="Link rate, e.g. 100mbit")
+    parser.add_argument("--priority-file", default="priority.json")
+    parser.add_argument("--netns", help="Run inside this network namespace")
+    parser.add_argument("--backend", choices=["tc", "nft", "both"], default="both")
+    parser.add_argument("--leaf-qdisc", default="fq_codel", help="Qdisc under each tier class, or 'none'")
+    parser.add_argument("--dry-run", action="store_true", help="Print the batch files instead of applying them")
+    parser.add_argument("--remove", action="store_true", help="Remove the HTB tree and nft table")
+    args = parser.parse_args()
+
+    levels = load_config(args.priority_file).priority_levels()
+    link_kbit = parse_rate_kbit(args.rate)
+    leaf_qdisc = None if args.leaf_qdisc == "none" else args.leaf_qdisc
+    enforcer = LinuxEnforcer(args.dev, link_kbit, args.netns,
+                             use_tc=args.backend in ("tc", "both"), use_nft=args.backend in ("nft", "both"),
+                             leaf_qdisc=leaf_qdisc)
+    if args.remove:
+        enforcer.remove()
+    elif args.dry_run:
+        classifier = PortClassifier([tier["level"] for tier in _tiers(levels)])
+        if enforcer.use_tc:
+            print("\n".join(compile_tc(levels, args.dev, link_kbit, leaf_qdisc, classifier=classifier)))
+        if enforcer.use_nft:
+            print(compile_nft(levels, classifier=classifier))
+    else:
+        enforcer.apply(levels)
+
+
+if __name__ == "__main__":
+    main()
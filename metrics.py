@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sample log layout: 16-byte file header, then fixed-size records
+SAMPLE_LOG_MAGIC = b"QOSS"
+SAMPLE_LOG_VERSION = 2
+FILE_HEADER = struct.Struct("=4sHH8x")
+# wall time, series id, raw value; ids index the sidecar <file>.keys, one JSON
+# string ("tier/Ultra High/bytes") per line, so keys of any length round-trip
+RECORD = struct.Struct("=dId")
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _format_value(value: float) -> str:
+    # Exact for counters; %g would round large byte totals
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _keys_path(path: str) -> str:
+    return f"{path}.keys"
+
+
+def _read_keys(path: str) -> List[str]:
+    try:
+        with open(_keys_path(path), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Counters and gauges rendered in the Prometheus text format.
+
+    Updating a metric is a dict write under a lock, cheap enough for the
+    sampling path; formatting only happens when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[LabelSet, float]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        with self._lock:
+            self._meta[name] = (kind, help_text)
+            self._values.setdefault(name, {})
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> str:
+        with self._lock:
+            snapshot = {name: dict(series) for name, series in self._values.items()}
+            meta = dict(self._meta)
+        lines = []
+        for name in sorted(snapshot):
+            kind, help_text = meta.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in snapshot[name].items():
+                label_text = ",".join(f"{k}=\"{_escape(str(v))}\"" for k, v in labels)
+                series = f"{name}{{{label_text}}}" if label_text else name
+                lines.append(f"{series} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a registry at /metrics from a background thread."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                # Scrapes every few seconds would otherwise flood the log
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{host}:{self.port}/metrics")
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SampleLog:
+    """Append-only file of fixed-size sample records with size-based rotation.
+
+    When the next record would push the file past max_bytes it is renamed to
+    path.1 (older files shift up to path.<backups>) and a new file is started.
+    Each file has its own key table, rotated along with it; new keys are
+    flushed to the table before any record that refers to them.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 << 20, backups: int = 5):
+        self.path = path
+        self.max_bytes = max(max_bytes, FILE_HEADER.size + RECORD.size)
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = None
+        self._keys_file = None
+        self._ids: Dict[str, int] = {}
+        self._size = 0
+        self._open()
+
+    def _open(self) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb") as f:
+                header = f.read(FILE_HEADER.size)
+            if header != FILE_HEADER.pack(SAMPLE_LOG_MAGIC, SAMPLE_LOG_VERSION, RECORD.size):
+                # Never append to a log in another format; move it out of the way
+                logger.warning(f"{self.path} is not a version {SAMPLE_LOG_VERSION} sample log, rotating it")
+                self._shift()
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(FILE_HEADER.pack(SAMPLE_LOG_MAGIC, SAMPLE_LOG_VERSION, RECORD.size))
+            self._size = FILE_HEADER.size
+            if os.path.exists(_keys_path(self.path)):
+                os.remove(_keys_path(self.path))
+        self._ids = {key: i for i, key in enumerate(_read_keys(self.path))}
+        self._keys_file = open(_keys_path(self.path), "a", encoding="utf-8")
+
+    def _shift(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            for src, dst in ((f"{self.path}.{i}", f"{self.path}.{i + 1}"),
+                             (_keys_path(f"{self.path}.{i}"), _keys_path(f"{self.path}.{i + 1}"))):
+                if os.path.exists(src):
+                    os.replace(src, dst)
+        for src, dst in ((self.path, f"{self.path}.1"), (_keys_path(self.path), _keys_path(f"{self.path}.1"))):
+            if not os.path.exists(src):
+                continue
+            if self.backups > 0:
+                os.replace(src, dst)
+            else:
+                os.remove(src)
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._keys_file.close()
+        self._shift()
+        self._open()
+
+    def _id(self, key: str) -> int:
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self._ids)
+            self._keys_file.write(json.dumps(key) + "\n")
+        return i
+
+    def write(self, records: List[Tuple[float, str, float]]) -> None:
+        """Append (wall time, key, value) records; one write call per batch."""
+        with self._lock:
+            if self._size + len(records) * RECORD.size > self.max_bytes and self._size > FILE_HEADER.size:
+                self._rotate()
+            data = b"".join(RECORD.pack(t, self._id(key), value) for t, key, value in records)
+            self._keys_file.flush()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._keys_file.close()
+                self._file = None
+
+
+class SampleLogReader:
+    """Random access to one sample log file through mmap, without reading it into memory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < FILE_HEADER.size:
+                raise ValueError(f"{path} is too short to be a sample log")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != SAMPLE_LOG_MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a version {SAMPLE_LOG_VERSION} sample log")
+        # A record cut short by a crash is ignored
+        self.count = (size - FILE_HEADER.size) // RECORD.size
+        self.keys = _read_keys(path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Tuple[float, str, float]:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        t, key_id, value = RECORD.unpack_from(self._map, FILE_HEADER.size + i * RECORD.size)
+        return t, self.keys[key_id], value
+
+    def __iter__(self) -> Iterator[Tuple[float, str, float]]:
+        end = FILE_HEADER.size + self.count * RECORD.size
+        view = memoryview(self._map)[FILE_HEADER.size:end]
+        try:
+            for t, key_id, value in RECORD.iter_unpack(view):
+                yield t, self.keys[key_id], value
+        finally:
+            view.release()
+
+    def series(self, key: str) -> List[Tuple[float, float]]:
+        return [(t, value) for t, k, value in self if k == key]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def read_sample_logs(path: str) -> Iterator[Tuple[float, str, float]]:
+    """All records of a rotated sample log, oldest file first."""
+    paths = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        paths.append(f"{path}.{i}")
+        i += 1
+    paths.reverse()
+    if os.path.exists(path):
+        paths.append(path)
+    for p in paths:
+        try:
+            reader = SampleLogReader(p)
+        except ValueError as e:
+            logger.warning(f"Skipping {p}: {e}")
+            continue
+        try:
+            yield from reader
+        finally:
+            reader.close()
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump a binary sample log as text")
+    parser.add_argument("path", help="Sample log file (rotated files are read too)")
+    parser.add_argument("--key", help="Only print this series, e.g. 'tier/Ultra High/bytes'")
+    args = parser.parse_args()
+    for t, key, value in read_sample_logs(args.path):
+        if args.key is None or key == args.key:
+            print(f"{t:.3f}\t{key}\t{_format_value(value)}")
+
+
+if __name__ == "__main__":
+    main()
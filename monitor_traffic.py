@@ -1,156 +1,289 @@
 #!/usr/bin/env python3
-import subprocess
+import argparse
+import asyncio
 import logging
-import time
-import json
-from typing import Dict
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Optional
+
+from config import ConfigDiff, QosConfig, get_config_store
+from metrics import MetricsRegistry, MetricsServer, SampleLog, get_registry
+from shell_session import SessionPool
+from stats_backend import StatsBackend, default_backend
+from scheduler import Sample, SampleScheduler
+from timeseries import TimeSeriesStore
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler("traffic_monitor.log"),
+        RotatingFileHandler("traffic_monitor.log", maxBytes=5 * 1024 * 1024, backupCount=3),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
 class WindowsTrafficMonitor:
-    def __init__(self):
-        self.interface = self.detect_interface()
-        self.sample_interval = 1
-        self.dscp_to_tier = {
-            46: "Ultra High",
-            34: "High",
-            28: "Medium",
-            10: "Low"
-        }
+    def __init__(self, backend: Optional[StatsBackend] = None, pool: Optional[SessionPool] = None,
+                 interface: Optional[str] = None, sample_interval: float = 1,
+                 config: Optional[QosConfig] = None):
+        self.sample_interval = sample_interval
+        self.config = config or get_config_store().get()
+        self.dscp_to_tier = self.config.dscp_to_tier()
+        self.backend = backend or default_backend(self.dscp_to_tier, pool)
+        self.interface = interface or self.detect_interface()
+
+        # Rate history per tier and interface, sized for the longest window
+        self.windows = (1, 10, 60)
+        self.report_window = 10
+        self.history = TimeSeriesStore(self.sample_interval, self.windows)
+        self.top_n = 5
+
+        # Per-sample outputs; the printout is one optional view among them
+        self.print_samples = True
+        self.sample_log: Optional[SampleLog] = None
+        self.metrics: MetricsRegistry = get_registry()
+        # Optional rebalance.RebalanceController fed with every sample's tier rates
+        self.rebalancer = None
+        # Optional linux_enforce.LinuxEnforcer re-applied when the tiers are reloaded
+        self.enforcer = None
+        self._pending_config: Optional[QosConfig] = None
+        self.metrics.describe("qos_tier_rate_bytes", "gauge", "Per-tier throughput in bytes per second")
+        self.metrics.describe("qos_tier_bytes_total", "counter", "Per-tier byte counter as read from the backend")
+        self.metrics.describe("qos_interface_rate_bytes", "gauge", "Interface throughput in bytes per second")
+        self.metrics.describe("qos_interface_bytes_total", "counter", "Interface byte counter")
+        self.metrics.describe("qos_samples_total", "counter", "Samples recorded")
+        self.metrics.describe("qos_counter_resets_total", "counter", "Counter resets seen per series")
 
     def detect_interface(self) -> str:
-        try:
-            ps_command = (
-                "Get-NetAdapter | Where-Object {$_.Status -eq 'Up'} | "
-                "Select-Object -First 1 Name | ForEach-Object {$_.Name}"
-            )
-            result = subprocess.run(
-                ["powershell", "-Command", ps_command],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            interface = result.stdout.strip()
-            if not interface:
-                logger.warning("No active network interface found. Using default 'Ethernet'.")
-                return "Ethernet"
-            logger.info(f"Detected active interface: {interface}")
-            return interface
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to detect network interface: {e.stderr}")
-            return "Ethernet"
+        return self.backend.detect_interface()
 
     def get_qos_stats(self) -> Dict:
-        try:
-            ps_command = (
-                "Get-NetQosPolicy | Select-Object Name, DSCPValue, "
-                "@{Name='Bytes';Expression={(Get-Counter "
-                "'\\Network Interface(*)\\Bytes Total/sec' -ErrorAction SilentlyContinue).CounterSamples.CookedValue}} "
-                "| ConvertTo-Json"
-            )
-            result = subprocess.run(
-                ["powershell", "-Command", ps_command],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return self._parse_qos_output(result.stdout)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to get QoS stats: {e.stderr}")
-            return {}
-
-    def _parse_qos_output(self, output: str) -> Dict:
-        stats = {}
-        try:
-            qos_data = json.loads(output)
-            if isinstance(qos_data, dict):
-                qos_data = [qos_data]
-
-            for policy in qos_data:
-                dscp = policy.get("DSCPValue")
-                tier = self.dscp_to_tier.get(dscp, f"DSCP {dscp}")
-                if tier not in stats:
-                    stats[tier] = {"bytes": 0}
-                stats[tier]["bytes"] += int(policy.get("Bytes", 0) or 0)
-            logger.info(f"Parsed {len(stats)} tiers from DSCP mappings")
-        except json.JSONDecodeError:
-            logger.error("Failed to parse QoS statistics")
-        return stats
+        return self.backend.get_qos_stats(self.interface)
 
     def get_interface_stats(self) -> Dict:
-        try:
-            ps_command = (
-                f"Get-NetAdapterStatistics -Name \"{self.interface}\" | "
-                "Select-Object ReceivedBytes, SentBytes | ConvertTo-Json"
-            )
-            result = subprocess.run(
-                ["powershell", "-Command", ps_command],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return self._parse_interface_output(result.stdout)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to get interface stats for {self.interface}: {e.stderr}")
-            return {"input_bytes": 0, "output_bytes": 0}
-
-    def _parse_interface_output(self, output: str) -> Dict:
-        stats = {"input_bytes": 0, "output_bytes": 0}
-        try:
-            data = json.loads(output)
-            stats["input_bytes"] = data.get("ReceivedBytes", 0)
-            stats["output_bytes"] = data.get("SentBytes", 0)
-        except json.JSONDecodeError:
-            logger.error("Failed to parse interface statistics")
-        return stats
+        return self.backend.get_interface_stats(self.interface)
+
+    def apply_config(self, config: QosConfig, diff: ConfigDiff) -> None:
+        """ConfigStore subscriber; the change is picked up by the next sample, on the sampling thread."""
+        if diff.tiers or diff.apps:
+            self._pending_config = config
+
+    def _reconfigure(self) -> None:
+        config, self._pending_config = self._pending_config, None
+        tiers_changed = config.tiers != self.config.tiers
+        # Removed or renamed tiers would otherwise keep their last rate in every report
+        self.history.drop("tier", {tier.name for tier in self.config.tiers} - {tier.name for tier in config.tiers})
+        self.config = config
+        self.dscp_to_tier = config.dscp_to_tier()
+        self.backend.apply_config(config)
+        if not tiers_changed:
+            return
+        # Enforcement first, so the rebalancer starts from the tree it will adjust
+        levels = config.priority_levels()
+        if self.enforcer is not None:
+            try:
+                self.enforcer.apply(levels)
+            except (OSError, RuntimeError) as e:
+                logger.error(f"Failed to apply reloaded tiers: {e}")
+        if self.rebalancer is not None:
+            try:
+                self.rebalancer.set_levels(levels)
+            except ValueError as e:
+                logger.error(f"Rebalancer kept its previous tiers: {e}")
+        logger.info(f"Monitoring {len(config.tiers)} tiers on {self.interface} after config reload")
+
+    def record_sample(self, sample: Sample) -> None:
+        if self._pending_config is not None:
+            self._reconfigure()
+        cumulative = self.backend.qos_cumulative
+        for tier, data in sample.qos_stats.items():
+            for field, value in data.items():
+                self.history.update(("tier", tier, field), sample.qos_time, value, cumulative)
+        for field, value in sample.interface_stats.items():
+            self.history.update(("iface", self.interface, field), sample.interface_time, value)
+
+    def _format_rate(self, key: tuple) -> str:
+        series = self.history.series.get(key)
+        if series is None or not series.history.count:
+            return "n/a"
+        s = series.stats(self.report_window)
+        return (
+            f"{s['rate']:.1f} ({self.report_window:g}s avg {s['ewma']:.1f}, "
+            f"min {s['min']:.1f}, max {s['max']:.1f}, p95 {s['p95']:.1f})"
+        )
+
+    def print_sample(self) -> None:
+        tier_rates = self.history.rates("tier", "bytes")
+
+        print("\nTraffic Statistics:")
+        print("------------------")
+        for tier in tier_rates:
+            print(f"\n{tier} Priority (DSCP-mapped)")
+            print(f"  Bytes/sec: {self._format_rate(('tier', tier, 'bytes'))}")
+            if ("tier", tier, "packets") in self.history.series:
+                print(f"  Packets/sec: {self._format_rate(('tier', tier, 'packets'))}")
+
+        print(f"\nInterface Statistics ({self.interface}):")
+        print(f"  Input Bytes/sec: {self._format_rate(('iface', self.interface, 'input_bytes'))}")
+        print(f"  Output Bytes/sec: {self._format_rate(('iface', self.interface, 'output_bytes'))}")
+        if ("iface", self.interface, "input_packets") in self.history.series:
+            print(f"  Input Packets/sec: {self._format_rate(('iface', self.interface, 'input_packets'))}")
+            print(f"  Output Packets/sec: {self._format_rate(('iface', self.interface, 'output_packets'))}")
+
+        total_rate = sum(tier_rates.values())
+        if total_rate > 0:
+            print("\nBandwidth Allocation:")
+            for tier, rate in tier_rates.items():
+                percent = (rate / total_rate * 100)
+                print(f"  {tier}: {percent:.2f}%")
+
+        top_apps = getattr(self.backend, "top_apps", None)
+        if top_apps is not None:
+            apps = top_apps(self.top_n)
+            if apps:
+                print(f"\nTop Applications (bytes in last {self.sample_interval:g}s):")
+                for name, delta in apps:
+                    print(f"  {name}: {delta}")
+
+    def export_sample(self, sample: Sample) -> None:
+        metrics = self.metrics
+        iface = self.interface
+        metrics.inc("qos_samples_total", interface=iface)
+        records = []
+        for tier, data in sample.qos_stats.items():
+            for field, value in data.items():
+                records.append((sample.wall_time, f"tier/{tier}/{field}", value))
+            if self.backend.qos_cumulative and "bytes" in data:
+                metrics.set("qos_tier_bytes_total", data["bytes"], interface=iface, tier=tier)
+        for field, value in sample.interface_stats.items():
+            records.append((sample.wall_time, f"iface/{iface}/{field}", value))
+        for direction in ("input", "output"):
+            if f"{direction}_bytes" in sample.interface_stats:
+                metrics.set("qos_interface_bytes_total", sample.interface_stats[f"{direction}_bytes"],
+                            interface=iface, direction=direction)
+
+        for tier, rate in self.history.rates("tier", "bytes").items():
+            metrics.set("qos_tier_rate_bytes", rate, interface=iface, tier=tier)
+        for direction in ("input", "output"):
+            series = self.history.series.get(("iface", iface, f"{direction}_bytes"))
+            if series is not None and series.history.count:
+                metrics.set("qos_interface_rate_bytes", series.rate, interface=iface, direction=direction)
+            if series is not None and series.counter is not None:
+                metrics.set("qos_counter_resets_total", series.counter.resets, interface=iface, direction=direction)
+
+        if self.sample_log is not None and records:
+            self.sample_log.write(records)
+
+    def handle_sample(self, sample: Sample) -> None:
+        self.record_sample(sample)
+        self.export_sample(sample)
+        if self.rebalancer is not None:
+            self.rebalancer.step(sample.qos_time, self.history.rates("tier", "bytes"))
+        if self.print_samples:
+            self.print_sample()
 
     def monitor(self, duration: int = 60) -> None:
         logger.info(f"Starting traffic monitoring for {duration} seconds on interface {self.interface}...")
+        monitor_all([self], duration)
 
-        start_time = time.time()
-        while time.time() - start_time < duration:
-            try:
-                qos_stats = self.get_qos_stats()
-                interface_stats = self.get_interface_stats()
-
-                print("\nTraffic Statistics:")
-                print("------------------")
-                for tier, data in qos_stats.items():
-                    print(f"\n{tier} Priority (DSCP-mapped)")
-                    print(f"  Bytes: {data['bytes']}")
-
-                print("\nInterface Statistics:")
-                print(f"  Input Bytes: {interface_stats['input_bytes']}")
-                print(f"  Output Bytes: {interface_stats['output_bytes']}")
-
-                total_bytes = sum(level["bytes"] for level in qos_stats.values())
-                if total_bytes > 0:
-                    print("\nBandwidth Allocation:")
-                    for tier, level_stats in qos_stats.items():
-                        percent = (level_stats["bytes"] / total_bytes * 100)
-                        print(f"  {tier}: {percent:.2f}%")
-                time.sleep(self.sample_interval)
-            except Exception as e:
-                logger.error(f"Error during monitoring: {e}")
-                time.sleep(self.sample_interval)
+
+def monitor_all(monitors, duration: float) -> SampleScheduler:
+    # Several interfaces (or hosts) sampled from one event loop
+    scheduler = SampleScheduler(
+        monitors,
+        interval=min(m.sample_interval for m in monitors),
+        on_sample=lambda sample: sample.target.handle_sample(sample)
+    )
+    asyncio.run(scheduler.run(duration))
+    return scheduler
 
 def main():
-    monitor = WindowsTrafficMonitor()
+    parser = argparse.ArgumentParser(description="Monitor per-tier QoS traffic")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=1)
+    parser.add_argument("--interface", action="append", help="Interface to sample (repeatable)")
+    parser.add_argument("--per-app", action="store_true",
+                        help="Attribute traffic to tiers and applications from per-socket counters (Linux)")
+    parser.add_argument("--priority-file", default="priority.json")
+    parser.add_argument("--capture", action="store_true",
+                        help="Count per-tier traffic from DSCP marks captured on the interface (Linux)")
+    parser.add_argument("--pcap", action="append", help="Replay pcap file(s) through DSCP accounting and exit")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="Address to serve metrics on; 0.0.0.0 exposes them to the network")
+    parser.add_argument("--sample-log", help="Append raw samples to this binary file")
+    parser.add_argument("--sample-log-max-mb", type=float, default=64, help="Rotate the sample log at this size")
+    parser.add_argument("--quiet", action="store_true", help="Do not print statistics every sample")
+    parser.add_argument("--rebalance", action="store_true",
+                        help="Adapt tier guarantees on the first interface's HTB tree to measured use (Linux)")
+    parser.add_argument("--link-rate", default="100mbit", help="Link rate the HTB tree was applied with")
+    args = parser.parse_args()
+
+    sample_log = None
+    server = None
     try:
-        monitor.monitor()
+        backend = None
+        store = get_config_store(args.priority_file)
+        config = store.get()
+        dscp_to_tier = config.dscp_to_tier()
+        if args.pcap:
+            from packet_capture import DscpAccounting, replay_pcap
+            accounting = DscpAccounting()
+            for path in args.pcap:
+                logger.info(f"Replayed {replay_pcap(path, accounting)} packets from {path}")
+            for tier, stats in accounting.tier_stats(dscp_to_tier).items():
+                print(f"{tier}: {stats['bytes']} bytes, {stats['packets']} packets")
+            return
+        if args.capture:
+            from packet_capture import CaptureBackend
+            backend = CaptureBackend(dscp_to_tier, args.interface[0] if args.interface else None)
+        elif args.per_app:
+            from classifier import PortClassifier
+            from flow_attribution import SocketAttributionBackend
+            backend = SocketAttributionBackend(dscp_to_tier, PortClassifier(config.priority_levels()),
+                                               config.app_tiers())
+        interfaces = args.interface or [None]
+        first = WindowsTrafficMonitor(backend=backend, interface=interfaces[0], sample_interval=args.interval,
+                                      config=config)
+        monitors = [first] + [
+            WindowsTrafficMonitor(backend=first.backend, interface=name, sample_interval=args.interval,
+                                  config=config)
+            for name in interfaces[1:]
+        ]
+        if args.sample_log:
+            sample_log = SampleLog(args.sample_log, max_bytes=int(args.sample_log_max_mb * 1024 * 1024))
+        for monitor in monitors:
+            monitor.print_samples = not args.quiet
+            monitor.sample_log = sample_log
+        if args.rebalance:
+            from linux_enforce import LinuxEnforcer, parse_rate_kbit
+            from rebalance import RebalanceController
+            link_kbit = parse_rate_kbit(args.link_rate)
+            first.enforcer = LinuxEnforcer(first.interface, link_kbit, use_nft=False)
+            first.rebalancer = RebalanceController(
+                config.priority_levels(), link_kbit,
+                apply=lambda rates: first.enforcer.set_rates(first.config.priority_levels(), rates)
+            )
+        # Edits to priority.json reach every monitor (and the HTB tree) without a restart
+        for monitor in monitors:
+            store.subscribe(monitor.apply_config)
+        store.watch()
+        if args.metrics_port is not None:
+            server = MetricsServer(first.metrics, host=args.metrics_host, port=args.metrics_port)
+        logger.info(f"Starting traffic monitoring for {args.duration} seconds on "
+                    f"{', '.join(m.interface for m in monitors)}...")
+        monitor_all(monitors, args.duration)
     except KeyboardInterrupt:
         print("\nMonitoring stopped by user")
     except Exception as e:
         logger.error(f"Error during monitoring: {e}")
+    finally:
+        # Flush the sample log and free the metrics port however monitoring ended
+        if sample_log is not None:
+            sample_log.close()
+        if server is not None:
+            server.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessIndex:
+    """Running processes indexed by lowercase name -> {pid: exe path}.
+
+    A refresh only lists PIDs and inspects the ones that appeared since the
+    previous refresh, so its cost follows process churn rather than the
+    total process count. generation increases whenever the set changes.
+    """
+
+    def __init__(self, ttl: float = 2.0):
+        self.ttl = ttl
+        self.generation = 0
+        self.refreshed_at = 0.0
+        self._by_pid: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._by_name: Dict[str, Dict[int, Optional[str]]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _list_pids(self) -> List[int]:
+        return psutil.pids()
+
+    def _inspect(self, pid: int) -> Optional[Tuple[str, Optional[str]]]:
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                name = proc.name().lower()
+                try:
+                    exe = proc.exe() or None
+                except (psutil.AccessDenied, psutil.ZombieProcess):
+                    exe = None
+            return name, exe
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+
+    def refresh(self) -> Tuple[List[Tuple[int, str, Optional[str]]], List[Tuple[int, str]]]:
+        """Diff the PID set and return (started, exited) since the last refresh."""
+        pids = set(self._list_pids())
+        started, exited = [], []
+        with self._lock:
+            for pid in self._by_pid.keys() - pids:
+                name, _ = self._by_pid.pop(pid)
+                entries = self._by_name.get(name)
+                if entries is not None:
+                    entries.pop(pid, None)
+                    if not entries:
+                        del self._by_name[name]
+                exited.append((pid, name))
+            for pid in pids - self._by_pid.keys():
+                info = self._inspect(pid)
+                if info is None:
+                    continue
+                name, exe = info
+                self._by_pid[pid] = info
+                self._by_name.setdefault(name, {})[pid] = exe
+                started.append((pid, name, exe))
+            if started or exited:
+                self.generation += 1
+            self.refreshed_at = time.monotonic()
+        return started, exited
+
+    def ensure_fresh(self) -> None:
+        if time.monotonic() - self.refreshed_at > self.ttl:
+            self.refresh()
+
+    def lookup(self, name: str) -> Dict[int, Optional[str]]:
+        self.ensure_fresh()
+        with self._lock:
+            return dict(self._by_name.get(name.lower(), {}))
+
+    def find_exe(self, name: str) -> Optional[str]:
+        for exe in self.lookup(name).values():
+            if exe:
+                return exe
+        return None
+
+    def running(self, names) -> Dict[str, str]:
+        # First known exe path for each requested name that is running
+        self.ensure_fresh()
+        found = {}
+        with self._lock:
+            for name in names:
+                for exe in self._by_name.get(name.lower(), {}).values():
+                    if exe:
+                        found[name] = exe
+                        break
+        return found
+
+    def _run(self, interval: float) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Process index refresh failed: {e}")
+            if self._stop.wait(interval):
+                return
+
+    def start(self, interval: Optional[float] = None) -> None:
+        # Keep the index warm so lookups never pay for a scan
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval or self.ttl / 2,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_process_index() -> ProcessIndex:
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = ProcessIndex()
+        return _default_index
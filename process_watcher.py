@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psutil
+
+from process_index import ProcessIndex, get_process_index
+from reconcile import POLICY_PREFIX, PolicyReconciler, QosPolicy, app_policies
+from shell_session import ShellError
+
+logger = logging.getLogger(__name__)
+
+# Process start/exit: ("start" | "exit", pid, name, exe, launch wall time)
+ProcessEvent = Tuple[str, int, Optional[str], Optional[str], float]
+
+# Linux process events connector (linux/connector.h, linux/cn_proc.h)
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+PROC_CN_MCAST_LISTEN = 1
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_EXIT = 0x80000000
+NLMSG_HDR = struct.Struct("=LHHLL")
+CN_MSG = struct.Struct("=IIIIHH")
+PROC_EVENT_HDR = struct.Struct("=IIQ")
+PROC_EVENT_IDS = struct.Struct("=ii")
+NLMSG_DONE = 3
+
+
+class ProcessEventSource:
+    def poll(self, timeout: float) -> List[ProcessEvent]:
+        """Block for at most timeout seconds and return the events seen."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PollingProcessSource(ProcessEventSource):
+    """Start/exit events from diffing the shared ProcessIndex PID set."""
+
+    def __init__(self, index: Optional[ProcessIndex] = None, interval: float = 0.5):
+        self.index = index or get_process_index()
+        self.interval = interval
+
+    def poll(self, timeout: float) -> List[ProcessEvent]:
+        time.sleep(max(0.0, min(timeout, self.interval)))
+        started, exited = self.index.refresh()
+        events = []
+        for pid, name, exe in started:
+            events.append(("start", pid, name, exe, _create_time(pid)))
+        for pid, name in exited:
+            events.append(("exit", pid, name, None, 0.0))
+        return events
+
+
+class NetlinkProcessSource(ProcessEventSource):
+    """Exec/exit notifications pushed by the kernel proc connector (needs CAP_NET_ADMIN)."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        self.sock.bind((0, CN_IDX_PROC))
+        payload = struct.pack("=I", PROC_CN_MCAST_LISTEN)
+        msg = CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+        self.sock.send(NLMSG_HDR.pack(NLMSG_HDR.size + len(msg), NLMSG_DONE, 0, 0, 0) + msg)
+
+    def poll(self, timeout: float) -> List[ProcessEvent]:
+        events = []
+        self.sock.settimeout(max(timeout, 0.001))
+        while True:
+            try:
+                data = self.sock.recv(4096)
+            except (socket.timeout, BlockingIOError):
+                return events
+            self._parse(data, events)
+            # Drain whatever else is already queued without waiting again
+            self.sock.settimeout(0)
+
+    def _parse(self, data: bytes, events: List[ProcessEvent]) -> None:
+        offset = NLMSG_HDR.size + CN_MSG.size
+        if len(data) < offset + PROC_EVENT_HDR.size + PROC_EVENT_IDS.size:
+            return
+        what = PROC_EVENT_HDR.unpack_from(data, offset)[0]
+        pid, tgid = PROC_EVENT_IDS.unpack_from(data, offset + PROC_EVENT_HDR.size)
+        if pid != tgid:
+            return  # thread, not a process
+        if what == PROC_EVENT_EXEC:
+            try:
+                proc = psutil.Process(pid)
+                with proc.oneshot():
+                    name = proc.name().lower()
+                    exe = proc.exe() or None
+                    created = proc.create_time()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                return
+            events.append(("start", pid, name, exe, created))
+        elif what == PROC_EVENT_EXIT:
+            # The name is gone with the process; the watcher knows which PIDs it tracks
+            events.append(("exit", pid, None, None, 0.0))
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+def _create_time(pid: int) -> float:
+    try:
+        return psutil.Process(pid).create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        return time.time()
+
+
+def default_source() -> ProcessEventSource:
+    try:
+        return NetlinkProcessSource()
+    except (AttributeError, OSError) as e:
+        logger.info(f"Process connector unavailable ({e}), polling for process changes")
+        return PollingProcessSource()
+
+
+class ProcessWatcher:
+    """Keeps Auto_<app> policies in step with which priority apps are running.
+
+    A launch only takes effect once the process has lived for debounce
+    seconds, and a policy is only removed once the last instance has been
+    gone for the same time, so short-lived helpers cause no churn.
+    """
+
+    def __init__(self, priority_apps: Dict[str, int], source: Optional[ProcessEventSource] = None,
+                 reconciler: Optional[PolicyReconciler] = None, debounce: float = 2.0,
+                 extra_policies: Optional[Dict[str, QosPolicy]] = None,
+                 extra_prefixes: Tuple[str, ...] = (), index: Optional[ProcessIndex] = None):
+        self.index = index or get_process_index()
+        self.priority_apps = {name.lower(): dscp for name, dscp in priority_apps.items()}
+        self.source = source or default_source()
+        self.reconciler = reconciler or PolicyReconciler()
+        self.debounce = debounce
+        self.extra_policies = extra_policies or {}
+        self.prefixes = tuple(f"{POLICY_PREFIX}{name}" for name in self.priority_apps) + extra_prefixes
+        self.pending: Dict[int, Tuple[str, Optional[str], float, float]] = {}
+        self.running: Dict[str, Dict[int, Optional[str]]] = {}
+        self.exiting: Dict[str, float] = {}
+        self.applied = set()
+        self._pid_names: Dict[int, str] = {}
+        self.latencies: List[Tuple[str, float]] = []
+        self._dirty = True
+        self._update: Optional[Tuple[Dict[str, int], Optional[Dict[str, QosPolicy]]]] = None
+        self._stop = threading.Event()
+
+    def handle(self, event: ProcessEvent, now: float) -> None:
+        kind, pid, name, exe, launched = event
+        if kind == "start":
+            if name not in self.priority_apps:
+                return
+            self._pid_names[pid] = name
+            # Due once the process is debounce seconds old, measured from its real launch
+            due = now + max(0.0, self.debounce - (time.time() - launched))
+            self.pending[pid] = (name, exe, due, launched)
+            self.exiting.pop(name, None)
+            return
+        name = self._pid_names.pop(pid, None)
+        if name is None:
+            return
+        if self.pending.pop(pid, None) is not None:
+            # The instance's start cancelled the exit timer; re-arm it if it was the last one
+            if (name in self.applied and name not in self.running
+                    and not any(entry[0] == name for entry in self.pending.values())):
+                self.exiting[name] = now + self.debounce
+        else:
+            instances = self.running.get(name)
+            if instances is not None:
+                instances.pop(pid, None)
+                if not instances:
+                    del self.running[name]
+                    self.exiting[name] = now + self.debounce
+
+    def _promote(self, now: float) -> List[Tuple[str, float]]:
+        launched_apps = []
+        for pid, (name, exe, due, launched) in list(self.pending.items()):
+            if due <= now:
+                del self.pending[pid]
+                self.running.setdefault(name, {})[pid] = exe
+                if name not in self.applied:
+                    launched_apps.append((name, launched))
+                    self._dirty = True
+        for name, due in list(self.exiting.items()):
+            if due <= now:
+                del self.exiting[name]
+                self._dirty = True
+        return launched_apps
+
+    def desired(self) -> Dict[str, QosPolicy]:
+        paths = {}
+        for name, instances in self.running.items():
+            paths[name] = next((exe for exe in instances.values() if exe), name)
+        desired = app_policies({name: self.priority_apps[name] for name in paths}, paths)
+        desired.update(self.extra_policies)
+        return desired
+
+    def update(self, priority_apps: Dict[str, int],
+               extra_policies: Optional[Dict[str, QosPolicy]] = None) -> None:
+        """Swap in a new app -> DSCP list (and extra policies) from any thread.
+
+        The watcher thread applies it before its next sync: only apps that
+        were added, removed or changed DSCP are touched, and running apps
+        new to the list are picked up without a full re-seed.
+        """
+        self._update = ({name.lower(): dscp for name, dscp in priority_apps.items()}, extra_policies)
+
+    def _apply_update(self, now: float) -> None:
+        (apps, extra), self._update = self._update, None
+        added = [name for name in apps if name not in self.priority_apps]
+        removed = {name for name in self.priority_apps if name not in apps}
+        changed = any(apps[name] != dscp for name, dscp in self.priority_apps.items() if name in apps)
+        for name in removed:
+            self.running.pop(name, None)
+            self.exiting.pop(name, None)
+        self.pending = {pid: entry for pid, entry in self.pending.items() if entry[0] not in removed}
+        self._pid_names = {pid: name for pid, name in self._pid_names.items() if name not in removed}
+        self.priority_apps = apps
+        # Removed apps keep their prefix, so the next sync deletes their policies
+        self.prefixes += tuple(f"{POLICY_PREFIX}{name}" for name in added)
+        if extra is not None and extra != self.extra_policies:
+            self.extra_policies = extra
+            changed = True
+        if added:
+            # A polling source diffs this same index, so the starts and exits this
+            # refresh consumes are handled here rather than lost to the source
+            started, exited = self.index.refresh()
+            for pid, name, exe in started:
+                if pid not in self._pid_names:
+                    self.handle(("start", pid, name, exe, _create_time(pid)), now)
+            for pid, name in exited:
+                self.handle(("exit", pid, name, None, 0.0), now)
+            for name in added:
+                for pid, exe in self.index.lookup(name).items():
+                    if pid not in self._pid_names:
+                        self.handle(("start", pid, name, exe, 0.0), now)
+        if removed or changed:
+            self._dirty = True
+        logger.info(f"Priority apps updated: {len(added)} added, {len(removed)} removed")
+
+    def sync(self, now: float) -> None:
+        if self._update is not None:
+            self._apply_update(now)
+        launched_apps = self._promote(now)
+        if not self._dirty:
+            return
+        try:
+            self.reconciler.reconcile(self.desired(), prefixes=self.prefixes)
+        except ShellError as e:
+            logger.error(f"Failed to update QoS policies: {e}")
+            return
+        self._dirty = False
+        self.applied = set(self.running)
+        done = time.time()
+        for name, launched in launched_apps:
+            if not launched:
+                continue  # already running when the watcher started
+            latency = done - launched
+            self.latencies.append((name, latency))
+            logger.info(f"QoS policy for {name} in effect {latency:.2f}s after launch")
+
+    def _next_timeout(self, now: float, poll_interval: float) -> float:
+        deadlines = [due for _, _, due, _ in self.pending.values()] + list(self.exiting.values())
+        if not deadlines:
+            return poll_interval
+        return max(0.0, min(poll_interval, min(deadlines) - now))
+
+    def seed(self) -> None:
+        # Apps already running when the watcher starts are due immediately
+        self.index.refresh()
+        now = time.monotonic()
+        for name in self.priority_apps:
+            for pid, exe in self.index.lookup(name).items():
+                self.handle(("start", pid, name, exe, 0.0), now)
+
+    def run(self, duration: Optional[float] = None, poll_interval: float = 1.0) -> None:
+        end = time.monotonic() + duration if duration is not None else None
+        self.seed()
+        try:
+            while not self._stop.is_set() and (end is None or time.monotonic() < end):
+                for event in self.source.poll(self._next_timeout(time.monotonic(), poll_interval)):
+                    self.handle(event, time.monotonic())
+                self.sync(time.monotonic())
+        finally:
+            self.source.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def latency_summary(self) -> str:
+        if not self.latencies:
+            return "No launches handled"
+        values = sorted(latency for _, latency in self.latencies)
+        return (
+            f"{len(values)} launches, launch-to-policy median {values[len(values) // 2]:.2f}s, "
+            f"max {values[-1]:.2f}s"
+        )
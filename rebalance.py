@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import logging
+import math
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import TIER_TO_DSCP, load_config
+from linux_enforce import parse_rate_kbit
+from metrics import get_registry, read_sample_logs
+from timeseries import CounterRate
+
+logger = logging.getLogger(__name__)
+
+
+class TierBounds:
+    __slots__ = ("name", "base_kbit", "min_kbit", "max_kbit")
+
+    def __init__(self, name: str, base_kbit: float, min_kbit: float, max_kbit: float):
+        self.name = name
+        self.base_kbit = base_kbit
+        self.min_kbit = min_kbit
+        self.max_kbit = max_kbit
+
+
+def tier_bounds(priority_levels: List[Dict], link_kbit: int) -> List[TierBounds]:
+    """Per-tier share limits from priority.json.
+
+    A level may set min_percent and max_percent next to bandwidth_percent;
+    by default a tier can shrink to half its configured share and grow to
+    the whole link.
+    """
+    bounds = []
+    for level in priority_levels:
+        if "dscp" not in level and level["name"] not in TIER_TO_DSCP:
+            continue
+        base = float(level.get("bandwidth_percent", 0))
+        low = float(level.get("min_percent", base / 2))
+        high = float(level.get("max_percent", 100))
+        if not 0 <= low <= high <= 100:
+            raise ValueError(f"{level['name']}: need 0 <= min_percent <= max_percent <= 100")
+        bounds.append(TierBounds(level["name"], link_kbit * base / 100,
+                                 link_kbit * low / 100, link_kbit * high / 100))
+    if sum(b.min_kbit for b in bounds) > link_kbit:
+        raise ValueError("Tier minimums add up to more than the link")
+    return bounds
+
+
+def _water_fill(floor: Dict[str, float], cap: Dict[str, float], weights: Dict[str, float],
+                budget: float) -> Dict[str, float]:
+    # Raise every tier from its floor towards its cap in proportion to its
+    # weight until the budget is spent or every tier is capped
+    alloc = dict(floor)
+    budget -= sum(alloc.values())
+    active = {name for name in alloc if cap[name] - alloc[name] > 1e-6}
+    while budget > 1e-6 and active:
+        total = sum(weights[name] for name in active)
+        spent = 0.0
+        for name in list(active):
+            give = min(budget * weights[name] / total, cap[name] - alloc[name])
+            alloc[name] += give
+            spent += give
+            if cap[name] - alloc[name] <= 1e-6:
+                active.discard(name)
+        budget -= spent
+    return alloc
+
+
+class RebalanceController:
+    """Moves tier guarantees towards measured demand within min/max bounds.
+
+    Demand is the peak-held, slowly decaying rate plus headroom; a tier using most of its
+    guarantee is treated as saturated and asks for `growth` times more,
+    until its use drops below saturate_off (the gap to saturate_on keeps it
+    from flapping). Under contention demand is met in priority.json order,
+    never taking a tier below its minimum; capacity nobody asked for is
+    lent out by configured bandwidth_percent, so the guarantees always
+    cover the whole link.
+
+    Changes are applied at most every min_interval seconds, move a tier by
+    at most max_step_percent of the link per apply, and are skipped when no
+    tier would move by deadband_percent or more. The exception is a
+    saturated tier below its configured share: it reclaims the share on
+    the next sample, taking it back from the tiers that borrowed it.
+    """
+
+    def __init__(self, priority_levels: List[Dict], link_kbit: int,
+                 apply: Optional[Callable[[Dict[str, int]], None]] = None,
+                 smoothing: float = 5.0, headroom: float = 1.25, growth: float = 1.5,
+                 saturate_on: float = 0.95, saturate_off: float = 0.8,
+                 deadband_percent: float = 5.0, max_step_percent: float = 10.0, min_interval: float = 10.0):
+        self.link_kbit = link_kbit
+        self.apply = apply
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.growth = growth
+        self.saturate_on = saturate_on
+        self.saturate_off = saturate_off
+        self.deadband_kbit = link_kbit * deadband_percent / 100
+        self.max_step_kbit = link_kbit * max_step_percent / 100
+        self.min_interval = min_interval
+        self.bounds: Dict[str, TierBounds] = {}
+        self.allocation: Dict[str, int] = {}
+        self.usage: Dict[str, float] = {}
+        self.saturated: Dict[str, bool] = {}
+        self.set_levels(priority_levels)
+        self.applies = 0
+        self.changes = 0
+        self._last_t = None
+        self._last_apply = None
+        self.metrics = get_registry()
+        self.metrics.describe("qos_tier_guarantee_kbit", "gauge", "Guaranteed rate currently set per tier")
+
+    def set_levels(self, priority_levels: List[Dict]) -> None:
+        """Take new tiers, e.g. after priority.json was reloaded and the HTB tree re-applied.
+
+        Guarantees restart from the configured shares, which is what a
+        freshly applied tree holds; measured use carries over for tiers
+        that still exist.
+        """
+        self.bounds = {b.name: b for b in tier_bounds(priority_levels, self.link_kbit)}
+        self.allocation = {name: int(b.base_kbit) for name, b in self.bounds.items()}
+        self.usage = {name: self.usage.get(name, 0.0) for name in self.bounds}
+        self.saturated = {name: False for name in self.bounds}
+
+    def observe(self, t: float, rates: Dict[str, float]) -> None:
+        """Feed per-tier rates in bytes per second measured at monotonic time t."""
+        dt = t - self._last_t if self._last_t is not None else None
+        alpha = 1.0 - math.exp(-dt / self.smoothing) if dt and dt > 0 else 1.0
+        self._last_t = t
+        for name in self.bounds:
+            kbit = rates.get(name, 0.0) * 8 / 1000
+            # Rises are taken at once so a burst is seen on its first sample;
+            # falls decay with the smoothing time constant
+            if kbit >= self.usage[name]:
+                self.usage[name] = kbit
+            else:
+                self.usage[name] += alpha * (kbit - self.usage[name])
+            used = self.usage[name] / max(self.allocation[name], 1)
+            if self.saturated[name]:
+                self.saturated[name] = used >= self.saturate_off
+            else:
+                self.saturated[name] = used >= self.saturate_on
+
+    def target(self) -> Dict[str, float]:
+        """Guarantees the controller is steering towards, before rate limiting."""
+        weights = {name: b.base_kbit or 1.0 for name, b in self.bounds.items()}
+        floor = {name: b.min_kbit for name, b in self.bounds.items()}
+        ceiling = {name: b.max_kbit for name, b in self.bounds.items()}
+        want = {}
+        for name, b in self.bounds.items():
+            demand = self.usage[name] * self.headroom
+            if self.saturated[name]:
+                demand = max(demand, self.allocation[name] * self.growth, b.base_kbit)
+            want[name] = min(max(demand, b.min_kbit), b.max_kbit)
+        # Demand is met in priority order above every tier's minimum...
+        alloc = dict(floor)
+        spare = self.link_kbit - sum(floor.values())
+        for name in self.bounds:
+            extra = min(max(want[name] - alloc[name], 0.0), spare)
+            alloc[name] += extra
+            spare -= extra
+        # ...and capacity nobody is using is lent out by configured share
+        return _water_fill(alloc, ceiling, weights, self.link_kbit)
+
+    def step(self, t: float, rates: Dict[str, float]) -> Dict[str, int]:
+        """Observe one sample and apply a new allocation if one is due; returns the changed tiers."""
+        self.observe(t, rates)
+        reclaim = any(self.saturated[name] and self.allocation[name] < b.base_kbit
+                      for name, b in self.bounds.items())
+        if not reclaim and self._last_apply is not None and t - self._last_apply < self.min_interval:
+            return {}
+        target = self.target()
+        if reclaim:
+            # A busy tier gets back what it lent at once, not one step per interval
+            proposed = target
+        else:
+            proposed = {
+                name: current + min(max(target[name] - current, -self.max_step_kbit), self.max_step_kbit)
+                for name, current in self.allocation.items()
+            }
+        # Limited decreases can leave too little room for the increases; trim them to fit the link
+        excess = sum(proposed.values()) - self.link_kbit
+        if excess > 0:
+            raised = {name: proposed[name] - self.allocation[name] for name in proposed
+                      if proposed[name] > self.allocation[name]}
+            total = sum(raised.values())
+            for name, delta in raised.items():
+                proposed[name] -= excess * delta / total
+        if max(abs(proposed[name] - self.allocation[name]) for name in proposed) < self.deadband_kbit:
+            return {}
+        changes = {name: int(value) for name, value in proposed.items() if int(value) != self.allocation[name]}
+        if not changes:
+            return {}
+        if self.apply is not None:
+            try:
+                self.apply(changes)
+            except (OSError, RuntimeError) as e:
+                logger.error(f"Failed to apply rebalanced rates: {e}")
+                return {}
+        self.allocation.update(changes)
+        self._last_apply = t
+        self.applies += 1
+        self.changes += len(changes)
+        for name, kbit in self.allocation.items():
+            self.metrics.set("qos_tier_guarantee_kbit", kbit, tier=name)
+        logger.info("Rebalanced: " + ", ".join(f"{name} {kbit}kbit" for name, kbit in changes.items()))
+        return changes
+
+
+# --- Offline simulation -----------------------------------------------------
+
+def load_trace(path: str, cumulative: bool = True) -> Iterator[Tuple[float, Dict[str, float]]]:
+    """(time, tier -> bytes per second) from a monitor sample log or a JSON-lines trace.
+
+    JSON-lines traces hold one {"t": seconds, "rates": {tier: bytes/s}} per
+    line. Sample logs hold the tier byte counters the monitor wrote with
+    --sample-log; pass cumulative=False for backends that report per-sample
+    values instead of counters.
+    """
+    with open(path, "rb") as f:
+        is_json = f.read(1) == b"{"
+    if is_json:
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["t"], record["rates"]
+        return
+
+    counters: Dict[str, CounterRate] = {}
+    current_t = None
+    rates: Dict[str, float] = {}
+    # The monitor writes every record of one sample with the same timestamp
+    for t, key, value in read_sample_logs(path):
+        kind, _, rest = key.partition("/")
+        tier, _, field = rest.rpartition("/")
+        if kind != "tier" or field != "bytes":
+            continue
+        if t != current_t:
+            if rates:
+                yield current_t, rates
+            current_t, rates = t, {}
+        if cumulative:
+            rate = counters.setdefault(tier, CounterRate()).update(t, value)
+            if rate is not None:
+                rates[tier] = rate
+        else:
+            rates[tier] = value
+    if rates:
+        yield current_t, rates
+
+
+def serve_link(offered_kbit: Dict[str, float], guarantees_kbit: Dict[str, float], link_kbit: float,
+               order: List[str]) -> Dict[str, float]:
+    """What an HTB tree with ceil = link delivers: guarantees first, then spare capacity by priority."""
+    served = {name: min(offered_kbit.get(name, 0.0), guarantees_kbit.get(name, 0.0)) for name in order}
+    spare = link_kbit - sum(served.values())
+    for name in order:
+        if spare <= 0:
+            break
+        extra = min(offered_kbit.get(name, 0.0) - served[name], spare)
+        served[name] += extra
+        spare -= extra
+    return served
+
+
+def simulate(trace, priority_levels: List[Dict], link_kbit: int, **controller_options) -> Dict:
+    """Replay a trace as offered load against static and adaptive guarantees."""
+    controller = RebalanceController(priority_levels, link_kbit, **controller_options)
+    order = list(controller.bounds)
+    static = dict(controller.allocation)
+    totals = {name: {"offered": 0.0, "static": 0.0, "adaptive": 0.0} for name in order}
+    prev_t = None
+    for t, rates in trace:
+        dt = t - prev_t if prev_t is not None else 0.0
+        prev_t = t
+        offered = {name: rates.get(name, 0.0) * 8 / 1000 for name in order}
+        served_static = serve_link(offered, static, link_kbit, order)
+        served = serve_link(offered, controller.allocation, link_kbit, order)
+        for name in order:
+            totals[name]["offered"] += offered[name] * dt
+            totals[name]["static"] += served_static[name] * dt
+            totals[name]["adaptive"] += served[name] * dt
+        # The controller sees what the link delivered, as the monitor would
+        controller.step(t, {name: kbit * 1000 / 8 for name, kbit in served.items()})
+    return {"tiers": totals, "applies": controller.applies, "changes": controller.changes,
+            "allocation": dict(controller.allocation)}
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Replay a recorded trace through the bandwidth rebalancer")
+    parser.add_argument("trace", help="Monitor sample log or JSON-lines trace")
+    parser.add_argument("--rate", default="100mbit", help="Link rate, e.g. 100mbit")
+    parser.add_argument("--priority-file", default="priority.json")
+    parser.add_argument("--gauge", action="store_true", help="Sample log values are per-sample, not counters")
+    parser.add_argument("--smoothing", type=float, default=5.0)
+    parser.add_argument("--headroom", type=float, default=1.25)
+    parser.add_argument("--deadband", type=float, default=5.0, help="Percent of link")
+    parser.add_argument("--max-step", type=float, default=10.0, help="Percent of link per apply")
+    parser.add_argument("--min-interval", type=float, default=10.0)
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every rebalance")
+    args = parser.parse_args()
+    if args.verbose:
+        logger.setLevel(logging.INFO)
+
+    levels = load_config(args.priority_file).priority_levels()
+    report = simulate(load_trace(args.trace, cumulative=not args.gauge), levels, parse_rate_kbit(args.rate),
+                      smoothing=args.smoothing, headroom=args.headroom, deadband_percent=args.deadband,
+                      max_step_percent=args.max_step, min_interval=args.min_interval)
+    print(f"{'Tier':<12} {'Offered MB':>12} {'Static MB':>12} {'Adaptive MB':>12}")
+    for name, total in report["tiers"].items():
+        print(f"{name:<12} {total['offered'] / 8000:12.1f} {total['static'] / 8000:12.1f} "
+              f"{total['adaptive'] / 8000:12.1f}")
+    print(f"\n{report['applies']} applies changing {report['changes']} classes; final guarantees: "
+          + ", ".join(f"{name} {kbit}kbit" for name, kbit in report["allocation"].items()))
+
+
+if __name__ == "__main__":
+    main()
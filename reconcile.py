@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import TIER_TO_DSCP, load_config
+from shell_session import SessionPool, ShellError, get_pool
+
+logger = logging.getLogger(__name__)
+
+POLICY_PREFIX = "Auto_"
+PORT_POLICY_PREFIX = "Auto_port_"
+
+
+@dataclass(frozen=True)
+class QosPolicy:
+    name: str
+    dscp: int
+    app_path: Optional[str] = None
+    protocol: str = "Both"
+    port_start: Optional[int] = None
+    port_end: Optional[int] = None
+
+
+@dataclass
+class PolicyPlan:
+    creates: List[QosPolicy] = field(default_factory=list)
+    updates: List[QosPolicy] = field(default_factory=list)
+    deletes: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.creates or self.updates or self.deletes)
+
+    def summary(self) -> str:
+        return f"{len(self.creates)} to create, {len(self.updates)} to update, {len(self.deletes)} to delete"
+
+
+def _policy_name_part(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9.]+", "_", text).strip("_")
+
+
+def app_policies(app_dscp: Dict[str, int], app_paths: Optional[Dict[str, str]] = None) -> Dict[str, QosPolicy]:
+    # Without a resolved path the exe name is used, which Windows matches by file name
+    app_paths = app_paths or {}
+    policies = {}
+    for app, dscp in app_dscp.items():
+        name = f"{POLICY_PREFIX}{app}"
+        policies[name] = QosPolicy(name=name, dscp=dscp, app_path=app_paths.get(app, app))
+    return policies
+
+
+def tier_port_policies(priority_levels: List[Dict]) -> Dict[str, QosPolicy]:
+    policies = {}
+    for level in priority_levels:
+        tier = level["name"]
+        dscp = level.get("dscp", TIER_TO_DSCP.get(tier))
+        if dscp is None:
+            logger.warning(f"No DSCP value for tier {tier}, skipping its port rules")
+            continue
+        for app in level.get("applications", []):
+            for rule in app.get("ports", []):
+                protocol = rule.get("protocol", "both").upper()
+                start, end = int(rule["start"]), int(rule.get("end", rule["start"]))
+                name = (
+                    f"{PORT_POLICY_PREFIX}{_policy_name_part(tier)}_{_policy_name_part(app['name'])}_"
+                    f"{protocol.lower()}{start}-{end}"
+                )
+                policies[name] = QosPolicy(
+                    name=name, dscp=dscp,
+                    protocol="Both" if protocol == "BOTH" else protocol,
+                    port_start=start, port_end=end
+                )
+    return policies
+
+
+def load_tier_policies(priority_file: str = "priority.json") -> Dict[str, QosPolicy]:
+    return tier_port_policies(load_config(priority_file).priority_levels())
+
+
+def diff_policies(desired: Dict[str, QosPolicy], current: Dict[str, QosPolicy],
+                  prefixes: Tuple[str, ...] = (POLICY_PREFIX,)) -> PolicyPlan:
+    plan = PolicyPlan()
+    for name, policy in sorted(desired.items()):
+        existing = current.get(name)
+        if existing is None:
+            plan.creates.append(policy)
+        elif existing != policy:
+            plan.updates.append(policy)
+    # Only policies inside the managed prefixes are ever deleted
+    plan.deletes = sorted(
+        name for name in current
+        if name not in desired and name.startswith(prefixes)
+    )
+    return plan
+
+
+class PolicyStore:
+    def list_policies(self) -> Dict[str, QosPolicy]:
+        raise NotImplementedError
+
+    def apply(self, plan: PolicyPlan) -> List[str]:
+        """Apply the whole plan and return one message per failed operation."""
+        raise NotImplementedError
+
+
+class InMemoryPolicyStore(PolicyStore):
+    def __init__(self, policies: Optional[Iterable[QosPolicy]] = None):
+        self.policies = {p.name: p for p in policies or ()}
+        self.apply_calls = 0
+
+    def list_policies(self) -> Dict[str, QosPolicy]:
+        return dict(self.policies)
+
+    def apply(self, plan: PolicyPlan) -> List[str]:
+        self.apply_calls += 1
+        for name in plan.deletes:
+            self.policies.pop(name, None)
+        for policy in plan.creates + plan.updates:
+            self.policies[policy.name] = policy
+        return []
+
+
+def _ps_quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class PowerShellPolicyStore(PolicyStore):
+    """NetQos policies read with one Get-NetQosPolicy and changed with one script."""
+
+    def __init__(self, pool: Optional[SessionPool] = None, prefix: str = POLICY_PREFIX,
+                 timeout: float = 120.0):
+        self.pool = pool or get_pool()
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def list_policies(self) -> Dict[str, QosPolicy]:
+        ps_command = (
+            f"@(Get-NetQosPolicy | Where-Object {{ $_.Name -like {_ps_quote(self.prefix + '*')} }} | "
+            "Select-Object Name, DSCPAction, AppPathNameMatchCondition, "
+            "@{Name='Protocol';Expression={\"$($_.IPProtocolMatchCondition)\"}}, "
+            "IPDstPortStartMatchCondition, IPDstPortEndMatchCondition) | ConvertTo-Json -Compress"
+        )
+        output = self.pool.run(ps_command, timeout=self.timeout).strip()
+        return self._parse_policies(output)
+
+    def _parse_policies(self, output: str) -> Dict[str, QosPolicy]:
+        if not output:
+            return {}
+        data = json.loads(output)
+        if isinstance(data, dict):
+            data = [data]
+        policies = {}
+        for entry in data:
+            start = entry.get("IPDstPortStartMatchCondition") or None
+            end = entry.get("IPDstPortEndMatchCondition") or None
+            protocol = entry.get("Protocol") or "Both"
+            policies[entry["Name"]] = QosPolicy(
+                name=entry["Name"],
+                dscp=int(entry.get("DSCPAction", 0)),
+                app_path=entry.get("AppPathNameMatchCondition") or None,
+                protocol="Both" if protocol in ("None", "Both") else protocol.upper(),
+                port_start=start,
+                port_end=end
+            )
+        return policies
+
+    def _new_policy_command(self, policy: QosPolicy) -> str:
+        command = f"New-NetQosPolicy -Name {_ps_quote(policy.name)}"
+        if policy.app_path:
+            command += f" -AppPathNameMatchCondition {_ps_quote(policy.app_path)}"
+        if policy.port_start is not None:
+            command += (
+                f" -IPDstPortStartMatchCondition {policy.port_start}"
+                f" -IPDstPortEndMatchCondition {policy.port_end}"
+            )
+        return command + f" -IPProtocolMatchCondition {policy.protocol} -DSCPAction {policy.dscp} | Out-Null"
+
+    def build_script(self, plan: PolicyPlan) -> str:
+        steps = []
+        for name in plan.deletes + [p.name for p in plan.updates]:
+            steps.append((name, f"Remove-NetQosPolicy -Name {_ps_quote(name)} -Confirm:$false"))
+        for policy in plan.updates + plan.creates:
+            steps.append((policy.name, self._new_policy_command(policy)))
+        # Each step fails on its own so one bad policy does not abort the batch
+        lines = ["$errors = @()"]
+        for name, command in steps:
+            lines.append(
+                f"try {{ {command} }} catch {{ "
+                f"$errors += ({_ps_quote(name)} + ': ' + $_.Exception.Message) }}"
+            )
+        lines.append("ConvertTo-Json -InputObject @($errors) -Compress")
+        return "; ".join(lines)
+
+    def apply(self, plan: PolicyPlan) -> List[str]:
+        output = self.pool.run(self.build_script(plan), timeout=self.timeout).strip()
+        return json.loads(output) if output else []
+
+
+class PolicyReconciler:
+    def __init__(self, store: Optional[PolicyStore] = None):
+        self.store = store or PowerShellPolicyStore()
+
+    def plan(self, desired: Dict[str, QosPolicy],
+             prefixes: Tuple[str, ...] = (POLICY_PREFIX,)) -> PolicyPlan:
+        return diff_policies(desired, self.store.list_policies(), prefixes)
+
+    def apply(self, plan: PolicyPlan) -> PolicyPlan:
+        errors = self.store.apply(plan)
+        for error in errors:
+            logger.error(f"Failed to apply QoS policy change: {error}")
+        if errors:
+            raise ShellError(f"{len(errors)} policy changes failed")
+        return plan
+
+    def reconcile(self, desired: Dict[str, QosPolicy], prefixes: Tuple[str, ...] = (POLICY_PREFIX,),
+                  dry_run: bool = False) -> PolicyPlan:
+        plan = self.plan(desired, prefixes)
+        if not plan:
+            logger.info("QoS policies already up to date")
+            return plan
+        logger.info(f"QoS policy plan: {plan.summary()}")
+        if dry_run:
+            return plan
+        return self.apply(plan)
+
+
+def print_plan(plan: PolicyPlan) -> None:
+    for policy in plan.creates:
+        print(f"Create {policy.name} (DSCP {policy.dscp})")
+    for policy in plan.updates:
+        print(f"Update {policy.name} (DSCP {policy.dscp})")
+    for name in plan.deletes:
+        print(f"Remove {name}")
+    print(plan.summary())
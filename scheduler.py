@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+from metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+
+class Sample:
+    __slots__ = ("target", "tick", "qos_stats", "qos_time", "interface_stats", "interface_time", "wall_time")
+
+    def __init__(self, target, tick: int):
+        self.target = target
+        self.tick = tick
+        self.qos_stats = {}
+        self.qos_time = 0.0
+        self.interface_stats = {}
+        self.interface_time = 0.0
+        self.wall_time = time.time()
+
+
+async def _timed_call(func: Callable) -> tuple:
+    # Stamp a reading at the midpoint of the call, the best estimate of when
+    # the counters were actually read
+    start = time.monotonic()
+    result = await asyncio.to_thread(func)
+    return result, (start + time.monotonic()) / 2
+
+
+class SampleScheduler:
+    """Samples every target on a fixed monotonic grid inside one event loop.
+
+    A target is anything with get_qos_stats()/get_interface_stats(), such as
+    WindowsTrafficMonitor. Each target runs on its own grid, so a slow host
+    never delays another one. A tick that is already past when the previous
+    collection finishes is skipped and counted rather than run late.
+    """
+
+    def __init__(self, targets: List, interval: float = 1.0,
+                 on_sample: Optional[Callable[[Sample], None]] = None):
+        self.targets = targets
+        self.interval = interval
+        self.on_sample = on_sample
+        self.missed_ticks: Dict[int, int] = {id(t): 0 for t in targets}
+        self.errors: Dict[int, int] = {id(t): 0 for t in targets}
+        self._stopping = None
+        self._loop = None
+        self.metrics = get_registry()
+        self.metrics.describe("qos_sample_errors_total", "counter", "Sampling ticks that raised")
+        self.metrics.describe("qos_missed_ticks_total", "counter", "Sampling ticks skipped because collection ran late")
+
+    async def collect(self, target, tick: int) -> Sample:
+        sample = Sample(target, tick)
+        (qos, qos_t), (iface, iface_t) = await asyncio.gather(
+            _timed_call(target.get_qos_stats),
+            _timed_call(target.get_interface_stats)
+        )
+        sample.qos_stats, sample.qos_time = qos, qos_t
+        sample.interface_stats, sample.interface_time = iface, iface_t
+        return sample
+
+    async def _run_target(self, target, start: float, end: float) -> None:
+        tick = 0
+        while not self._stopping.is_set():
+            deadline = start + tick * self.interval
+            if deadline >= end:
+                return
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                sample = await self.collect(target, tick)
+                if self.on_sample:
+                    self.on_sample(sample)
+            except Exception as e:
+                self.errors[id(target)] += 1
+                self.metrics.inc("qos_sample_errors_total")
+                # A persistent failure would otherwise log every tick; the counter keeps the rest
+                if self.errors[id(target)] == 1:
+                    logger.error(f"Error during monitoring: {e}")
+                else:
+                    logger.debug(f"Error during monitoring: {e}")
+
+            # Next grid point still in the future; everything before it is skipped
+            next_tick = max(tick + 1, math.ceil((time.monotonic() - start) / self.interval))
+            if next_tick > tick + 1:
+                self.missed_ticks[id(target)] += next_tick - tick - 1
+                self.metrics.inc("qos_missed_ticks_total", next_tick - tick - 1)
+            tick = next_tick
+
+    async def run(self, duration: float) -> None:
+        self._stopping = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        await asyncio.gather(*(self._run_target(t, start, start + duration) for t in self.targets))
+        missed = sum(self.missed_ticks.values())
+        if missed:
+            logger.warning(f"Skipped {missed} sampling ticks that could not be collected on time")
+
+    def stop(self) -> None:
+        # Safe to call from any thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Executable used for the warm sessions; override with QOS_SHELL (e.g. "pwsh" on Linux)
+DEFAULT_EXECUTABLE = os.environ.get("QOS_SHELL", "powershell")
+
+# Request/response loop run inside each interpreter. Requests arrive on stdin as one
+# JSON object per line ({"id", "cmd"}) and every result is written back as one JSON
+# line ({"id", "ok", "out"} or {"id", "ok", "err"}), so a response is always one frame.
+# A request with "stream" set gets its output as {"id", "chunk"} frames, one per
+# output line, before a final {"id", "ok"} frame.
+BOOTSTRAP = (
+    "$ErrorActionPreference = 'Stop'; "
+    "[Console]::OutputEncoding = New-Object System.Text.UTF8Encoding $false; "
+    "while ($true) { "
+    "$line = [Console]::In.ReadLine(); "
+    "if ($null -eq $line) { break }; "
+    "$req = $line | ConvertFrom-Json; "
+    "try { "
+    "if ($req.stream) { "
+    "Invoke-Expression $req.cmd | Out-String -Stream | ForEach-Object { "
+    "[Console]::Out.WriteLine((@{ id = $req.id; chunk = $_ } | ConvertTo-Json -Compress)) }; "
+    "$resp = @{ id = $req.id; ok = $true; out = '' } "
+    "} else { "
+    "$out = (Invoke-Expression $req.cmd | Out-String); "
+    "$resp = @{ id = $req.id; ok = $true; out = $out } "
+    "} "
+    "} catch { "
+    "$resp = @{ id = $req.id; ok = $false; err = $_.Exception.Message } "
+    "}; "
+    "[Console]::Out.WriteLine(($resp | ConvertTo-Json -Compress)); "
+    "[Console]::Out.Flush() "
+    "}"
+)
+
+
+class ShellError(Exception):
+    pass
+
+
+class ShellTimeout(ShellError):
+    pass
+
+
+def default_argv(executable: Optional[str] = None) -> List[str]:
+    return [
+        executable or DEFAULT_EXECUTABLE,
+        "-NoLogo", "-NoProfile", "-NonInteractive",
+        "-Command", BOOTSTRAP
+    ]
+
+
+class ShellSession:
+    """One long-lived interpreter process speaking the framed JSON protocol."""
+
+    def __init__(self, argv: Optional[List[str]] = None):
+        self.argv = argv or default_argv()
+        self.proc = None
+        self.last_used = 0.0
+        self._ids = itertools.count(1)
+        self._responses = queue.Queue()
+        self._reader = None
+
+    def start(self) -> None:
+        self.proc = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1
+        )
+        # Each process gets its own queue so a late line from a killed
+        # process can never be mistaken for a response of its successor
+        self._responses = queue.Queue()
+        self._reader = threading.Thread(
+            target=self._read_frames, args=(self.proc.stdout, self._responses), daemon=True
+        )
+        self._reader.start()
+        self.last_used = time.monotonic()
+        logger.debug(f"Started shell session pid {self.proc.pid}: {self.argv[0]}")
+
+    def _read_frames(self, stream, responses: queue.Queue) -> None:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                responses.put(json.loads(line))
+            except json.JSONDecodeError:
+                # Banners or stray host output between frames
+                logger.debug(f"Ignoring unframed shell output: {line[:200]}")
+        responses.put(None)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _send(self, request: dict) -> None:
+        if not self.alive():
+            self.start()
+        try:
+            self.proc.stdin.write(json.dumps(request) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.close()
+            raise ShellError(f"Shell session died: {e}")
+
+    def _next_frame(self, req_id: int, deadline: float, timeout: float, command: str) -> dict:
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                frame = self._responses.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                # A hung interpreter cannot be trusted with the next command
+                self.close()
+                raise ShellTimeout(f"Command timed out after {timeout}s: {command[:80]}")
+            if frame is None:
+                self.close()
+                raise ShellError("Shell session exited unexpectedly")
+            if frame.get("id") == req_id:
+                self.last_used = time.monotonic()
+                return frame
+
+    def execute(self, command: str, timeout: float = 10.0) -> str:
+        req_id = next(self._ids)
+        self._send({"id": req_id, "cmd": command})
+        frame = self._next_frame(req_id, time.monotonic() + timeout, timeout, command)
+        if not frame.get("ok"):
+            raise ShellError(frame.get("err") or "Command failed")
+        return frame.get("out") or ""
+
+    def execute_stream(self, command: str, timeout: float = 10.0) -> Iterator[str]:
+        """Yield the command's output line by line as the interpreter writes it."""
+        req_id = next(self._ids)
+        self._send({"id": req_id, "cmd": command, "stream": True})
+        deadline = time.monotonic() + timeout
+        finished = False
+        try:
+            while True:
+                frame = self._next_frame(req_id, deadline, timeout, command)
+                if "chunk" in frame:
+                    yield (frame["chunk"] or "") + "\n"
+                    continue
+                finished = True
+                if not frame.get("ok"):
+                    raise ShellError(frame.get("err") or "Command failed")
+                return
+        finally:
+            if not finished and self.alive():
+                # The consumer stopped early; the rest of the response must not
+                # be read as the answer to the next command
+                self.close()
+
+    def ping(self, timeout: float = 2.0) -> bool:
+        try:
+            return self.execute("'pong'", timeout=timeout).strip() == "pong"
+        except ShellError:
+            return False
+
+    def restart(self) -> None:
+        self.close()
+        self.start()
+
+    def close(self) -> None:
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        if self.proc.poll() is None:
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Shell session pid {self.proc.pid} did not exit")
+        self.proc = None
+
+
+class SessionPool:
+    """A fixed number of warm sessions handed out one command at a time."""
+
+    def __init__(self, size: int = 2, argv: Optional[List[str]] = None,
+                 executable: Optional[str] = None, command_timeout: float = 10.0,
+                 health_interval: float = 30.0):
+        self.argv = argv or default_argv(executable)
+        self.command_timeout = command_timeout
+        self.health_interval = health_interval
+        self._sessions = [ShellSession(self.argv) for _ in range(size)]
+        self._idle = queue.Queue()
+        for session in self._sessions:
+            self._idle.put(session)
+
+    def _checkout(self) -> ShellSession:
+        session = self._idle.get()
+        try:
+            if not session.alive():
+                session.start()
+            elif time.monotonic() - session.last_used > self.health_interval:
+                if not session.ping():
+                    logger.warning("Shell session failed health check, restarting")
+                    session.restart()
+        except OSError:
+            self._idle.put(session)
+            raise
+        return session
+
+    def run(self, command: str, timeout: Optional[float] = None) -> str:
+        try:
+            session = self._checkout()
+        except OSError as e:
+            raise ShellError(f"Failed to start {self.argv[0]}: {e}")
+        try:
+            return session.execute(command, timeout or self.command_timeout)
+        finally:
+            self._idle.put(session)
+
+    def stream(self, command: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """Like run(), but yields output lines while the command is still producing them."""
+        try:
+            session = self._checkout()
+        except OSError as e:
+            raise ShellError(f"Failed to start {self.argv[0]}: {e}")
+        try:
+            yield from session.execute_stream(command, timeout or self.command_timeout)
+        finally:
+            self._idle.put(session)
+
+    def close(self) -> None:
+        for session in self._sessions:
+            session.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> SessionPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool(size=int(os.environ.get("QOS_SHELL_POOL_SIZE", "2")))
+            atexit.register(_default_pool.close)
+        return _default_pool
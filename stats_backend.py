@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+import errno
+import json
+import logging
+import os
+import platform
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from json_stream import JsonRecordStream
+from linux_enforce import CLASS_MINOR_BASE
+from metrics import get_registry
+from shell_session import SessionPool, ShellError, get_pool
+
+logger = logging.getLogger(__name__)
+
+# rtnetlink constants used for tc class dumps (linux/rtnetlink.h, linux/pkt_sched.h)
+NETLINK_ROUTE = 0
+RTM_NEWTCLASS = 40
+RTM_GETTCLASS = 42
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+TCA_KIND = 1
+TCA_STATS = 3
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+# Errors meaning rtnetlink will never work here; anything else (ENOBUFS, EINTR,
+# a timeout) falls back to tc for a while and then tries netlink again
+NETLINK_UNAVAILABLE = {errno.EPROTONOSUPPORT, errno.EAFNOSUPPORT, errno.EPERM, errno.EACCES, errno.EOPNOTSUPP}
+NETLINK_RETRY_DELAY = 30.0
+
+NLMSG_HDR = struct.Struct("=LHHLL")
+TCMSG = struct.Struct("=BBHiIII")
+RTATTR = struct.Struct("=HH")
+BASIC_STATS = struct.Struct("=QI")
+
+
+class StatsBackend:
+    """Source of the counters WindowsTrafficMonitor samples every tick.
+
+    get_interface_stats() returns {"input_bytes", "output_bytes"} and
+    get_qos_stats() returns {tier: {"bytes"}}; backends may add packet counts.
+    """
+
+    # False when per-tier values are already per-second rates rather than counters
+    qos_cumulative = True
+
+    def __init__(self, dscp_to_tier: Dict[int, str]):
+        self.dscp_to_tier = dscp_to_tier
+
+    def apply_config(self, config) -> None:
+        """Pick up a reloaded config.QosConfig; the base class only needs the tier names."""
+        self.dscp_to_tier = config.dscp_to_tier()
+
+    def detect_interface(self) -> str:
+        raise NotImplementedError
+
+    def get_qos_stats(self, interface: str) -> Dict:
+        raise NotImplementedError
+
+    def get_interface_stats(self, interface: str) -> Dict:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PowerShellBackend(StatsBackend):
+    # Get-Counter returns the cooked Bytes Total/sec value
+    qos_cumulative = False
+
+    def __init__(self, dscp_to_tier: Dict[int, str], pool: Optional[SessionPool] = None):
+        super().__init__(dscp_to_tier)
+        self.pool = pool or get_pool()
+        self.parse_errors = 0
+        get_registry().describe("qos_parse_errors_total", "counter", "QoS policy records that could not be parsed")
+
+    def detect_interface(self) -> str:
+        try:
+            ps_command = (
+                "Get-NetAdapter | Where-Object {$_.Status -eq 'Up'} | "
+                "Select-Object -First 1 Name | ForEach-Object {$_.Name}"
+            )
+            interface = self.pool.run(ps_command).strip()
+            if not interface:
+                logger.warning("No active network interface found. Using default 'Ethernet'.")
+                return "Ethernet"
+            logger.info(f"Detected active interface: {interface}")
+            return interface
+        except ShellError as e:
+            logger.error(f"Failed to detect network interface: {e}")
+            return "Ethernet"
+
+    def get_qos_stats(self, interface: str) -> Dict:
+        try:
+            ps_command = (
+                "Get-NetQosPolicy | Select-Object Name, DSCPValue, "
+                "@{Name='Bytes';Expression={(Get-Counter "
+                "'\\Network Interface(*)\\Bytes Total/sec' -ErrorAction SilentlyContinue).CounterSamples.CookedValue}} "
+                "| ConvertTo-Json"
+            )
+            # Policies are aggregated as their JSON arrives rather than after the whole list
+            return self._parse_qos_stream(self.pool.stream(ps_command))
+        except ShellError as e:
+            logger.error(f"Failed to get QoS stats: {e}")
+            return {}
+
+    def _parse_qos_output(self, output: str) -> Dict:
+        return self._parse_qos_stream([output])
+
+    def _parse_qos_stream(self, chunks: Iterable[str]) -> Dict:
+        stats = {}
+        records = JsonRecordStream(chunks)
+        errors = 0
+        for policy in records:
+            try:
+                dscp = policy.get("DSCPValue")
+                nbytes = int(policy.get("Bytes", 0) or 0)
+            except (AttributeError, TypeError, ValueError):
+                errors += 1
+                continue
+            tier = self.dscp_to_tier.get(dscp, f"DSCP {dscp}")
+            if tier not in stats:
+                stats[tier] = {"bytes": 0}
+            stats[tier]["bytes"] += nbytes
+        errors += records.errors
+        if errors:
+            # Counted rather than logged per tick; the good records still make the sample
+            self.parse_errors += errors
+            get_registry().inc("qos_parse_errors_total", errors)
+            logger.debug(f"Skipped {errors} unparseable QoS policy records")
+        logger.debug(f"Parsed {len(stats)} tiers from {records.records} DSCP mappings")
+        return stats
+
+    def get_interface_stats(self, interface: str) -> Dict:
+        try:
+            ps_command = (
+                f"Get-NetAdapterStatistics -Name \"{interface}\" | "
+                "Select-Object ReceivedBytes, SentBytes | ConvertTo-Json"
+            )
+            return self._parse_interface_output(self.pool.run(ps_command))
+        except ShellError as e:
+            logger.error(f"Failed to get interface stats for {interface}: {e}")
+            return {"input_bytes": 0, "output_bytes": 0}
+
+    def _parse_interface_output(self, output: str) -> Dict:
+        stats = {"input_bytes": 0, "output_bytes": 0}
+        try:
+            data = json.loads(output)
+            stats["input_bytes"] = data.get("ReceivedBytes", 0)
+            stats["output_bytes"] = data.get("SentBytes", 0)
+        except json.JSONDecodeError:
+            logger.error("Failed to parse interface statistics")
+        return stats
+
+
+class LinuxBackend(StatsBackend):
+    """Reads /proc/net/dev and tc class counters without spawning processes.
+
+    Tiers are taken from the HTB class minor number, which carries the DSCP
+    value of the tier past CLASS_MINOR_BASE (class 1:12e holds DSCP 46
+    traffic).
+    """
+
+    def __init__(self, dscp_to_tier: Dict[int, str], proc_net_dev: str = "/proc/net/dev"):
+        super().__init__(dscp_to_tier)
+        self.proc_net_dev = proc_net_dev
+        self._dev_file = None
+        self._nl_sock = None
+        self._nl_seq = 0
+        self._use_netlink = True
+        self._netlink_retry_at = 0.0
+        # Monitors for several interfaces may share one backend across threads
+        self._dev_lock = threading.Lock()
+        self._nl_lock = threading.Lock()
+
+    def detect_interface(self) -> str:
+        # Interface holding the default route, else the first non-loopback device
+        try:
+            with open("/proc/net/route") as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 1 and fields[1] == "00000000":
+                        logger.info(f"Detected active interface: {fields[0]}")
+                        return fields[0]
+        except (OSError, StopIteration):
+            pass
+        for _, name in socket.if_nameindex():
+            if name != "lo":
+                logger.info(f"Detected active interface: {name}")
+                return name
+        logger.warning("No active network interface found. Using default 'lo'.")
+        return "lo"
+
+    def _read_proc_net_dev(self) -> bytes:
+        # One buffered read of a file handle kept open across ticks
+        if self._dev_file is None:
+            self._dev_file = open(self.proc_net_dev, "rb")
+        self._dev_file.seek(0)
+        return self._dev_file.read()
+
+    def get_interface_stats(self, interface: str) -> Dict:
+        stats = {"input_bytes": 0, "output_bytes": 0, "input_packets": 0, "output_packets": 0}
+        try:
+            with self._dev_lock:
+                data = self._read_proc_net_dev()
+        except OSError as e:
+            logger.error(f"Failed to read {self.proc_net_dev}: {e}")
+            self._dev_file = None
+            return stats
+        key = interface.encode() + b":"
+        start = data.find(key)
+        # Names are right-aligned after spaces or a newline; guard against suffix matches
+        while start > 0 and data[start - 1] not in b" \n":
+            start = data.find(key, start + 1)
+        if start < 0:
+            logger.error(f"Interface {interface} not found in {self.proc_net_dev}")
+            return stats
+        end = data.find(b"\n", start)
+        fields = data[start + len(key):end if end >= 0 else None].split()
+        stats["input_bytes"] = int(fields[0])
+        stats["input_packets"] = int(fields[1])
+        stats["output_bytes"] = int(fields[8])
+        stats["output_packets"] = int(fields[9])
+        return stats
+
+    def get_qos_stats(self, interface: str) -> Dict:
+        classes = None
+        if self._use_netlink and time.monotonic() >= self._netlink_retry_at:
+            try:
+                with self._nl_lock:
+                    classes = self._dump_classes_netlink(interface)
+            except OSError as e:
+                self._close_netlink()
+                if e.errno in NETLINK_UNAVAILABLE:
+                    logger.warning(f"rtnetlink class dump unavailable, falling back to tc: {e}")
+                    self._use_netlink = False
+                else:
+                    logger.warning(f"rtnetlink class dump failed, using tc for {NETLINK_RETRY_DELAY:g}s: {e}")
+                    self._netlink_retry_at = time.monotonic() + NETLINK_RETRY_DELAY
+        if classes is None:
+            classes = self._dump_classes_tc(interface)
+
+        stats = {}
+        for handle, (nbytes, packets) in classes.items():
+            tier = self.dscp_to_tier.get((handle & 0xFFFF) - CLASS_MINOR_BASE)
+            if tier is None:
+                continue
+            if tier not in stats:
+                stats[tier] = {"bytes": 0, "packets": 0}
+            stats[tier]["bytes"] += nbytes
+            stats[tier]["packets"] += packets
+        return stats
+
+    def _dump_classes_netlink(self, interface: str) -> Dict[int, tuple]:
+        if self._nl_sock is None:
+            self._nl_sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+            self._nl_sock.bind((0, 0))
+            self._nl_sock.settimeout(1.0)
+        self._nl_seq += 1
+        body = TCMSG.pack(socket.AF_UNSPEC, 0, 0, socket.if_nametoindex(interface), 0, 0, 0)
+        header = NLMSG_HDR.pack(NLMSG_HDR.size + len(body), RTM_GETTCLASS,
+                                NLM_F_REQUEST | NLM_F_DUMP, self._nl_seq, 0)
+        self._nl_sock.send(header + body)
+
+        classes = {}
+        while True:
+            data = self._nl_sock.recv(65536)
+            offset = 0
+            while offset + NLMSG_HDR.size <= len(data):
+                length, msg_type, _, seq, _ = NLMSG_HDR.unpack_from(data, offset)
+                if length < NLMSG_HDR.size:
+                    return classes
+                if seq == self._nl_seq:
+                    if msg_type == NLMSG_DONE:
+                        return classes
+                    if msg_type == NLMSG_ERROR:
+                        err = -struct.unpack_from("=i", data, offset + NLMSG_HDR.size)[0]
+                        if err:
+                            raise OSError(err, os.strerror(err))
+                    elif msg_type == RTM_NEWTCLASS:
+                        self._parse_class_msg(data, offset + NLMSG_HDR.size, offset + length, classes)
+                offset += (length + 3) & ~3
+
+    def _parse_class_msg(self, data: bytes, start: int, end: int, classes: Dict) -> None:
+        handle = TCMSG.unpack_from(data, start)[4]
+        counters = None
+        offset = start + TCMSG.size
+        while offset + RTATTR.size <= end:
+            attr_len, attr_type = RTATTR.unpack_from(data, offset)
+            if attr_len < RTATTR.size:
+                break
+            if attr_type == TCA_STATS2:
+                # Nested gnet_stats attributes; TCA_STATS_BASIC carries bytes/packets
+                inner = offset + RTATTR.size
+                while inner + RTATTR.size <= offset + attr_len:
+                    inner_len, inner_type = RTATTR.unpack_from(data, inner)
+                    if inner_len < RTATTR.size:
+                        break
+                    if inner_type == TCA_STATS_BASIC:
+                        counters = BASIC_STATS.unpack_from(data, inner + RTATTR.size)
+                    inner += (inner_len + 3) & ~3
+            elif attr_type == TCA_STATS and counters is None:
+                counters = BASIC_STATS.unpack_from(data, offset + RTATTR.size)
+            offset += (attr_len + 3) & ~3
+        if counters is not None:
+            classes[handle] = counters
+
+    def _dump_classes_tc(self, interface: str) -> Dict[int, tuple]:
+        try:
+            result = subprocess.run(
+                ["tc", "-s", "-j", "class", "show", "dev", interface],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f"Failed to read tc class statistics for {interface}: {e}")
+            return {}
+        return parse_tc_class_output(result.stdout)
+
+    def _close_netlink(self) -> None:
+        if self._nl_sock is not None:
+            self._nl_sock.close()
+            self._nl_sock = None
+
+    def close(self) -> None:
+        self._close_netlink()
+        if self._dev_file is not None:
+            self._dev_file.close()
+            self._dev_file = None
+
+
+def _parse_handle(text: str) -> int:
+    major, _, minor = text.partition(":")
+    return (int(major or "0", 16) << 16) | int(minor or "0", 16)
+
+
+def parse_tc_class_output(output: str) -> Dict[int, tuple]:
+    # Older iproute2 releases ignore -j for classes, so accept both formats
+    classes = {}
+    if output.lstrip().startswith("["):
+        try:
+            for entry in json.loads(output):
+                classes[_parse_handle(entry["handle"])] = (
+                    int(entry.get("bytes", 0)), int(entry.get("packets", 0))
+                )
+            return classes
+        except (json.JSONDecodeError, KeyError, ValueError):
+            logger.error("Failed to parse tc class statistics")
+            return {}
+
+    handle = None
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 3 and fields[0] == "class":
+            handle = _parse_handle(fields[2])
+        elif handle is not None and fields[:1] == ["Sent"] and len(fields) >= 4:
+            classes[handle] = (int(fields[1]), int(fields[3]))
+            handle = None
+    return classes
+
+
+def backend_supported() -> bool:
+    """Whether default_backend can read statistics here: Windows NetQos, or tc on Linux."""
+    system = platform.system()
+    return system == "Windows" or (system == "Linux" and not os.environ.get("QOS_SHELL"))
+
+
+def default_backend(dscp_to_tier: Dict[int, str], pool: Optional[SessionPool] = None) -> StatsBackend:
+    if platform.system() == "Linux" and not os.environ.get("QOS_SHELL"):
+        return LinuxBackend(dscp_to_tier)
+    return PowerShellBackend(dscp_to_tier, pool)
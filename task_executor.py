@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    """Handle for one unit of background work; workers report through it."""
+
+    def __init__(self, executor: "CommandExecutor", key: str, func: Callable, args: tuple,
+                 on_done: Optional[Callable], on_error: Optional[Callable], on_progress: Optional[Callable]):
+        self.executor = executor
+        self.key = key
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = threading.Event()
+        self.started = False
+        self.rerun = None
+        self.future = None
+
+    def report(self, message: str, fraction: Optional[float] = None) -> None:
+        # Called from the worker thread; delivered on the Tk thread
+        if self.cancelled.is_set():
+            raise TaskCancelled(self.key)
+        self.executor._results.put(("progress", self, (message, fraction)))
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class CommandExecutor:
+    """Runs blocking work on a thread pool and hands results back to Tk.
+
+    Callbacks always run on the Tk thread, drained from a thread-safe queue
+    via root.after. Submitting a key that is still queued replaces its
+    arguments; submitting one that is running queues a single rerun with the
+    latest arguments, so repeated clicks collapse into at most one extra run.
+    """
+
+    def __init__(self, root, max_workers: int = 4, poll_ms: int = 16, max_per_drain: int = 50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.max_per_drain = max_per_drain
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="qos-worker")
+        self._results = queue.Queue()
+        self._tasks: Dict[str, Task] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def submit(self, key: str, func: Callable, *args, on_done: Optional[Callable] = None,
+               on_error: Optional[Callable] = None, on_progress: Optional[Callable] = None) -> Task:
+        """Run func(task, *args) in the background."""
+        task = Task(self, key, func, args, on_done, on_error, on_progress)
+        with self._lock:
+            current = self._tasks.get(key)
+            if current is not None and not current.cancelled.is_set():
+                if not current.started:
+                    current.func, current.args = func, args
+                    current.on_done, current.on_error, current.on_progress = on_done, on_error, on_progress
+                    return current
+                current.rerun = task
+                return task
+            self._tasks[key] = task
+        self._start(task)
+        return task
+
+    def _start(self, task: Task) -> None:
+        task.future = self._pool.submit(self._run, task)
+
+    def _run(self, task: Task) -> None:
+        with self._lock:
+            if task.cancelled.is_set():
+                return
+            task.started = True
+        try:
+            result = task.func(task, *task.args)
+            self._results.put(("done", task, result))
+        except TaskCancelled:
+            self._results.put(("cancelled", task, None))
+        except Exception as e:
+            self._results.put(("error", task, e))
+
+    def cancel(self, key: str) -> None:
+        with self._lock:
+            task = self._tasks.pop(key, None)
+        if task is not None:
+            task.rerun = None
+            task.cancel()
+
+    def cancel_all(self) -> list:
+        with self._lock:
+            keys = list(self._tasks)
+        for key in keys:
+            self.cancel(key)
+        return keys
+
+    def busy(self, key: str) -> bool:
+        with self._lock:
+            return key in self._tasks
+
+    def _finish(self, task: Task) -> None:
+        with self._lock:
+            if self._tasks.get(task.key) is task:
+                del self._tasks[task.key]
+            rerun = task.rerun
+            if rerun is not None and not task.cancelled.is_set():
+                self._tasks[task.key] = rerun
+        if rerun is not None and not task.cancelled.is_set():
+            self._start(rerun)
+
+    def _drain(self) -> None:
+        # Bounded work per frame keeps the main loop responsive
+        for _ in range(self.max_per_drain):
+            if self._closed:
+                return
+            try:
+                kind, task, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if kind == "progress":
+                    if task.on_progress and not task.cancelled.is_set():
+                        task.on_progress(*payload)
+                    continue
+                self._finish(task)
+                if task.cancelled.is_set() or kind == "cancelled":
+                    continue
+                if kind == "done" and task.on_done:
+                    task.on_done(payload)
+                elif kind == "error":
+                    if task.on_error:
+                        task.on_error(payload)
+                    else:
+                        logger.error(f"Background task {task.key} failed: {payload}")
+            except Exception as e:
+                logger.error(f"Callback for {task.key} failed: {e}")
+        # A callback may have shut the executor down (and destroyed the root)
+        if not self._closed:
+            self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def shutdown(self) -> None:
+        self._closed = True
+        self.root.after_cancel(self._after_id)
+        with self._lock:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classifier
+from classifier import PortClassifier
+
+LEVELS = [
+    {"name": "High", "applications": [
+        {"name": "Zoom", "ports": [{"start": 8801, "end": 8810, "protocol": "udp"}]},
+        {"name": "Voice", "ports": [{"start": 5000, "end": 5100, "protocol": "both"}]},
+    ]},
+    {"name": "Medium", "applications": [
+        {"name": "Web", "ports": [{"start": 5050, "end": 5200, "protocol": "tcp"}]},
+        {"name": "Old", "ports": [{"start": 5010, "end": 5020, "protocol": "tcp"}]},
+    ]},
+    {"name": "Low", "applications": [
+        {"name": "Bulk", "ports": [{"start": 6000, "protocol": "tcp"}]},
+    ]},
+]
+
+
+class PortClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = PortClassifier(LEVELS)
+
+    def test_earlier_tier_wins_overlapping_ports(self):
+        self.assertEqual(self.classifier.classify("tcp", 5060), "High")
+        self.assertEqual(self.classifier.classify("tcp", 5150), "Medium")
+        self.assertEqual(self.classifier.classify(6, 6000), "Low")
+        self.assertIsNone(self.classifier.classify("tcp", 8805))
+        self.assertEqual(self.classifier.classify(17, 8805), "High")
+
+    def test_conflicts_report_overlap_and_shadowing(self):
+        conflicts = {(c.kind, c.rule.app) for c in self.classifier.conflicts}
+        self.assertEqual(conflicts, {("overlap", "Web"), ("shadowed", "Old")})
+
+    def test_ranges_are_resolved_and_non_overlapping(self):
+        self.assertEqual(self.classifier.ranges("tcp"),
+                         [(5000, 5100, "High"), (5101, 5200, "Medium"), (6000, 6000, "Low")])
+        self.assertEqual(self.classifier.ranges(17), [(5000, 5100, "High"), (8801, 8810, "High")])
+        self.assertEqual(self.classifier.ranges("icmp"), [])
+        self.assertEqual(self.classifier.protocols, ["tcp", "udp"])
+
+    def _check_ids_match_classify(self):
+        protocols = ["tcp", "udp", "TCP", "udp", "tcp", "tcp", "udp"]
+        ports = [5060, 5060, 5150, 8805, 8805, 6000, 1]
+        expected = [self.classifier.classify(p, port) for p, port in zip(protocols, ports)]
+        ids = list(self.classifier.classify_ids(protocols, ports))
+        self.assertEqual([self.classifier.tiers[i] if i >= 0 else None for i in ids], expected)
+        numbers = [classifier.PROTOCOL_NUMBERS[p.lower()] for p in protocols]
+        self.assertEqual(self.classifier.classify_many(numbers, ports), expected)
+
+    def test_classify_ids_matches_classify(self):
+        self._check_ids_match_classify()
+
+    def test_classify_ids_matches_classify_without_numpy(self):
+        with mock.patch.object(classifier, "np", None):
+            self._check_ids_match_classify()
+
+
+if __name__ == "__main__":
+    unittest.main()
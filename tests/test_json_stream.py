@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import JsonRecordStream
+
+RECORDS = [
+    {"Name": "Auto_zoom.exe", "DSCPAction": 46, "Path": "C:\\Program Files\\Zoom\\bin\\Zoom.exe"},
+    {"Name": "with \"quotes\" and {braces}", "DSCPAction": 34, "Ports": [3478, 3479]},
+    12345678901234567890,
+    -1.5e-3,
+    True,
+    None,
+]
+
+
+def _chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class JsonRecordStreamTest(unittest.TestCase):
+    def test_records_split_at_every_chunk_size(self):
+        text = json.dumps(RECORDS, indent=2)
+        for size in (1, 2, 3, 7, 64, len(text)):
+            for read_size in (1, 16, 1 << 16):
+                stream = JsonRecordStream(_chunked(text, size), read_size=read_size)
+                self.assertEqual(list(stream), RECORDS, (size, read_size))
+                self.assertEqual((stream.records, stream.errors), (len(RECORDS), 0))
+
+    def test_single_object_is_the_only_record(self):
+        stream = JsonRecordStream(_chunked(json.dumps(RECORDS[0]), 5), read_size=4)
+        self.assertEqual(list(stream), [RECORDS[0]])
+
+    def test_empty_input_and_empty_array(self):
+        self.assertEqual(list(JsonRecordStream(["", "  \r\n"])), [])
+        self.assertEqual(list(JsonRecordStream(["[", " ", "]"])), [])
+
+    def test_malformed_element_is_skipped(self):
+        text = '[{"a": 1}, {"b": oops}, {"c": 3}]'
+        stream = JsonRecordStream(_chunked(text, 4), read_size=4)
+        self.assertEqual(list(stream), [{"a": 1}, {"c": 3}])
+        self.assertEqual((stream.records, stream.errors), (2, 1))
+
+    def test_output_that_is_not_json(self):
+        stream = JsonRecordStream(["Get-NetQosPolicy : Access is denied."])
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.errors, 1)
+
+    def test_truncated_array_counts_an_error(self):
+        stream = JsonRecordStream(_chunked('[{"a": 1}, {"b": 2', 3), read_size=3)
+        self.assertEqual(list(stream), [{"a": 1}])
+        self.assertEqual(stream.errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_watcher import PollingProcessSource, ProcessEventSource, ProcessWatcher
+from reconcile import InMemoryPolicyStore, PolicyReconciler
+
+
+class _Index:
+    def refresh(self):
+        return [], []
+
+    def lookup(self, name):
+        return {}
+
+
+class _TableIndex:
+    """Diffs a hand-edited pid -> name table the way ProcessIndex diffs the PID set."""
+
+    def __init__(self):
+        self.table = {}
+        self._seen = {}
+
+    def refresh(self):
+        started = [(pid, name, None) for pid, name in self.table.items() if pid not in self._seen]
+        exited = [(pid, name) for pid, name in self._seen.items() if pid not in self.table]
+        self._seen = dict(self.table)
+        return started, exited
+
+    def lookup(self, name):
+        return {pid: None for pid, n in self._seen.items() if n == name}
+
+
+class ProcessWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryPolicyStore()
+        self.watcher = ProcessWatcher({"zoom.exe": 46}, source=ProcessEventSource(),
+                                      reconciler=PolicyReconciler(self.store), debounce=2.0, index=_Index())
+
+    def start(self, pid, now):
+        self.watcher.handle(("start", pid, "zoom.exe", None, time.time()), now)
+
+    def exit(self, pid, now):
+        self.watcher.handle(("exit", pid, "zoom.exe", None, 0.0), now)
+
+    def test_policy_follows_launch_and_exit(self):
+        self.start(100, 0.0)
+        self.watcher.sync(1.0)
+        self.assertNotIn("Auto_zoom.exe", self.store.policies)
+        self.watcher.sync(2.5)
+        self.assertIn("Auto_zoom.exe", self.store.policies)
+        self.exit(100, 5.0)
+        self.watcher.sync(7.5)
+        self.assertNotIn("Auto_zoom.exe", self.store.policies)
+
+    def test_short_lived_instance_during_exit_debounce(self):
+        self.start(100, 0.0)
+        self.watcher.sync(2.5)
+        self.exit(100, 5.0)
+        # A helper instance starts and exits again before its own debounce ends
+        self.start(101, 5.5)
+        self.exit(101, 6.0)
+        self.watcher.sync(8.5)
+        self.assertEqual(self.watcher.running, {})
+        self.assertNotIn("Auto_zoom.exe", self.store.policies)
+
+    def test_start_around_config_update_is_not_lost(self):
+        # The watcher and its polling source share one index
+        index = _TableIndex()
+        watcher = ProcessWatcher({"zoom.exe": 46}, source=PollingProcessSource(index, interval=0.0),
+                                 reconciler=PolicyReconciler(self.store), debounce=2.0, index=index)
+        watcher.seed()
+        watcher.sync(0.0)
+        index.table[9000001] = "zoom.exe"
+        watcher.update({"zoom.exe": 46, "discord.exe": 34})
+        watcher.sync(0.5)
+        for event in watcher.source.poll(0.0):
+            watcher.handle(event, 0.5)
+        watcher.sync(3.0)
+        self.assertIn("Auto_zoom.exe", self.store.policies)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reconcile import InMemoryPolicyStore, PolicyReconciler, QosPolicy, app_policies
+from shell_session import ShellError
+
+
+class _FailingStore(InMemoryPolicyStore):
+    def apply(self, plan):
+        super().apply(plan)
+        return [f"Access denied: {policy.name}" for policy in plan.creates]
+
+
+class PolicyReconcilerTest(unittest.TestCase):
+    def setUp(self):
+        self.manual = QosPolicy(name="Manual_backup", dscp=8, app_path="backup.exe")
+        self.store = InMemoryPolicyStore([
+            QosPolicy(name="Auto_zoom.exe", dscp=34, app_path="zoom.exe"),
+            QosPolicy(name="Auto_old.exe", dscp=10, app_path="old.exe"),
+            self.manual,
+        ])
+        self.reconciler = PolicyReconciler(self.store)
+        self.desired = app_policies({"zoom.exe": 46, "teams.exe": 34})
+
+    def test_reconcile_converges_then_is_a_no_op(self):
+        plan = self.reconciler.reconcile(self.desired)
+        self.assertEqual([p.name for p in plan.creates], ["Auto_teams.exe"])
+        self.assertEqual([p.name for p in plan.updates], ["Auto_zoom.exe"])
+        self.assertEqual(plan.deletes, ["Auto_old.exe"])
+        self.assertEqual(self.store.apply_calls, 1)
+
+        again = self.reconciler.reconcile(self.desired)
+        self.assertFalse(again)
+        self.assertEqual(self.store.apply_calls, 1)
+
+    def test_policies_outside_the_prefix_are_left_alone(self):
+        self.reconciler.reconcile(self.desired)
+        self.assertEqual(self.store.policies["Manual_backup"], self.manual)
+
+    def test_dry_run_plans_without_touching_the_store(self):
+        before = dict(self.store.policies)
+        plan = self.reconciler.reconcile(self.desired, dry_run=True)
+        self.assertTrue(plan)
+        self.assertEqual(self.store.policies, before)
+        self.assertEqual(self.store.apply_calls, 0)
+
+    def test_failed_changes_raise(self):
+        reconciler = PolicyReconciler(_FailingStore())
+        with self.assertRaises(ShellError):
+            reconciler.reconcile(self.desired)
+
+
+if __name__ == "__main__":
+    unittest.main()
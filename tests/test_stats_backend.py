@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from linux_enforce import class_id
+from stats_backend import LinuxBackend, parse_tc_class_output
+
+PROC_NET_DEV = b"""\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:   12345      67    0    0    0     0          0         0    12345      67    0    0    0     0       0          0
+ veth0: 1000 10 0 0 0 0 0 0 2000 20 0 0 0 0 0 0
+  eth0: 987654321 654321    0    0    0     0          0         0 123456789 54321    0    0    0     0       0          0
+"""
+
+TC_CLASS_TEXT = """\
+class htb 1:12e parent 1:1 prio 0 rate 40Mbit ceil 100Mbit burst 1600b cburst 1600b 
+ Sent 90000 bytes 60 pkt (dropped 0, overlimits 0 requeues 0) 
+ backlog 0b 0p requeues 0
+ lended: 1 borrowed: 0 giants: 0
+ tokens: 188750 ctokens: 188750
+
+class htb 1:1 root rate 100Mbit ceil 100Mbit burst 1600b cburst 1600b 
+ Sent 91000 bytes 61 pkt (dropped 0, overlimits 0 requeues 0) 
+ backlog 0b 0p requeues 0
+
+class htb 1:100 parent 1:1 prio 3 rate 10Mbit ceil 100Mbit burst 1600b cburst 1600b 
+ Sent 1000 bytes 1 pkt (dropped 0, overlimits 0 requeues 0) 
+ backlog 0b 0p requeues 0
+"""
+
+TC_CLASS_JSON = json.dumps([
+    {"class": "htb", "handle": "1:12e", "parent": "1:1", "prio": 0, "bytes": 90000, "packets": 60},
+    {"class": "htb", "handle": "1:1", "root": True, "bytes": 91000, "packets": 61},
+    {"class": "htb", "handle": "1:100", "parent": "1:1", "prio": 3, "bytes": 1000, "packets": 1},
+])
+
+
+class ProcNetDevTest(unittest.TestCase):
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(PROC_NET_DEV)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        self.backend = LinuxBackend({}, proc_net_dev=f.name)
+        self.addCleanup(self.backend.close)
+
+    def test_counters_of_the_named_interface(self):
+        self.assertEqual(self.backend.get_interface_stats("eth0"), {
+            "input_bytes": 987654321, "input_packets": 654321,
+            "output_bytes": 123456789, "output_packets": 54321,
+        })
+
+    def test_name_is_not_matched_as_a_suffix(self):
+        self.assertEqual(self.backend.get_interface_stats("veth0")["output_bytes"], 2000)
+        self.assertEqual(self.backend.get_interface_stats("th0")["input_bytes"], 0)
+
+
+class TcClassTest(unittest.TestCase):
+    EXPECTED = {0x1012e: (90000, 60), 0x10001: (91000, 61), 0x10100: (1000, 1)}
+
+    def test_text_and_json_output_agree(self):
+        self.assertEqual(parse_tc_class_output(TC_CLASS_TEXT), self.EXPECTED)
+        self.assertEqual(parse_tc_class_output(TC_CLASS_JSON), self.EXPECTED)
+
+    def test_malformed_json_yields_nothing(self):
+        self.assertEqual(parse_tc_class_output('[{"handle": "1:12e", "bytes": "many"}]'), {})
+
+    def test_classes_map_back_to_their_tiers(self):
+        backend = LinuxBackend({46: "Ultra High", 0: "Default"})
+        backend._use_netlink = False
+        backend._dump_classes_tc = lambda interface: parse_tc_class_output(TC_CLASS_JSON)
+        self.assertEqual(backend.get_qos_stats("eth0"), {
+            "Ultra High": {"bytes": 90000, "packets": 60},
+            "Default": {"bytes": 1000, "packets": 1},
+        })
+        self.assertEqual([class_id(46), class_id(0)], ["1:12e", "1:100"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timeseries import WRAP_32, CounterRate, RateSeries, TimeSeriesStore
+
+
+class CounterRateTest(unittest.TestCase):
+    def test_first_reading_only_sets_the_baseline(self):
+        counter = CounterRate()
+        self.assertIsNone(counter.update(0.0, 1000))
+        self.assertEqual(counter.update(2.0, 3000), 1000.0)
+
+    def test_32_bit_wrap_counts_the_bytes_across_the_wrap(self):
+        counter = CounterRate()
+        counter.update(0.0, WRAP_32 - 100)
+        self.assertEqual(counter.update(1.0, 50), 150.0)
+        self.assertEqual((counter.wraps, counter.resets), (1, 0))
+
+    def test_reset_restarts_from_the_new_reading(self):
+        counter = CounterRate()
+        counter.update(0.0, 10 ** 12)
+        self.assertEqual(counter.update(1.0, 400), 400.0)
+        self.assertEqual((counter.wraps, counter.resets), (0, 1))
+
+    def test_out_of_order_reading_is_a_new_baseline(self):
+        counter = CounterRate()
+        counter.update(5.0, 500)
+        self.assertIsNone(counter.update(5.0, 900))
+        self.assertEqual(counter.update(6.0, 1000), 100.0)
+
+
+class RateSeriesTest(unittest.TestCase):
+    def test_stats_cover_the_window_and_follow_new_samples(self):
+        series = RateSeries(capacity=16, windows=(10.0,), cumulative=False)
+        for t, value in enumerate([5, 1, 4, 2, 3]):
+            series.update(float(t), value)
+        stats = series.stats(10.0)
+        self.assertEqual((stats["min"], stats["max"], stats["mean"], stats["p50"]), (1, 5, 3, 3))
+        self.assertEqual(series.stats(1.0)["min"], 2)
+        stats["min"] = -1
+        self.assertEqual(series.stats(10.0)["min"], 1)
+        series.update(5.0, 0)
+        self.assertEqual(series.stats(10.0)["min"], 0)
+
+
+class TimeSeriesStoreTest(unittest.TestCase):
+    def test_tier_that_stops_reporting_reads_as_idle(self):
+        store = TimeSeriesStore(sample_interval=1.0)
+        for t in range(6):
+            store.update(("tier", "High", "bytes"), float(t), 1000 * t)
+            if t < 2:
+                store.update(("tier", "Low", "bytes"), float(t), 500 * t)
+        self.assertEqual(store.rates("tier", "bytes"), {"High": 1000.0, "Low": 0.0})
+
+    def test_tier_within_stale_after_keeps_its_rate(self):
+        store = TimeSeriesStore(sample_interval=1.0)
+        for t in range(4):
+            store.update(("tier", "High", "bytes"), float(t), 1000 * t)
+            if t < 2:
+                store.update(("tier", "Low", "bytes"), float(t), 500 * t)
+        self.assertEqual(store.rates("tier", "bytes"), {"High": 1000.0, "Low": 500.0})
+
+    def test_drop_forgets_removed_tiers(self):
+        store = TimeSeriesStore()
+        store.update(("tier", "High", "bytes"), 0.0, 0)
+        store.update(("tier", "Low", "bytes"), 0.0, 0)
+        store.update(("iface", "Low", "input_bytes"), 0.0, 0)
+        store.drop("tier", ["Low"])
+        self.assertEqual(set(store.series), {("tier", "High", "bytes"), ("iface", "Low", "input_bytes")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import math
+from array import array
+from typing import Dict, Hashable, Iterator, Optional, Sequence, Tuple
+
+DEFAULT_WINDOWS = (1.0, 10.0, 60.0)
+WRAP_32 = 1 << 32
+
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) history backed by preallocated arrays."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.count = 0
+
+    def append(self, t: float, value: float) -> None:
+        self.times[self.head] = t
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return self.times[i], self.values[i]
+
+    def iter_window(self, span: float, now: Optional[float] = None) -> Iterator[Tuple[float, float]]:
+        # Newest first, stopping at the first sample older than the window
+        if not self.count:
+            return
+        i = (self.head - 1) % self.capacity
+        if now is None:
+            now = self.times[i]
+        cutoff = now - span
+        for _ in range(self.count):
+            t = self.times[i]
+            if t < cutoff:
+                return
+            yield t, self.values[i]
+            i = (i - 1) % self.capacity
+
+
+class CounterRate:
+    """Turns successive readings of a cumulative counter into a per-second rate.
+
+    A counter that goes backwards either wrapped (32-bit counters such as tc
+    packet counts) or was reset (interface re-created, policy re-added).
+    """
+
+    def __init__(self):
+        self.prev_t = None
+        self.prev_value = 0
+        self.wraps = 0
+        self.resets = 0
+
+    def update(self, t: float, value: int) -> Optional[float]:
+        if self.prev_t is None or t <= self.prev_t:
+            self.prev_t = t
+            self.prev_value = value
+            return None
+        delta = value - self.prev_value
+        if delta < 0:
+            wrapped = WRAP_32 - self.prev_value + value
+            if self.prev_value < WRAP_32 and wrapped < WRAP_32 // 2:
+                delta = wrapped
+                self.wraps += 1
+            else:
+                delta = value
+                self.resets += 1
+        rate = delta / (t - self.prev_t)
+        self.prev_t = t
+        self.prev_value = value
+        return rate
+
+
+class RateSeries:
+    """Rate history for one counter plus an EWMA per configured window."""
+
+    def __init__(self, capacity: int, windows: Sequence[float] = DEFAULT_WINDOWS, cumulative: bool = True):
+        self.windows = tuple(windows)
+        self.history = RingBuffer(capacity)
+        self.counter = CounterRate() if cumulative else None
+        self.ewma = array("d", bytes(8 * len(self.windows)))
+        self._last_t = None
+        # Time of the last reading, including one that produced no rate yet
+        self.updated = None
+        # ((window, now), stats) of the last stats() call, until the next sample
+        self._stats_cache = None
+
+    def update(self, t: float, value: float) -> Optional[float]:
+        self.updated = t
+        rate = self.counter.update(t, value) if self.counter is not None else float(value)
+        if rate is None:
+            return None
+        if self._last_t is None:
+            for i in range(len(self.windows)):
+                self.ewma[i] = rate
+        else:
+            # Time-constant EWMA so irregular sample spacing weighs correctly
+            dt = t - self._last_t
+            for i, window in enumerate(self.windows):
+                alpha = 1.0 - math.exp(-dt / window) if dt > 0 else 0.0
+                self.ewma[i] += alpha * (rate - self.ewma[i])
+        self._last_t = t
+        self.history.append(t, rate)
+        self._stats_cache = None
+        return rate
+
+    @property
+    def rate(self) -> float:
+        latest = self.history.latest()
+        return latest[1] if latest else 0.0
+
+    def stats(self, window: float, now: Optional[float] = None) -> Dict[str, float]:
+        """Min, max, mean, EWMA and percentiles of the rates within window.
+
+        Computed when read, with one sort of the window's samples; updates
+        keep no running aggregates, so only reported series pay for it. The
+        result is reused until the next sample arrives.
+        """
+        if self._stats_cache is not None and self._stats_cache[0] == (window, now):
+            return dict(self._stats_cache[1])
+        values = sorted(v for _, v in self.history.iter_window(window, now))
+        stats = {"rate": self.rate, "min": 0.0, "max": 0.0, "mean": 0.0,
+                 "ewma": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+        if window in self.windows:
+            stats["ewma"] = self.ewma[self.windows.index(window)]
+        if values:
+            n = len(values)
+            stats["min"] = values[0]
+            stats["max"] = values[-1]
+            stats["mean"] = sum(values) / n
+            for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+                stats[name] = values[min(n - 1, int(q * n))]
+        self._stats_cache = ((window, now), stats)
+        return dict(stats)
+
+
+class TimeSeriesStore:
+    """Series keyed by e.g. ("tier", "High", "bytes") or ("iface", "eth0", "input_bytes").
+
+    Memory is fixed up front: every series holds enough slots to cover the
+    longest window at the configured sample interval.
+
+    A series that has not been updated for stale_after seconds (three sample
+    intervals by default), measured against the newest update in the store,
+    reads as 0 in rates(): a tier that stops reporting is idle, not stuck at
+    its last rate.
+    """
+
+    def __init__(self, sample_interval: float = 1.0, windows: Sequence[float] = DEFAULT_WINDOWS,
+                 stale_after: Optional[float] = None):
+        self.windows = tuple(sorted(windows))
+        self.capacity = int(math.ceil(self.windows[-1] / sample_interval)) + 2
+        self.stale_after = 3 * sample_interval if stale_after is None else stale_after
+        self.series: Dict[Hashable, RateSeries] = {}
+        self.latest_t = None
+
+    def get(self, key: Hashable, cumulative: bool = True) -> RateSeries:
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = RateSeries(self.capacity, self.windows, cumulative)
+        return series
+
+    def update(self, key: Hashable, t: float, value: float, cumulative: bool = True) -> Optional[float]:
+        if self.latest_t is None or t > self.latest_t:
+            self.latest_t = t
+        return self.get(key, cumulative).update(t, value)
+
+    def drop(self, kind: str, names) -> None:
+        """Forget every series of the given kind and names, e.g. tiers that were removed."""
+        names = set(names)
+        for key in [key for key in self.series if key[0] == kind and key[1] in names]:
+            del self.series[key]
+
+    def rates(self, kind: str, field: str) -> Dict[str, float]:
+        cutoff = self.latest_t - self.stale_after if self.latest_t is not None else None
+        return {
+            key[1]: series.rate if cutoff is None or series.updated >= cutoff else 0.0
+            for key, series in self.series.items()
+            if key[0] == kind and key[2] == field
+        }
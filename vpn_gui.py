@@ -1,14 +1,23 @@
+import time
+
+# Taken before the other imports so --measure-startup counts them
+_STARTED = time.perf_counter()
+
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox
-import subprocess
-import os
-import json
-import psutil
-from PIL import Image, ImageTk
 import platform
+from dataclasses import replace
+
+from app_list import AppListModel, VirtualAppList
+from config import ConfigError, get_config_store
+from dashboard import DashboardTab
+from icon_cache import IconCache
+from shell_session import get_pool
+from task_executor import CommandExecutor
 
 class VPNQoSManager:
-    def __init__(self, root):
+    def __init__(self, root, on_ready=None):
         self.root = root
         self.root.title("VPN QoS Manager")
         self.root.geometry("600x600")
@@ -16,33 +25,36 @@ class VPNQoSManager:
         # Detect platform
         self.is_windows = platform.system() == "Windows"
         
-        # Priority apps and their default priority levels
-        self.priority_apps = {
-            "zoom.exe": "Ultra High",
-            "discord.exe": "Ultra High",
-            "teams.exe": "Ultra High",
-            "valorant.exe": "High",
-            "steam.exe": "High",
-            "leagueoflegends.exe": "High",
-            "csgo.exe": "High",
-            "roblox.exe": "High",
-            "obs.exe": "Medium",
-            "twitch.exe": "Medium",
-            "netflix.exe": "Medium",
-            "spotify.exe": "Medium"  # Added Spotify
-        }
-        
-        # DSCP mapping
-        self.priority_to_dscp = {
-            "Ultra High": 46,
-            "High": 34,
-            "Medium": 28,
-            "Low": 10
-        }
-        
-        # Load settings
-        self.settings_file = "settings.json"
-        self.settings = self.load_settings()
+        # Warm PowerShell sessions shared by every button; no process starts until first use
+        self.shell = get_pool()
+        
+        # Process name -> exe index (psutil), started after the window is shown
+        self._processes = None
+        
+        # All PowerShell and psutil work runs off the Tk thread
+        self.executor = CommandExecutor(self.root)
+        self._batches = 0
+        self._batch_apps = {}
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Startup milestones (seconds since import) for --measure-startup
+        self.timings = {"imported": time.perf_counter() - _STARTED}
+        self.on_ready = on_ready
+        self._shown = False
+        self.root.bind("<Map>", self._on_map, add="+")
+        
+        # Priority apps and their default tiers, the DSCP of each tier and settings,
+        # from the priority.json / settings.json shared with the command-line tools
+        self.config_store = get_config_store()
+        config = self.config_store.get()
+        self.priority_apps = config.app_tiers()
+        self.priority_to_dscp = config.tier_to_dscp()
+        self.settings = config.settings
+        # Reloads arrive on the store's watch thread and are picked up by _poll_config
+        self._pending_config = None
+        self._config_after_id = None
+        self._closing = False
+        self.config_store.subscribe(self._config_changed)
         
         # Configure ttk style for light theme
         style = ttk.Style()
@@ -57,18 +69,19 @@ class VPNQoSManager:
         style.configure("Light.TCombobox", fieldbackground="#FFFFFF", foreground="#333333", font=("Arial", 10))
         style.map("Light.TCombobox", fieldbackground=[("readonly", "#FFFFFF")])
         
-        # Load icons
-        self.icons = {}
-        self.load_icons()
+        # Icons are cut from the prebuilt sprite sheet the first time a row shows them
+        self.icons = IconCache("icons")
         
         # Create tabbed interface
         self.notebook = ttk.Notebook(root, style="Light.TNotebook")
         self.notebook.pack(fill="both", expand=True, padx=15, pady=15)
         
         self.qos_tab = ttk.Frame(self.notebook, style="Light.TFrame")
+        self.traffic_tab = ttk.Frame(self.notebook, style="Light.TFrame")
         self.settings_tab = ttk.Frame(self.notebook, style="Light.TFrame")
         
         self.notebook.add(self.qos_tab, text="QoS Management")
+        self.notebook.add(self.traffic_tab, text="Live Traffic")
         self.notebook.add(self.settings_tab, text="Settings")
         
         # Set root background
@@ -76,52 +89,62 @@ class VPNQoSManager:
         
         # Initialize tabs
         self.setup_qos_tab()
+        self.setup_traffic_tab()
         self.setup_settings_tab()
+        self.timings["constructed"] = time.perf_counter() - _STARTED
         
-    def load_icons(self):
-        # Icon directory
-        icon_dir = "icons"
-        os.makedirs(icon_dir, exist_ok=True)
+    def _on_map(self, event):
+        # First paint: everything not needed to draw the window starts now
+        if event.widget is not self.root or self._shown:
+            return
+        self._shown = True
+        self.timings["first_paint"] = time.perf_counter() - _STARTED
+        self.root.after_idle(self._start_background)
         
-        # Default fallback image
-        self.icons["default"] = ImageTk.PhotoImage(Image.new("RGB", (16, 16), color="gray"))
+    def _start_background(self):
+        self.process_index()
+        self.dashboard.start()
+        self.refresh_interfaces()
+        self.config_store.watch()
+        self._config_after_id = self.root.after(1000, self._poll_config)
+        self.timings["background_started"] = time.perf_counter() - _STARTED
         
-        # Load app-specific icons
-        for app in self.priority_apps:
-            app_name = app.split(".")[0]
-            icon_path = os.path.join(icon_dir, f"{app_name}.png")
-            try:
-                img = Image.open(icon_path).resize((16, 16), Image.Resampling.LANCZOS)
-                self.icons[app_name] = ImageTk.PhotoImage(img)
-            except Exception as e:
-                print(f"Error loading icon for {app_name}: {e}")
-                self.icons[app_name] = self.icons["default"]
-        
-        # Load button icons
-        button_icons = {
-            "checkmark": "checkmark.png",  # Green checkmark
-            "trash": "trash.png",         # Red trash can
-            "refresh": "refresh.png"      # Blue refresh arrow
-        }
-        for name, filename in button_icons.items():
-            icon_path = os.path.join(icon_dir, filename)
-            try:
-                img = Image.open(icon_path).resize((16, 16), Image.Resampling.LANCZOS)
-                self.icons[name] = ImageTk.PhotoImage(img)
-            except Exception as e:
-                print(f"Error loading button icon {name}: {e}")
-                self.icons[name] = self.icons["default"]
-        
-    def load_settings(self):
+    def _config_changed(self, config, diff):
+        # Store thread: Tk widgets are only touched from the Tk thread
+        self._pending_config = config
+        
+    def _poll_config(self):
+        if self._closing:
+            return
+        config, self._pending_config = self._pending_config, None
+        if config is not None:
+            self.apply_config(config)
+        self._config_after_id = self.root.after(1000, self._poll_config)
+        
+    def apply_config(self, config):
+        # Tiers and app defaults edited in priority.json (or pushed by the fleet collector)
+        self.priority_apps = config.app_tiers()
+        self.priority_to_dscp = config.tier_to_dscp()
+        self.settings = config.settings
+        self.app_list.set_catalog(self.priority_apps, list(self.priority_to_dscp))
+        
+    def save_app_tiers(self, app_tiers):
+        # Applied tiers become the apps' defaults in priority.json, shared with the command-line tools
         try:
-            with open(self.settings_file, "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {"interface": "Ethernet"}
+            self.config_store.save_app_tiers(app_tiers)
+        except (OSError, ConfigError) as e:
+            self.qos_status.config(text=f"Applied, but not saved to priority.json: {e}")
+        
+    def process_index(self):
+        # Imported on first use so psutil stays off the startup path
+        if self._processes is None:
+            from process_index import get_process_index
+            self._processes = get_process_index()
+            self._processes.start()
+        return self._processes
         
     def save_settings(self):
-        with open(self.settings_file, "w") as f:
-            json.dump(self.settings, f, indent=2)
+        self.config_store.save_settings(self.settings)
         messagebox.showinfo("Success", "Settings saved.")
         
     def setup_qos_tab(self):
@@ -131,100 +154,132 @@ class VPNQoSManager:
         app_container = ttk.Frame(self.qos_tab, style="Light.TFrame", relief="solid", borderwidth=1, padding=10)
         app_container.pack(fill="both", expand=True, padx=10)
         
-        # Canvas for scrollable app list
-        canvas = tk.Canvas(app_container, bg="#F5F5F5", highlightthickness=0)
-        scrollbar = ttk.Scrollbar(app_container, orient="vertical", command=canvas.yview)
-        app_frame = ttk.Frame(canvas, style="Light.TFrame")
-        
-        app_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        # Only the rows that fit are real widgets; they are re-bound to other apps on scroll
+        self.app_list = VirtualAppList(app_container, AppListModel(self.priority_apps), self.icons,
+                                       on_apply=self.apply_qos, on_remove=self.remove_qos,
+                                       on_apply_selected=self.apply_selected, tiers=list(self.priority_to_dscp))
         
-        canvas.configure(yscrollcommand=scrollbar.set)
+        button_frame = ttk.Frame(self.qos_tab, style="Light.TFrame")
+        button_frame.pack(pady=15)
+        ttk.Button(button_frame, text="Clear All Policies", image=self.icons.get("trash"), compound="left",
+                   command=self.clear_all_policies, style="Light.TButton").pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancel Pending", command=self.cancel_pending,
+                   style="Light.TButton").pack(side="left", padx=5)
         
-        scrollbar.pack(side="right", fill="y")
-        canvas.pack(side="left", fill="both", expand=True)
-        canvas.create_window((0, 0), window=app_frame, anchor="nw")
-        
-        # Priority options
-        priority_options = ["Ultra High", "High", "Medium", "Low"]
+        self.qos_status = ttk.Label(self.qos_tab, text="", style="Light.TLabel", font=("Arial", 11))
+        self.qos_status.pack(pady=5)
         
-        for app in self.priority_apps:
-            frame = ttk.Frame(app_frame, style="Light.TFrame")
-            frame.pack(fill="x", pady=5, padx=5)
-            
-            # App icon
-            app_name = app.split(".")[0]
-            ttk.Label(frame, image=self.icons[app_name], style="Light.TLabel").pack(side="left", padx=(0, 10))
+    def set_row_status(self, app, text, error=False):
+        self.app_list.set_status(app, text, error)
             
-            # App name
-            ttk.Label(frame, text=app, width=20, style="Light.TLabel").pack(side="left")
-            
-            # Priority dropdown
-            priority_var = tk.StringVar(value=self.priority_apps[app])
-            priority_combo = ttk.Combobox(frame, textvariable=priority_var, values=priority_options, width=12, state="readonly", style="Light.TCombobox")
-            priority_combo.pack(side="left", padx=10)
-            
-            # Buttons with icons
-            ttk.Button(frame, text="Apply", image=self.icons["checkmark"], compound="left",
-                       command=lambda a=app, v=priority_var: self.apply_qos(a, v), style="Light.TButton").pack(side="left", padx=5)
-            ttk.Button(frame, text="Remove", image=self.icons["trash"], compound="left",
-                       command=lambda a=app: self.remove_qos(a), style="Light.TButton").pack(side="left", padx=5)
+    def show_error(self, status_label, error):
+        status_label.config(text=f"Error: {str(error)}")
+        messagebox.showerror("Error", str(error))
         
-        ttk.Button(self.qos_tab, text="Clear All Policies", image=self.icons["trash"], compound="left",
-                   command=self.clear_all_policies, style="Light.TButton").pack(pady=15)
+    def row_error(self, app, error):
+        self.set_row_status(app, "Error", error=True)
+        self.show_error(self.qos_status, error)
         
-        self.qos_status = ttk.Label(self.qos_tab, text="", style="Light.TLabel", font=("Arial", 11))
-        self.qos_status.pack(pady=5)
-        
-    def apply_qos(self, app, priority_var):
+    def apply_qos(self, app, priority):
         if not self.is_windows:
             self.qos_status.config(text="QoS management not supported on macOS")
             messagebox.showerror("Error", "QoS management requires Windows with PowerShell")
             return
             
-        try:
-            priority = priority_var.get()
-            dscp = self.priority_to_dscp[priority]
-            # Find executable path using psutil
-            exe_path = None
-            for proc in psutil.process_iter(['name', 'exe']):
-                if proc.info['name'].lower() == app:
-                    exe_path = proc.info['exe']
-                    break
-            if not exe_path:
-                raise Exception(f"{app} not found running")
-                
-            subprocess.run([
-                "powershell",
-                f"New-NetQosPolicy -Name Auto_{app} "
-                f"-AppPathNameMatchCondition '{exe_path}' "
-                f"-IPProtocolMatchCondition Both "
-                f"-DSCPAction {dscp}"
-            ], shell=True, check=True)
+        self.set_row_status(app, "Applying...")
+        # Apply and Remove on one row share a key, so only the latest click wins
+        self.executor.submit(f"policy:{app}", self._apply_qos_worker, app, priority,
+                             on_done=lambda _: self.qos_applied(app, priority),
+                             on_error=lambda e: self.row_error(app, e),
+                             on_progress=lambda message, _: self.set_row_status(app, message))
+        
+    def _apply_qos_worker(self, task, app, priority):
+        # Same reconciler path as a bulk apply: quoted arguments, and an existing policy is updated
+        return self._apply_selected_worker(task, [app], priority)
+        
+    def tier_dscp(self, priority):
+        # Read by workers; a reload may have removed the tier since the click
+        dscp = self.priority_to_dscp.get(priority)
+        if dscp is None:
+            raise Exception(f"Tier {priority} is no longer configured")
+        return dscp
+        
+    def qos_applied(self, app, priority):
+        self.app_list.model.set_applied(app, priority)
+        self.set_row_status(app, "Applied")
+        self.qos_status.config(text=f"Policy applied to {app} ({priority})")
+        self.save_app_tiers({app: priority})
             
-            self.priority_apps[app] = priority
-            self.qos_status.config(text=f"Policy applied to {app} ({priority})")
-        except Exception as e:
-            self.qos_status.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+    def apply_selected(self, apps, priority):
+        if not self.is_windows:
+            self.qos_status.config(text="QoS management not supported on macOS")
+            messagebox.showerror("Error", "QoS management requires Windows with PowerShell")
+            return
             
+        # The batch supersedes any single-row operation still pending for these apps
+        for app in apps:
+            self.executor.cancel(f"policy:{app}")
+            self.set_row_status(app, "Applying...")
+        self.qos_status.config(text=f"Applying {priority} to {len(apps)} apps...")
+        # Each batch has its own key: a second batch must not replace one still queued
+        self._batches += 1
+        key = f"apply_selected:{self._batches}"
+        self._batch_apps[key] = apps
+        self.executor.submit(key, self._apply_selected_worker, apps, priority,
+                             on_done=lambda plan: self.selected_applied(key, apps, priority, plan),
+                             on_error=lambda e: self.selected_failed(key, apps, e),
+                             on_progress=lambda message, _: self.qos_status.config(text=message))
+        
+    def _apply_selected_worker(self, task, apps, priority):
+        from reconcile import PolicyReconciler, PowerShellPolicyStore, app_policies
+        # Apps that are not running are matched by exe name
+        index = self.process_index()
+        paths = {}
+        for app in apps:
+            exe_path = index.find_exe(app)
+            if exe_path:
+                paths[app] = exe_path
+        dscp = self.tier_dscp(priority)
+        reconciler = PolicyReconciler(PowerShellPolicyStore(self.shell))
+        task.report("Listing policies...")
+        # No prefixes: policies of apps outside the selection are never removed
+        plan = reconciler.plan(app_policies({app: dscp for app in apps}, paths), prefixes=())
+        task.report(f"Applying {plan.summary()}...")
+        return reconciler.apply(plan) if plan else plan
+        
+    def selected_applied(self, key, apps, priority, plan):
+        self._batch_apps.pop(key, None)
+        for app in apps:
+            self.app_list.model.set_applied(app, priority)
+            self.set_row_status(app, "Applied")
+        # Apps selected since the batch was submitted stay selected
+        self.app_list.deselect(apps)
+        self.qos_status.config(text=f"{priority} applied to {len(apps)} apps ({plan.summary()})")
+        self.save_app_tiers({app: priority for app in apps})
+        
+    def selected_failed(self, key, apps, error):
+        self._batch_apps.pop(key, None)
+        for app in apps:
+            self.set_row_status(app, "Error", error=True)
+        self.show_error(self.qos_status, error)
+        
     def remove_qos(self, app):
         if not self.is_windows:
             self.qos_status.config(text="QoS management not supported on macOS")
             messagebox.showerror("Error", "QoS management requires Windows with PowerShell")
             return
             
-        try:
-            subprocess.run([
-                "powershell",
-                f"Remove-NetQosPolicy -Name Auto_{app} -Confirm:$false"
-            ], shell=True, check=True)
-            self.qos_status.config(text=f"Policy removed from {app}")
-        except Exception as e:
-            self.qos_status.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.set_row_status(app, "Removing...")
+        self.executor.submit(f"policy:{app}", self._remove_qos_worker, app,
+                             on_done=lambda _: self.qos_removed(app),
+                             on_error=lambda e: self.row_error(app, e))
+        
+    def _remove_qos_worker(self, task, app):
+        self.shell.run(f"Remove-NetQosPolicy -Name Auto_{app} -Confirm:$false")
+        
+    def qos_removed(self, app):
+        self.set_row_status(app, "Removed")
+        self.qos_status.config(text=f"Policy removed from {app}")
             
     def clear_all_policies(self):
         if not self.is_windows:
@@ -232,17 +287,68 @@ class VPNQoSManager:
             messagebox.showerror("Error", "QoS management requires Windows with PowerShell")
             return
             
-        try:
-            for app in self.priority_apps:
-                subprocess.run([
-                    "powershell",
-                    f"Remove-NetQosPolicy -Name Auto_{app} -Confirm:$false"
-                ], shell=True)
-            self.qos_status.config(text="All policies cleared")
-        except Exception as e:
-            self.qos_status.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        for app in self.priority_apps:
+            self.executor.cancel(f"policy:{app}")
+            self.set_row_status(app, "Clearing...")
+        self.qos_status.config(text="Clearing policies...")
+        self.executor.submit("clear_all", self._clear_all_worker,
+                             on_done=self.policies_cleared,
+                             on_error=self.clear_all_failed,
+                             on_progress=lambda message, _: self.qos_status.config(text=message))
+        
+    def _clear_all_worker(self, task):
+        from reconcile import PolicyReconciler, PowerShellPolicyStore
+        # One listing and one batched removal script for every app
+        reconciler = PolicyReconciler(PowerShellPolicyStore(self.shell))
+        prefixes = tuple(f"Auto_{app}" for app in self.priority_apps)
+        task.report("Listing policies...")
+        plan = reconciler.plan({}, prefixes)
+        task.report(f"Removing {len(plan.deletes)} policies...")
+        return reconciler.apply(plan) if plan else plan
+        
+    def policies_cleared(self, plan):
+        for app in self.priority_apps:
+            self.set_row_status(app, "")
+        self.qos_status.config(text=f"All policies cleared ({len(plan.deletes)} removed)")
+        
+    def clear_all_failed(self, error):
+        for app in self.priority_apps:
+            self.set_row_status(app, "Error", error=True)
+        self.show_error(self.qos_status, error)
+        
+    def cancel_pending(self):
+        cancelled = self.executor.cancel_all()
+        for key in cancelled:
+            if key.startswith("policy:"):
+                self.set_row_status(key.split(":", 1)[1], "Cancelled")
+            elif key == "clear_all":
+                for app in self.priority_apps:
+                    self.set_row_status(app, "Cancelled")
+            elif key in self._batch_apps:
+                for app in self._batch_apps.pop(key):
+                    self.set_row_status(app, "Cancelled")
+        self.qos_status.config(text=f"Cancelled {len(cancelled)} pending operations")
+        
+    def on_close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self.config_store.unsubscribe(self._config_changed)
+        self.config_store.stop()
+        if self._config_after_id is not None:
+            self.root.after_cancel(self._config_after_id)
+        self.dashboard.stop()
+        self.executor.shutdown()
+        if self._processes is not None:
+            self._processes.stop()
+        self.root.destroy()
             
+    def setup_traffic_tab(self):
+        # Graphs fed in-process by the traffic monitor; frame rate from settings.json
+        interface = self.settings.interface if self.is_windows else None
+        self.dashboard = DashboardTab(self.root, self.traffic_tab, interface=interface,
+                                      fps=self.settings.dashboard_fps)
+        
     def setup_settings_tab(self):
         ttk.Label(self.settings_tab, text="Settings", style="Light.TLabel", font=("Arial", 18, "bold")).pack(pady=(10, 20))
         
@@ -251,10 +357,10 @@ class VPNQoSManager:
         interface_frame.pack(fill="x", padx=10, pady=5)
         
         ttk.Label(interface_frame, text="Network Interface:", style="Light.TLabel").pack(side="left")
-        self.interface_var = tk.StringVar(value=self.settings["interface"])
+        self.interface_var = tk.StringVar(value=self.settings.interface)
         self.interface_combo = ttk.Combobox(interface_frame, textvariable=self.interface_var, width=30, state="readonly", style="Light.TCombobox")
         self.interface_combo.pack(side="left", padx=15)
-        ttk.Button(interface_frame, text="Refresh", image=self.icons["refresh"], compound="left",
+        ttk.Button(interface_frame, text="Refresh", image=self.icons.get("refresh"), compound="left",
                    command=self.refresh_interfaces, style="Light.TButton").pack(side="left", padx=5)
         
         ttk.Button(self.settings_tab, text="Save Settings", command=self.save_settings_action, style="Light.TButton").pack(pady=15)
@@ -262,40 +368,73 @@ class VPNQoSManager:
         self.settings_status = ttk.Label(self.settings_tab, text="", style="Light.TLabel", font=("Arial", 11))
         self.settings_status.pack(pady=5)
         
-        # Populate interfaces
-        self.refresh_interfaces()
-        
     def refresh_interfaces(self):
         if not self.is_windows:
             self.interface_combo["values"] = ["Not supported on macOS"]
             self.interface_var.set("Not supported on macOS")
             self.settings_status.config(text="Interface detection not supported on macOS")
+            self._mark_ready()
             return
             
-        try:
-            result = subprocess.run(
-                ["powershell", "-Command", "Get-NetAdapter | Where-Object {$_.Status -eq 'Up'} | Select-Object -ExpandProperty Name"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            interfaces = result.stdout.strip().split("\n")
-            self.interface_combo["values"] = interfaces
-            if self.interface_var.get() not in interfaces:
-                self.interface_var.set(interfaces[0] if interfaces else "Ethernet")
-        except Exception as e:
-            self.settings_status.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.settings_status.config(text="Detecting interfaces...")
+        self.executor.submit("interfaces", self._refresh_interfaces_worker,
+                             on_done=self.interfaces_loaded,
+                             on_error=self.interfaces_failed)
+        
+    def _refresh_interfaces_worker(self, task):
+        output = self.shell.run("Get-NetAdapter | Where-Object {$_.Status -eq 'Up'} | Select-Object -ExpandProperty Name")
+        return output.strip().split("\n")
+        
+    def interfaces_loaded(self, interfaces):
+        self.interface_combo["values"] = interfaces
+        if self.interface_var.get() not in interfaces:
+            self.interface_var.set(interfaces[0] if interfaces else "Ethernet")
+        self.settings_status.config(text="")
+        self._mark_ready()
+        
+    def interfaces_failed(self, error):
+        self._mark_ready()
+        self.show_error(self.settings_status, error)
+        
+    def _mark_ready(self):
+        # The first interface listing completes startup
+        if "ready" in self.timings:
+            return
+        self.timings["ready"] = time.perf_counter() - _STARTED
+        if self.on_ready is not None:
+            self.on_ready(self)
             
     def save_settings_action(self):
         try:
-            self.settings["interface"] = self.interface_var.get()
+            self.settings = replace(self.settings, interface=self.interface_var.get())
             self.save_settings()
         except Exception as e:
             self.settings_status.config(text=f"Error: {str(e)}")
             messagebox.showerror("Error", str(e))
 
-if __name__ == "__main__":
+def report_startup(app):
+    for name, seconds in app.timings.items():
+        print(f"{name:<20} {seconds * 1000:8.1f} ms")
+    print(f"{'icons_decoded':<20} {app.icons.decoded:8d}")
+    # Called from inside startup work (a Tk callback); close once it has returned
+    app.root.after_idle(app.on_close)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VPN QoS Manager")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="Print startup milestones once interfaces are listed, then exit")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = VPNQoSManager(root)
-    root.mainloop()
\ No newline at end of file
+    try:
+        VPNQoSManager(root, on_ready=report_startup if args.measure_startup else None)
+    except (OSError, ConfigError) as e:
+        messagebox.showerror("Invalid configuration", str(e))
+        root.destroy()
+        return
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,34 +1,62 @@
-import psutil
-import subprocess
+import argparse
 
-# List of apps to prioritize and their DSCP values (46 = high priority)
-priority_apps = {
-    "zoom.exe": 46,
-    "discord.exe": 46,
-    "valorant.exe": 46,
-    "steam.exe": 10  # lower priority
-}
+from config import ConfigError, get_config_store
+from process_index import get_process_index
+from process_watcher import ProcessWatcher
+from reconcile import (POLICY_PREFIX, PORT_POLICY_PREFIX, PolicyReconciler, app_policies, print_plan,
+                       tier_port_policies)
+from shell_session import ShellError
 
-already_applied = set()
+parser = argparse.ArgumentParser(description="Apply QoS policies to running priority apps")
+parser.add_argument("--dry-run", action="store_true", help="Show the policy changes without applying them")
+parser.add_argument("--priority-file", default="priority.json")
+parser.add_argument("--daemon", action="store_true",
+                    help="Keep running and apply/remove policies as priority apps start and exit")
+parser.add_argument("--debounce", type=float, default=2.0,
+                    help="Seconds a process must live before it gets a policy (daemon mode)")
+args = parser.parse_args()
 
-for proc in psutil.process_iter(['name', 'exe']):
-    try:
-        name = proc.info['name'].lower()
-        path = proc.info['exe']
+# Priority apps ("apps" in priority.json) get the DSCP value of their tier
+store = get_config_store(args.priority_file)
+try:
+    config = store.get()
+except (OSError, ConfigError) as e:
+    raise SystemExit(f"Cannot load {args.priority_file}: {e}")
+priority_apps = config.app_dscp()
+tier_policies = tier_port_policies(config.priority_levels())
+
+if args.daemon:
+    watcher = ProcessWatcher(priority_apps, debounce=args.debounce,
+                             extra_policies=tier_policies, extra_prefixes=(PORT_POLICY_PREFIX,))
 
-        if name in priority_apps and name not in already_applied:
-            dscp = priority_apps[name]
-            print(f"Applying QoS to: {name} with DSCP {dscp}")
+    def reload(config, diff):
+        # Tier and app edits in priority.json are applied by the running watcher
+        if diff.tiers or diff.apps:
+            watcher.update(config.app_dscp(), tier_port_policies(config.priority_levels()))
 
-            subprocess.run([
-                "powershell",
-                f"New-NetQosPolicy -Name Auto_{name} "
-                f"-AppPathNameMatchCondition '{path}' "
-                f"-IPProtocolMatchCondition Both "
-                f"-DSCPAction {dscp}"
-            ], shell=True)
+    store.subscribe(reload)
+    store.watch()
+    print("Watching for priority apps (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    print(watcher.latency_summary())
+else:
+    # Running priority apps resolved through the shared process index
+    app_paths = get_process_index().running(priority_apps)
+    for name in app_paths:
+        print(f"Applying QoS to: {name} with DSCP {priority_apps[name]}")
 
-            already_applied.add(name)
+    # Desired state: running priority apps plus the port rules of every tier
+    desired = app_policies({name: priority_apps[name] for name in app_paths}, app_paths)
+    desired.update(tier_policies)
 
-    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-        continue
+    # Policies of apps that are not running are left alone
+    managed = tuple(f"{POLICY_PREFIX}{name}" for name in app_paths) + (PORT_POLICY_PREFIX,)
+    try:
+        plan = PolicyReconciler().reconcile(desired, prefixes=managed, dry_run=args.dry_run)
+        if args.dry_run:
+            print_plan(plan)
+    except ShellError as e:
+        print(f"Failed to apply QoS policies: {e}")